@@ -1,125 +1,244 @@
-from anthropic import Anthropic
 import json
-from typing import Dict, List
-import os
+from typing import AsyncIterator, Dict, List, Tuple
+from .llm_client import LLMClient, cached_text, get_llm_client
+from .dispatcher import LLMOverloaded
+from .latency_budget import (DEGRADING, Deadline, degradation_reason, degraded, latency_budget,
+                             stream_within_budget, within_budget)
+from .analysis_cache import AnalysisCache, get_analysis_cache
+from .ingredient_store import IngredientStore, get_ingredient_store, normalize_ingredient
+from .scoring_engine import ScoringEngine
+from .interactions import InteractionGraph, get_interaction_graph
+from .structured_output import JsonSectionStream, StructuredOutput, get_structured_output
+from monitoring.instrumentation import count_fallback, instrumented
 
 class AnalysisAgent:
-    def __init__(self):
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    def __init__(self, client: LLMClient = None, cache: AnalysisCache = None,
+                 ingredient_store: IngredientStore = None, interaction_graph: InteractionGraph = None,
+                 output: StructuredOutput = None):
+        self.client = client or get_llm_client()
+        self.output = output or get_structured_output()
+        self.cache = cache or get_analysis_cache()
+        self.ingredient_store = ingredient_store or get_ingredient_store()
+        self.scoring_engine = ScoringEngine()
+        self.interaction_graph = interaction_graph or get_interaction_graph()
+        # Past this, a scan is answered by the rule-based scorer
+        self.budget = latency_budget("scan")
         
+    @instrumented("analysis")
     async def analyze_product(self, product: Dict, user_profile: Dict) -> Dict:
         """
-        Deep product analysis for specific user
+        Deep product analysis for specific user.
+        Only ingredients not yet in the ingredient store go to the LLM.
+        Over the scan budget the rule-based result is returned, labelled
+        degraded, while the LLM analysis finishes in the background and
+        is cached for the next scan.
         """
-        
-        system_prompt = """You are a cosmetic chemist analyzing a product for a specific user.
-
-Analyze each ingredient and provide a comprehensive assessment. Return ONLY valid JSON:
-
-{
-    "overall_score": 75,
-    "recommendation": "recommended|caution|not_recommended",
-    "summary": "Brief overall assessment",
-    "ingredient_analyses": [
-        {
-            "ingredient": "Hyaluronic Acid",
-            "category": "humectant",
-            "benefits": ["Deep hydration", "Plumping effect"],
-            "risks": ["None for this user"],
-            "suitability_score": 95,
-            "evidence_level": "strong",
-            "explanation": "Excellent for dry skin, backed by clinical studies"
-        }
-    ],
-    "warnings": ["Contains fragrance - may irritate sensitive skin"],
-    "benefits": ["Excellent hydration", "Anti-aging properties"],
-    "interactions": ["Don't use with Vitamin C (in morning routine)"],
-    "usage_tips": ["Apply on damp skin", "Use twice daily"]
-}
+        cached = self.cache.get(product, user_profile)
+        if cached is not None:
+            return cached
+
+        ingredients = product.get("ingredients", [])
+        if not ingredients:
+            return self._fallback_analysis(product, user_profile)
+
+        try:
+            return await within_budget(self._analyze(product, user_profile), self.budget, keep_running=True)
+        except LLMOverloaded:
+            raise
+        except DEGRADING as e:
+            return degraded(self._fallback_analysis(product, user_profile), degradation_reason(e))
+        except Exception as e:
+            print(f"Analysis error: {e}")
+            return degraded(self._fallback_analysis(product, user_profile), "error")
+
+    async def _analyze(self, product: Dict, user_profile: Dict) -> Dict:
+        ingredients = product.get("ingredients", [])
+        skin_type = user_profile.get("skin_type", "normal")
+
+        known = await self.ingredient_store.get_many(ingredients, skin_type)
+        unseen = list(dict.fromkeys(i for i in ingredients if normalize_ingredient(i) not in known))
+        if unseen:
+            fresh = await self._analyze_ingredients(unseen, skin_type)
+            await self.ingredient_store.put_many(fresh, skin_type)
+            known.update({normalize_ingredient(name): entry for name, entry in fresh.items()})
+
+        analysis = self._compose_analysis(product, user_profile, known)
+        self.cache.put(product, user_profile, analysis)
+        return analysis
+
+    def _ingredients_request(self, ingredients: List[str], skin_type: str) -> Dict:
+        system_prompt = """You are a cosmetic chemist analyzing skincare ingredients for one skin type.
+
+Analyze each listed ingredient on its own. Return ONLY a valid JSON array, one object per ingredient, in the same order:
+
+[
+    {
+        "ingredient": "Hyaluronic Acid",
+        "category": "humectant",
+        "benefits": ["Deep hydration", "Plumping effect"],
+        "risks": ["None for this skin type"],
+        "suitability_score": 95,
+        "evidence_level": "strong",
+        "explanation": "Excellent for dry skin, backed by clinical studies",
+        "usage_tips": ["Apply on damp skin"]
+    }
+]
 
 Consider:
-- User's skin type, concerns, allergies
-- Ingredient interactions
+- The skin type
 - Scientific evidence
-- Practical usage advice
+- Common irritation or comedogenicity concerns
+- Practical usage advice (leave usage_tips empty if there is nothing specific)
 """
+        return dict(
+            agent="analysis",
+            model="claude-sonnet-4-20250514",
+            max_tokens=min(3000, 200 + 150 * len(ingredients)),
+            temperature=0.2,
+            system=[cached_text(system_prompt)],
+            messages=[{
+                "role": "user",
+                "content": f"""Skin type: {skin_type}
+
+Ingredients: {json.dumps(ingredients)}"""
+            }]
+        )
+
+    async def _analyze_ingredients(self, ingredients: List[str], skin_type: str) -> Dict[str, Dict]:
+        """
+        Ask the LLM about ingredients we have no stored analysis for
+        """
+        entries = await self.output.request(self.client, self._ingredients_request(ingredients, skin_type),
+                                            min_items=len(ingredients))
+        return self._match_entries(ingredients, entries)
+
+    @staticmethod
+    def _match_entries(ingredients: List[str], entries: List[Dict]) -> Dict[str, Dict]:
+        # Match by name; fall back to position when the model renames an ingredient
+        by_name = {normalize_ingredient(e.get("ingredient", "")): e for e in entries}
+        analyses = {}
+        for index, name in enumerate(ingredients):
+            entry = by_name.get(normalize_ingredient(name))
+            if entry is None and len(entries) == len(ingredients):
+                entry = entries[index]
+            if entry is not None:
+                analyses[name] = dict(entry, ingredient=name)
+        return analyses
+
+    @instrumented("analysis")
+    async def stream_analysis(self, product: Dict, user_profile: Dict) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        analyze_product as (event, data) pairs: one "ingredient" per
+        ingredient analysis (stored ones first, then each new one as the
+        model finishes it), then "analysis" with the product-level result,
+        the rule-based one (labelled degraded) past the scan budget
+        """
+        cached = self.cache.get(product, user_profile)
+        if cached is not None:
+            yield "analysis", cached
+            return
+
+        ingredients = product.get("ingredients", [])
+        if not ingredients:
+            yield "analysis", self._fallback_analysis(product, user_profile)
+            return
+
+        skin_type = user_profile.get("skin_type", "normal")
+        deadline = Deadline(self.budget)
 
         try:
-            message = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=3000,
-                temperature=0.2,
-                system=system_prompt,
-                messages=[{
-                    "role": "user",
-                    "content": f"""Product: {json.dumps(product)}
+            known = await self.ingredient_store.get_many(ingredients, skin_type)
+            for entry in known.values():
+                yield "ingredient", entry
 
-User Profile: {json.dumps(user_profile)}
+            unseen = list(dict.fromkeys(i for i in ingredients if normalize_ingredient(i) not in known))
+            if unseen:
+                request = self._ingredients_request(unseen, skin_type)
+                entries = JsonSectionStream()
+                async for text in stream_within_budget(self.client.stream_text(**request), deadline):
+                    for _, entry in entries.feed(text):
+                        yield "ingredient", entry
+                parsed = await within_budget(self.output.complete(self.client, request, entries.text,
+                                                                  min_items=len(unseen)), deadline.remaining())
+                for _, entry in entries.remaining(parsed):
+                    yield "ingredient", entry
 
-Analyze this product for THIS specific user."""
-                }]
-            )
-            
-            response_text = message.content[0].text.strip()
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            
-            analysis = json.loads(response_text)
-            return analysis
-            
+                fresh = self._match_entries(unseen, parsed)
+                await self.ingredient_store.put_many(fresh, skin_type)
+                known.update({normalize_ingredient(name): entry for name, entry in fresh.items()})
+
+            analysis = self._compose_analysis(product, user_profile, known)
+            self.cache.put(product, user_profile, analysis)
+
+        except LLMOverloaded:
+            raise
+        except DEGRADING as e:
+            analysis = degraded(self._fallback_analysis(product, user_profile), degradation_reason(e))
         except Exception as e:
             print(f"Analysis error: {e}")
-            return self._fallback_analysis(product, user_profile)
-    
-    def _fallback_analysis(self, product: Dict, user_profile: Dict) -> Dict:
+            analysis = degraded(self._fallback_analysis(product, user_profile), "error")
+
+        yield "analysis", analysis
+
+    def _compose_analysis(self, product: Dict, user_profile: Dict, known: Dict[str, Dict]) -> Dict:
         """
-        Rule-based fallback if AI fails
+        Build the product-level result from per-ingredient analyses
         """
-        score = 70
-        warnings = []
-        benefits = []
-        
-        ingredients = [i.lower() for i in product.get("ingredients", [])]
+        names = list(dict.fromkeys(normalize_ingredient(i) for i in product.get("ingredients", [])))
+        entries = [known[n] for n in names if n in known]
         allergies = [a.lower() for a in user_profile.get("allergies", [])]
         skin_type = user_profile.get("skin_type", "normal")
-        
-        # Check allergies
+
+        scores = [e["suitability_score"] for e in entries if isinstance(e.get("suitability_score"), (int, float))]
+        score = round(sum(scores) / len(scores)) if scores else 70
+        warnings = []
+        benefits = []
+        usage_tips = []
+
         for allergy in allergies:
-            if allergy in ingredients:
+            if normalize_ingredient(allergy) in names:
                 warnings.append(f"⚠️ Contains {allergy} - you're allergic!")
                 score -= 30
-        
-        # Skin type matching
-        if skin_type == "dry":
-            if any(a in ingredients for a in ["alcohol", "alcohol denat"]):
-                warnings.append("❌ Contains alcohol - drying for your skin")
-                score -= 20
-            if "hyaluronic acid" in ingredients:
-                benefits.append("✅ Hyaluronic acid - great for hydration")
-                score += 10
-        
-        if skin_type == "sensitive":
-            if "fragrance" in ingredients or "parfum" in ingredients:
-                warnings.append("⚠️ Contains fragrance - may irritate")
-                score -= 15
-        
+
+        for entry in entries:
+            for risk in entry.get("risks", []):
+                if risk and not risk.lower().startswith("none"):
+                    warnings.append(f"{entry['ingredient']}: {risk}")
+            for benefit in entry.get("benefits", []):
+                if benefit not in benefits:
+                    benefits.append(benefit)
+            # Entries stored before usage tips were asked for have none
+            for tip in entry.get("usage_tips") or []:
+                if tip and tip not in usage_tips:
+                    usage_tips.append(tip)
+
         return {
             "overall_score": max(0, min(100, score)),
             "recommendation": "recommended" if score >= 70 else "caution" if score >= 50 else "not_recommended",
-            "summary": f"Score: {score}/100",
-            "ingredient_analyses": [],
+            "summary": f"{len(entries)} of {len(names)} ingredients analyzed for {skin_type} skin",
+            "ingredient_analyses": entries,
             "warnings": warnings,
             "benefits": benefits,
-            "interactions": [],
-            "usage_tips": []
+            "interactions": self.interaction_graph.check(product.get("ingredients", [])).warnings,
+            "usage_tips": usage_tips,
         }
     
+    def _fallback_analysis(self, product: Dict, user_profile: Dict) -> Dict:
+        """
+        Rule-based fallback if AI fails
+        """
+        return self.scoring_engine.score_one(product, user_profile)
+    
+    @instrumented("analysis")
     async def check_ingredient_interactions(self, ingredients: List[str]) -> List[str]:
         """
-        Check for dangerous ingredient combinations
+        Check for dangerous ingredient combinations.
+        Known pairs come from the local interaction graph; the LLM is
+        only asked when some ingredient could not be classified.
         """
+        local = self.interaction_graph.check(ingredients)
+        if not local.unclassified:
+            return local.warnings
         
         system_prompt = """Check for known ingredient interactions in skincare.
 
@@ -136,26 +255,22 @@ If no interactions, return empty array: []
 """
 
         try:
-            message = self.client.messages.create(
+            interactions = await self.output.request(self.client, dict(
+                agent="analysis",
                 model="claude-sonnet-4-20250514",
                 max_tokens=500,
                 temperature=0.1,
-                system=system_prompt,
+                system=[cached_text(system_prompt)],
                 messages=[{
                     "role": "user",
                     "content": f"Ingredients: {json.dumps(ingredients)}"
                 }]
-            )
-            
-            response_text = message.content[0].text.strip()
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            
-            interactions = json.loads(response_text)
-            return interactions
+            ))
+            return local.warnings + [w for w in interactions if w not in local.warnings]
             
+        except LLMOverloaded:
+            raise
         except Exception as e:
             print(f"Interaction check error: {e}")
-            return []
+            count_fallback("analysis", "check_ingredient_interactions")
+            return local.warnings
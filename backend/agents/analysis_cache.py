@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import copy
+import hashlib
+import json
+import os
+import time
+
+from sqlalchemy import select
+
+from database.connection import AsyncSessionLocal
+from database.models import AnalysisResultDB
+
+from .normalizer import get_normalizer
+
+# Profile fields that change what analyze_product returns: the
+# per-ingredient analyses are per skin type, and allergies add warnings.
+# Concerns and age are not used, so they must not split the cache.
+PROFILE_KEY_FIELDS = ("skin_type", "allergies")
+
+
+def _digest(payload) -> str:
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def ingredients_key(product: Dict) -> str:
+    # Order is kept: INCI lists are sorted by concentration
+    normalizer = get_normalizer()
+    return _digest([normalizer.canonical(i) for i in product.get("ingredients", []) or []])
+
+
+def profile_key(user_profile: Dict) -> str:
+    return _digest({
+        "skin_type": (user_profile.get("skin_type") or "normal").lower(),
+        "allergies": sorted({get_normalizer().canonical(a) for a in user_profile.get("allergies") or []}),
+    })
+
+
+class AnalysisCache:
+    """
+    In-process LRU + TTL cache of analyze_product results,
+    keyed by (ingredient list, profile archetype)
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None):
+        self.max_entries = max_entries or int(os.getenv("ANALYSIS_CACHE_SIZE", "10000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("ANALYSIS_CACHE_TTL", "86400"))
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.preloaded = 0
+
+    @staticmethod
+    def make_key(product: Dict, user_profile: Dict) -> Tuple[str, str]:
+        return ingredients_key(product), profile_key(user_profile)
+
+    def get(self, product: Dict, user_profile: Dict) -> Optional[Dict]:
+        key = self.make_key(product, user_profile)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, analysis = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(analysis)
+
+    def put(self, product: Dict, user_profile: Dict, analysis: Dict):
+        self._store(self.make_key(product, user_profile), copy.deepcopy(analysis))
+
+    def _store(self, key: Tuple[str, str], analysis: Dict):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, analysis)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def warm(self, session_factory=AsyncSessionLocal) -> int:
+        """
+        Load the newest analyses pre-computed by jobs.preanalyze_catalog,
+        up to the cache size; returns how many were loaded
+        """
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(AnalysisResultDB.ingredients_key, AnalysisResultDB.profile_key, AnalysisResultDB.analysis)
+                .order_by(AnalysisResultDB.id.desc())
+                .limit(self.max_entries)
+            )).all()
+        # Oldest first, so the newest end up most recently used
+        for ingredients_hash, profile_hash, analysis in reversed(rows):
+            self._store((ingredients_hash, profile_hash), analysis)
+        self.preloaded += len(rows)
+        return len(rows)
+
+    def invalidate(self, product: Dict, user_profile: Dict = None) -> int:
+        """
+        Drop one product/profile entry, or every entry for the product
+        when no profile is given. Returns how many entries were removed.
+        """
+        if user_profile is not None:
+            return 1 if self._entries.pop(self.make_key(product, user_profile), None) else 0
+
+        product_hash = ingredients_key(product)
+        stale = [key for key in self._entries if key[0] == product_hash]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "preloaded": self.preloaded,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_default_cache = None
+
+
+def get_analysis_cache() -> AnalysisCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AnalysisCache()
+    return _default_cache
@@ -0,0 +1,169 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict
+import os
+import time
+
+import anthropic
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Deadline (with a monotonic `at`, None for no budget) of the latency budget
+# the current call runs under; set by latency_budget for the tasks it starts
+budget_deadline: ContextVar = ContextVar("budget_deadline", default=None)
+
+# Timers may fire this early
+BUDGET_SLACK = 0.01
+
+
+class CircuitOpen(Exception):
+    """
+    The upstream behind a breaker is failing or slow; the call was not sent
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit {name} is open; retrying upstream in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def upstream_failure(error: Exception) -> bool:
+    """
+    Errors that say the provider is unhealthy; 4xx are the caller's fault
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status >= 500
+    return isinstance(error, anthropic.APIConnectionError)
+
+
+def over_budget() -> bool:
+    """
+    Whether the latency budget the current call runs under has run out
+    """
+    at = getattr(budget_deadline.get(), "at", None)
+    return at is not None and time.monotonic() >= at - BUDGET_SLACK
+
+
+class CircuitBreaker:
+    """
+    Tracks the last `window` calls to one agent / model. Opens when at
+    least `min_calls` of them show an error rate over `error_rate` or a p99
+    latency over `p99_seconds`; while open, calls fail with CircuitOpen
+    without going upstream. After `cooldown` seconds one call is let
+    through as a probe (half-open): success closes the circuit, failure
+    opens it for another cooldown.
+
+    A call cancelled because its latency budget ran out counts as failed,
+    so a hanging upstream opens the circuit; p99_seconds defaults below
+    the smallest budget for the same reason.
+    """
+
+    def __init__(self, name: str, window: int = None, min_calls: int = None, error_rate: float = None,
+                 p99_seconds: float = None, cooldown: float = None):
+        self.name = name
+        self.window = window or int(os.getenv("CIRCUIT_WINDOW", "100"))
+        self.min_calls = min_calls or int(os.getenv("CIRCUIT_MIN_CALLS", "20"))
+        self.error_rate = error_rate or float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+        self.p99_seconds = p99_seconds or float(os.getenv("CIRCUIT_P99_SECONDS", "5"))
+        self.cooldown = cooldown or float(os.getenv("CIRCUIT_COOLDOWN", "30"))
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.reason = None
+        self._probing = False
+        # (succeeded, seconds) per call
+        self._calls = deque(maxlen=self.window)
+        self.opened = 0
+        self.rejected = 0
+
+    def _admit(self) -> bool:
+        """
+        Raise CircuitOpen unless the call may go upstream; True for the half-open probe
+        """
+        if self.state == CLOSED:
+            return False
+        remaining = self.opened_at + self.cooldown - time.monotonic()
+        if self.state == OPEN and remaining <= 0:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        raise CircuitOpen(self.name, max(remaining, 1.0))
+
+    def _open(self, reason: str):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.reason = reason
+        self.opened += 1
+        print(f"Circuit {self.name} opened: {reason}")
+
+    def _trip_reason(self):
+        if len(self._calls) < self.min_calls:
+            return None
+        errors = sum(not ok for ok, _ in self._calls) / len(self._calls)
+        if errors > self.error_rate:
+            return f"error rate {errors:.0%}"
+        p99 = self.p99()
+        if p99 > self.p99_seconds:
+            return f"p99 latency {p99:.2f}s"
+        return None
+
+    def _record(self, ok: bool, seconds: float, probe: bool):
+        if probe:
+            self._probing = False
+            if ok:
+                self.state = CLOSED
+                self.reason = None
+                self._calls.clear()
+            else:
+                self._open("probe failed")
+            return
+        if self.state != CLOSED:
+            # Sent before the circuit opened; the probe decides what happens next
+            return
+        self._calls.append((ok, seconds))
+        reason = self._trip_reason()
+        if reason:
+            self._open(reason)
+
+    @contextmanager
+    def guard(self):
+        """
+        Wrap one upstream call: raises CircuitOpen if the circuit won't let
+        it through, otherwise records its outcome and latency
+        """
+        probe = self._admit()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._record(not upstream_failure(e), time.monotonic() - started, probe)
+            raise
+        except BaseException:
+            if over_budget():
+                # Cut off by a latency budget: the upstream was too slow to use
+                self._record(False, time.monotonic() - started, probe)
+            elif probe:
+                # Cancelled / abandoned: says nothing about the upstream
+                self._probing = False
+            raise
+        else:
+            self._record(True, time.monotonic() - started, probe)
+
+    def p99(self) -> float:
+        latencies = sorted(seconds for _, seconds in self._calls)
+        return latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "reason": self.reason,
+            "calls": len(self._calls),
+            "error_rate": sum(not ok for ok, _ in self._calls) / len(self._calls) if self._calls else 0.0,
+            "p99_seconds": self.p99(),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
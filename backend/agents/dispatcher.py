@@ -0,0 +1,260 @@
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import statistics
+import time
+
+import anthropic
+
+# Highest first: a waiting chat call is always admitted before a waiting scan, and so on
+PRIORITIES = ("chat", "scan", "routine", "background")
+
+# Agent label (LLMClient `agent=`) -> priority class
+AGENT_PRIORITIES = {
+    "orchestrator": "chat",
+    "profile": "chat",
+    "analysis": "scan",
+    "recommendation": "routine",
+}
+
+# Longest a call may wait for a slot before it is shed; None waits indefinitely
+DEFAULT_DEADLINES = {"chat": 5.0, "scan": 10.0, "routine": 20.0, "background": None}
+
+# Retried with jittered backoff: rate limited (429), overloaded (529) and other server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+
+
+class LLMOverloaded(Exception):
+    """
+    A call waited longer than its priority's deadline and was shed
+    """
+
+    def __init__(self, priority: str, deadline: float, retry_after: float):
+        super().__init__(f"LLM capacity exhausted: {priority} call waited over {deadline:g}s for a slot")
+        self.priority = priority
+        self.deadline = deadline
+        self.retry_after = retry_after
+
+
+def priority_for(agent: str) -> str:
+    return AGENT_PRIORITIES.get(agent, "background")
+
+
+def estimate_tokens(kwargs: Dict) -> int:
+    """
+    Rough token cost of a request before sending it: ~4 characters per
+    prompt token plus the full max_tokens budget
+    """
+    prompt = len(str(kwargs.get("system", ""))) + len(str(kwargs.get("messages", "")))
+    return prompt // 4 + int(kwargs.get("max_tokens", 0))
+
+
+class TokenBucket:
+    """
+    `rate_per_minute` units refilled continuously, up to one minute's worth;
+    a rate of 0 means unlimited
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if not self.rate:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.rate:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if self.rate:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Waiter:
+    def __init__(self, priority: str, cost: int):
+        self.priority = priority
+        self.cost = cost
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+
+
+class Slot:
+    def __init__(self, cost: int):
+        self.cost = cost
+        self.used: Optional[int] = None
+
+    def settle(self, tokens_used: int):
+        """
+        Actual tokens, once known; the estimate's surplus goes back to the bucket
+        """
+        self.used = tokens_used
+
+
+class LLMDispatcher:
+    """
+    Admission control in front of the provider: a bounded number of calls
+    in flight, request and token buckets sized to the account's rate
+    limits, and a priority queue so chat is served before scans, scans
+    before routines and routines before background work. A call that
+    cannot get a slot within its priority's deadline raises LLMOverloaded.
+    429 / 529 / 5xx responses are retried with jittered exponential
+    backoff, and a 429 or 529 pauses admissions for everyone.
+    """
+
+    def __init__(self, max_concurrency: int = None, requests_per_minute: float = None,
+                 tokens_per_minute: float = None, deadlines: Dict[str, Optional[float]] = None,
+                 max_retries: int = None, backoff_base: float = None, backoff_cap: float = None):
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+        rpm = requests_per_minute if requests_per_minute is not None else float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+        tpm = tokens_per_minute if tokens_per_minute is not None else float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.deadlines = dict(DEFAULT_DEADLINES)
+        for priority in PRIORITIES:
+            value = os.getenv(f"LLM_QUEUE_DEADLINE_{priority.upper()}")
+            if value is not None:
+                self.deadlines[priority] = float(value) or None
+        self.deadlines.update(deadlines or {})
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.backoff_base = backoff_base or float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+        self.backoff_cap = backoff_cap or float(os.getenv("LLM_BACKOFF_CAP", "20"))
+
+        self.active = 0
+        self._queue: List = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = Counter()
+        self.shed = Counter()
+        self.retries = Counter()
+        self.status_errors = Counter()
+        self._waits = {priority: deque(maxlen=1000) for priority in PRIORITIES}
+
+    # ---------- admission ----------
+
+    def _pump(self):
+        """
+        Admit waiters in priority order while there is capacity
+        """
+        self._timer = None
+        while self._queue and self.active < self.max_concurrency:
+            _, _, waiter = self._queue[0]
+            if waiter.future.done():
+                heapq.heappop(self._queue)  # shed or cancelled
+                continue
+            delay = max(self._paused_until - time.monotonic(), self.requests.wait_time(1),
+                        self.tokens.wait_time(waiter.cost))
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(waiter.cost)
+            self.active += 1
+            self._waits[waiter.priority].append(time.monotonic() - waiter.enqueued)
+            self.admitted[waiter.priority] += 1
+            waiter.future.set_result(None)
+
+    def _wake(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._pump()
+
+    async def _acquire(self, priority: str, cost: int, shed: bool):
+        waiter = _Waiter(priority, cost)
+        heapq.heappush(self._queue, (PRIORITIES.index(priority), next(self._sequence), waiter))
+        self._wake()
+        deadline = self.deadlines.get(priority) if shed else None
+        try:
+            await asyncio.wait({waiter.future}, timeout=deadline)
+        except BaseException:
+            if waiter.future.done():
+                self._release()
+            else:
+                waiter.future.cancel()
+            raise
+        if not waiter.future.done():
+            waiter.future.cancel()
+            self.shed[priority] += 1
+            raise LLMOverloaded(priority, deadline, retry_after=max(1.0, self._paused_until - time.monotonic()))
+
+    def _release(self):
+        self.active -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: str, cost: int, shed: bool = True):
+        """
+        Hold one admission for the duration of a call. `shed=False` waits
+        past the deadline (for retries of calls already admitted once).
+        """
+        await self._acquire(priority, cost, shed)
+        slot = Slot(cost)
+        try:
+            yield slot
+        finally:
+            if slot.used is not None:
+                self.tokens.refund(max(0, cost - slot.used))
+            self._release()
+
+    # ---------- retries ----------
+
+    def retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Seconds to wait before retrying `error`, or None if it should be raised
+        """
+        status = getattr(error, "status_code", None)
+        if status is not None:
+            self.status_errors[status] += 1
+        retryable = status in RETRY_STATUSES or (
+            isinstance(error, anthropic.APIConnectionError) and not isinstance(error, anthropic.APITimeoutError)
+        )
+        if not retryable or attempt >= self.max_retries:
+            return None
+
+        # Full jitter, unless the provider said how long to wait
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        try:
+            delay = max(delay, float(response.headers.get("retry-after")))
+        except (AttributeError, TypeError, ValueError):
+            pass
+        if status in (429, 529):
+            # Everyone backs off, not just this caller
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self.retries[status or "connection"] += 1
+        return delay
+
+    def stats(self) -> Dict:
+        queued = Counter(w.priority for _, _, w in self._queue if not w.future.done())
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queued": {p: queued[p] for p in PRIORITIES},
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+            "retries": {str(k): v for k, v in self.retries.items()},
+            "status_errors": {str(k): v for k, v in self.status_errors.items()},
+            "paused_seconds": max(0.0, self._paused_until - time.monotonic()),
+            "wait_p50_ms": {p: statistics.median(w) * 1000 for p, w in self._waits.items() if w},
+            "wait_p99_ms": {p: sorted(w)[int(len(w) * 0.99)] * 1000 for p, w in self._waits.items() if w},
+        }
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+import os
+
+from sqlalchemy import select
+
+from database.connection import AsyncSessionLocal, dialect_insert
+from database.models import IngredientAnalysisDB
+
+from .normalizer import get_normalizer
+
+
+def normalize_ingredient(name: str) -> str:
+    """
+    Storage key for an ingredient: its canonical name, so "Aqua" and
+    "Water" share one entry
+    """
+    return get_normalizer().canonical(name)
+
+
+class IngredientStore:
+    """
+    Persistent per-(ingredient, skin type) analyses, with an in-memory LRU
+    copy of the ones most recently read or written by this process
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, max_entries: int = None):
+        self.session_factory = session_factory
+        self.max_entries = max_entries or int(os.getenv("INGREDIENT_MEMORY_SIZE", "50000"))
+        self._memory: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get_many(self, ingredients: Iterable[str], skin_type: str) -> Dict[str, Dict]:
+        """
+        Return {normalized ingredient: analysis} for the ingredients already stored
+        """
+        skin_type = (skin_type or "normal").lower()
+        names = {normalize_ingredient(i) for i in ingredients}
+
+        found = {}
+        for name in names:
+            analysis = self._memory.get((name, skin_type))
+            if analysis is not None:
+                self._memory.move_to_end((name, skin_type))
+                found[name] = analysis
+        missing = [n for n in names if n not in found]
+        if missing:
+            loaded = await self._load(missing, skin_type)
+            for name, analysis in loaded.items():
+                self._remember(name, skin_type, analysis)
+            found.update(loaded)
+
+        self.hits += len(found)
+        self.misses += len(names) - len(found)
+        return found
+
+    async def put_many(self, analyses: Dict[str, Dict], skin_type: str):
+        skin_type = (skin_type or "normal").lower()
+        rows = {normalize_ingredient(name): analysis for name, analysis in analyses.items()}
+        if not rows:
+            return
+        for name, analysis in rows.items():
+            self._remember(name, skin_type, analysis)
+        await self._save(rows, skin_type)
+
+    def _remember(self, name: str, skin_type: str, analysis: Dict):
+        self._memory[(name, skin_type)] = analysis
+        self._memory.move_to_end((name, skin_type))
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    async def _load(self, names: List[str], skin_type: str) -> Dict[str, Dict]:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(IngredientAnalysisDB.ingredient, IngredientAnalysisDB.analysis)
+                .where(IngredientAnalysisDB.skin_type == skin_type)
+                .where(IngredientAnalysisDB.ingredient.in_(names))
+            )
+            return {row.ingredient: row.analysis for row in result}
+
+    async def _save(self, rows: Dict[str, Dict], skin_type: str):
+        async with self.session_factory() as db:
+            statement = dialect_insert(IngredientAnalysisDB.__table__, db.get_bind()).values([
+                {"ingredient": name, "skin_type": skin_type, "analysis": analysis}
+                for name, analysis in rows.items()
+            ]).on_conflict_do_nothing(index_elements=["ingredient", "skin_type"])
+            await db.execute(statement)
+            await db.commit()
+
+    def stats(self) -> Dict:
+        return {"entries_in_memory": len(self._memory), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+_default_store = None
+
+
+def get_ingredient_store() -> IngredientStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = IngredientStore()
+    return _default_store
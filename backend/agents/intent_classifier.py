@@ -0,0 +1,277 @@
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import math
+import os
+import time
+import numpy as np
+
+from sqlalchemy import select
+
+from database.connection import AsyncSessionLocal
+from database.models import ConversationHistory
+
+from .normalizer import normalize_text
+
+AGENTS = ("PROFILE", "ANALYSIS", "RECOMMENDATION", "CHAT")
+
+# Phrases that point at one intent; matched on whole words after normalize_text
+KEYWORD_RULES = {
+    "PROFILE": ["my skin type", "my profile", "update my"],
+    "ANALYSIS": [
+        "ingredient", "ingredients", "inci", "is it safe", "is this safe", "safe to use", "analyze",
+        "analyse", "comedogenic", "contains", "mix with", "mixing", "can i mix", "combine", "together with",
+        "interaction",
+    ],
+    "RECOMMENDATION": [
+        "recommend", "recommendation", "suggest", "routine", "alternative", "alternatives",
+        "what should i use", "should i buy", "should i get", "which product", "best product", "dupe",
+        "replace my",
+    ],
+    "CHAT": [
+        "hello", "hi", "hey", "thanks", "thank you", "good morning", "good night", "bye",
+    ],
+}
+
+# Phrases describing the user: PROFILE only in statements, since "I have dry skin, which
+# moisturizer...?" is a request for another agent. With another agent's keywords present the
+# message matches two agents and goes to the model
+PROFILE_CONTEXT = [
+    "i have oily skin", "i have dry skin", "i have sensitive skin", "i have combination skin", "my skin is",
+    "i am allergic", "i'm allergic", "im allergic", "allergic to",
+]
+
+# CHAT phrases (greetings, thanks) only count in messages this short; "hi" opens many real requests
+GREETING_MAX_WORDS = 4
+
+# A keyword hit multiplies the model's odds for its agent by this much; the threshold still applies
+RULE_ODDS = 10.0
+
+# Bootstraps the linear model before any conversations are logged
+SEED_EXAMPLES = [
+    ("I have oily skin and get breakouts on my chin", "PROFILE"),
+    ("My skin is dry and flaky in winter", "PROFILE"),
+    ("I'm 34 with combination skin and some redness", "PROFILE"),
+    ("Update my concerns to include dark spots", "PROFILE"),
+    ("I'm allergic to fragrance", "PROFILE"),
+    ("Is niacinamide safe with vitamin c", "ANALYSIS"),
+    ("Can I use retinol and glycolic acid together", "ANALYSIS"),
+    ("Does this moisturizer clog pores", "ANALYSIS"),
+    ("What does sodium hyaluronate do in this serum", "ANALYSIS"),
+    ("Check the ingredients in my sunscreen", "ANALYSIS"),
+    ("Recommend a cleanser for sensitive skin", "RECOMMENDATION"),
+    ("Build me a morning and night routine", "RECOMMENDATION"),
+    ("What's a cheaper alternative to this serum", "RECOMMENDATION"),
+    ("Which moisturizer should I buy for dry skin", "RECOMMENDATION"),
+    ("Suggest a sunscreen that doesn't leave a white cast", "RECOMMENDATION"),
+    ("Hi there", "CHAT"),
+    ("Hello!", "CHAT"),
+    ("Hey, good morning", "CHAT"),
+    ("Thanks, that helps a lot", "CHAT"),
+    ("Why does skin get oilier in summer", "CHAT"),
+    ("How long does it take for skin cells to renew", "CHAT"),
+    ("What is the skin barrier", "CHAT"),
+]
+
+
+def tokenize(text: str) -> List[str]:
+    words = normalize_text(text).split()
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class TfidfLinearModel:
+    """
+    TF-IDF features (word unigrams + bigrams) with a softmax regression,
+    trained by full-batch gradient descent in numpy
+    """
+
+    def __init__(self, labels: Sequence[str] = AGENTS, max_features: int = 4000):
+        self.labels = list(labels)
+        self.max_features = max_features
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.weights = np.zeros((0, len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+
+    def _vector(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (feature indexes, l2-normalized tf-idf values) for one message
+        """
+        counts = Counter(t for t in tokens if t in self.vocabulary)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        index = np.fromiter((self.vocabulary[t] for t in counts), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts)) * self.idf[index]
+        return index, values / np.linalg.norm(values)
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str], epochs: int = 300,
+            learning_rate: float = 2.0, l2: float = 1e-4):
+        documents = [tokenize(t) for t in texts]
+        df = Counter(t for tokens in documents for t in set(tokens))
+        terms = [t for t, _ in df.most_common(self.max_features)]
+        self.vocabulary = {t: i for i, t in enumerate(terms)}
+        n = len(documents)
+        self.idf = np.array([math.log((1 + n) / (1 + df[t])) + 1 for t in terms], dtype=np.float32)
+
+        features = np.zeros((n, len(terms)), dtype=np.float32)
+        for row, tokens in enumerate(documents):
+            index, values = self._vector(tokens)
+            features[row, index] = values
+        targets = np.zeros((n, len(self.labels)), dtype=np.float32)
+        targets[np.arange(n), [self.labels.index(label) for label in labels]] = 1
+
+        self.weights = np.zeros((len(terms), len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(epochs):
+            error = _softmax(features @ self.weights + self.bias) - targets
+            self.weights -= learning_rate * (features.T @ error / n + l2 * self.weights)
+            self.bias -= learning_rate * error.mean(axis=0)
+        return self
+
+    def probabilities(self, text: str) -> np.ndarray:
+        index, values = self._vector(tokenize(text))
+        return _softmax(values @ self.weights[index] + self.bias)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probabilities = self.probabilities(text)
+        best = int(probabilities.argmax())
+        return self.labels[best], float(probabilities[best])
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class IntentClassifier:
+    """
+    Local fast path for OrchestratorAgent routing.
+
+    A message that hits keyword rules for exactly one agent goes to that
+    agent, with the model's probability for it boosted by RULE_ODDS;
+    otherwise the TF-IDF model decides. Anything scoring below `threshold`,
+    rule hits included, is left to the routing LLM call.
+    """
+
+    def __init__(self, threshold: float = None, rules: Dict[str, List[str]] = None,
+                 seed_examples: List[Tuple[str, str]] = None, profile_context: List[str] = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+        self.rules = {agent: [f" {normalize_text(p)} " for p in phrases]
+                      for agent, phrases in (rules or KEYWORD_RULES).items()}
+        self.profile_context = [f" {normalize_text(p)} " for p in
+                                (profile_context if profile_context is not None else PROFILE_CONTEXT)]
+        self.seed_examples = seed_examples if seed_examples is not None else SEED_EXAMPLES
+        self.model = TfidfLinearModel().fit(*zip(*self.seed_examples))
+        self.training_examples = len(self.seed_examples)
+        self.local_routes = 0
+        self.llm_routes = 0
+        self.by_source = Counter()
+        self.by_agent = Counter()
+        self.classified = 0
+        self.classify_seconds = 0.0
+
+    def _rule_match(self, text: str) -> Optional[str]:
+        padded = f" {normalize_text(text)} "
+        matched = {agent for agent, phrases in self.rules.items() if any(p in padded for p in phrases)}
+        if not text.strip().endswith("?") and any(p in padded for p in self.profile_context):
+            matched.add("PROFILE")
+        if len(padded.split()) > GREETING_MAX_WORDS:
+            matched.discard("CHAT")
+        return matched.pop() if len(matched) == 1 else None
+
+    def classify(self, text: str) -> Tuple[str, float, str]:
+        """
+        (agent, confidence, source) where source is "rules" or "model"
+        """
+        started = time.perf_counter()
+        agent = self._rule_match(text)
+        if agent is not None:
+            probability = float(self.model.probabilities(text)[self.model.labels.index(agent)])
+            odds = RULE_ODDS * probability / max(1 - probability, 1e-9)
+            result = agent, odds / (1 + odds), "rules"
+        else:
+            agent, confidence = self.model.predict(text)
+            result = agent, confidence, "model"
+        self.classified += 1
+        self.classify_seconds += time.perf_counter() - started
+        return result
+
+    def decide(self, text: str) -> Tuple[Optional[Dict], str]:
+        """
+        (routing decision in the orchestrator's format, best guess agent);
+        the decision is None when the message is ambiguous and should go
+        to the LLM
+        """
+        agent, confidence, source = self.classify(text)
+        if confidence < self.threshold:
+            self.llm_routes += 1
+            return None, agent
+
+        self.local_routes += 1
+        self.by_source[source] += 1
+        self.by_agent[agent] += 1
+        # PROFILE: statements describe the user, questions get follow-up questions
+        action = "ask_questions" if agent == "PROFILE" and text.strip().endswith("?") else "analyze_description"
+        return {
+            "agent": agent,
+            "action": action if agent == "PROFILE" else "local",
+            "parameters": {},
+            "confidence": round(confidence, 2),
+            "reasoning": f"local {source}",
+        }, agent
+
+    def route(self, text: str) -> Optional[Dict]:
+        return self.decide(text)[0]
+
+    def train(self, examples: List[Tuple[str, str]]):
+        examples = self.seed_examples + [(text, label) for text, label in examples if label in AGENTS]
+        self.model = TfidfLinearModel().fit(*zip(*examples))
+        self.training_examples = len(examples)
+
+    async def train_from_history(self, session_factory=AsyncSessionLocal, limit: int = None):
+        """
+        Retrain on logged turns: each user message labelled with the
+        agent_used of the assistant reply that followed it. Only replies the
+        routing LLM chose count - local routes would teach the model its own
+        guesses, and fallback replies say nothing about the message.
+        """
+        limit = limit or int(os.getenv("INTENT_TRAINING_LIMIT", "5000"))
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(ConversationHistory.user_id, ConversationHistory.role, ConversationHistory.message,
+                       ConversationHistory.agent_used, ConversationHistory.routed_by)
+                .order_by(ConversationHistory.id.desc())
+                .limit(limit * 2)
+            )).all()
+
+        examples = []
+        for (user_id, role, text, _, _), (reply_user, reply_role, _, agent_used, routed_by) in zip(rows[1:], rows):
+            if (role == "user" and reply_role == "assistant" and user_id == reply_user
+                    and routed_by == "llm" and agent_used in AGENTS):
+                examples.append((text, agent_used))
+        if examples:
+            await asyncio.to_thread(self.train, examples)
+        return len(examples)
+
+    def stats(self) -> Dict:
+        routed = self.local_routes + self.llm_routes
+        return {
+            "threshold": self.threshold,
+            "local_routes": self.local_routes,
+            "llm_routes": self.llm_routes,
+            "local_rate": self.local_routes / routed if routed else 0.0,
+            "by_source": dict(self.by_source),
+            "by_agent": dict(self.by_agent),
+            "avg_classify_us": self.classify_seconds / self.classified * 1e6 if self.classified else 0.0,
+            "training_examples": self.training_examples,
+        }
+
+
+_default_classifier = None
+
+
+def get_intent_classifier() -> IntentClassifier:
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = IntentClassifier()
+    return _default_classifier
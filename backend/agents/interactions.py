@@ -0,0 +1,95 @@
+from typing import Dict, List, NamedTuple, Set
+
+from .normalizer import IngredientNormalizer, get_normalizer
+
+# Ingredient class -> canonical ingredient names (see normalizer.SYNONYMS) in it
+INGREDIENT_CLASSES = {
+    "retinoid": ["retinol", "retinal", "retinyl palmitate", "retinyl retinoate", "hydroxypinacolone retinoate",
+                 "tretinoin", "adapalene", "tazarotene", "retinoid"],
+    "aha": ["glycolic acid", "lactic acid", "mandelic acid", "malic acid", "tartaric acid", "citric acid", "aha"],
+    "bha": ["salicylic acid", "betaine salicylate", "willow bark extract", "bha"],
+    "vitamin_c": ["ascorbic acid", "ascorbyl glucoside", "sodium ascorbyl phosphate", "magnesium ascorbyl phosphate",
+                  "tetrahexyldecyl ascorbate", "ethyl ascorbic acid"],
+    "niacinamide": ["niacinamide"],
+    "benzoyl_peroxide": ["benzoyl peroxide"],
+}
+
+# Conflicting class pairs -> why
+CONFLICTS = {
+    frozenset(("retinoid", "aha")): "over-exfoliation",
+    frozenset(("retinoid", "bha")): "over-exfoliation",
+    frozenset(("vitamin_c", "niacinamide")): "reduced efficacy at wrong pH",
+    frozenset(("retinoid", "benzoyl_peroxide")): "deactivation",
+    frozenset(("aha", "vitamin_c")): "over-exfoliation",
+    frozenset(("bha", "vitamin_c")): "over-exfoliation",
+}
+
+
+class InteractionResult(NamedTuple):
+    warnings: List[str]
+    classes: Dict[str, List[str]]  # class -> ingredients in it
+    unclassified: List[str]
+
+
+class InteractionGraph:
+    """
+    Precompiled ingredient-class graph over canonical ingredient IDs;
+    one pass over an ingredient list finds every conflicting class pair.
+    Ingredients missing from the normalizer dictionary are reported as
+    unclassified.
+    """
+
+    def __init__(self, classes: Dict[str, List[str]] = None, conflicts: Dict[frozenset, str] = None,
+                 normalizer: IngredientNormalizer = None):
+        classes = classes or INGREDIENT_CLASSES
+        self.conflicts = conflicts or CONFLICTS
+        self.normalizer = normalizer or get_normalizer()
+
+        self.neighbors: Dict[str, Dict[str, str]] = {}
+        for pair, reason in self.conflicts.items():
+            a, b = tuple(pair)
+            self.neighbors.setdefault(a, {})[b] = reason
+            self.neighbors.setdefault(b, {})[a] = reason
+
+        self.classes_by_id: Dict[int, Set[str]] = {}
+        for class_name, names in classes.items():
+            for name in names:
+                self.classes_by_id.setdefault(self.normalizer.id_for(name), set()).add(class_name)
+
+    def classify(self, ingredient: str) -> Set[str]:
+        found = set()
+        for ingredient_id in self.normalizer.ids(ingredient):
+            found.update(self.classes_by_id.get(ingredient_id, ()))
+        return found
+
+    def check(self, ingredients: List[str]) -> InteractionResult:
+        classes: Dict[str, List[str]] = {}
+        unclassified = []
+        for ingredient in ingredients:
+            ids = self.normalizer.ids(ingredient)
+            for class_name in {c for i in ids for c in self.classes_by_id.get(i, ())}:
+                classes.setdefault(class_name, []).append(ingredient)
+            if not any(self.normalizer.is_known(i) for i in ids):
+                unclassified.append(ingredient)
+
+        warnings = []
+        seen = set()
+        for class_name in classes:
+            for other, reason in self.neighbors.get(class_name, {}).items():
+                pair = frozenset((class_name, other))
+                if other in classes and pair not in seen:
+                    seen.add(pair)
+                    warnings.append(
+                        f"{', '.join(classes[class_name])} + {', '.join(classes[other])}: {reason}"
+                    )
+        return InteractionResult(warnings, classes, unclassified)
+
+
+_default_graph = None
+
+
+def get_interaction_graph() -> InteractionGraph:
+    global _default_graph
+    if _default_graph is None:
+        _default_graph = InteractionGraph()
+    return _default_graph
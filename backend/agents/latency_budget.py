@@ -0,0 +1,131 @@
+from typing import AsyncIterator, Awaitable, Dict, Optional, TypeVar
+import asyncio
+import os
+import time
+
+from .circuit_breaker import CircuitOpen, budget_deadline
+
+T = TypeVar("T")
+
+# Seconds an endpoint may wait on the LLM before answering from the local fallback
+DEFAULT_BUDGETS = {"chat": 10.0, "scan": 8.0, "routine": 25.0, "profile": 10.0}
+
+# Errors answered with the local fallback, labelled with why
+DEGRADING = (asyncio.TimeoutError, CircuitOpen)
+
+# Calls left to finish after their caller has moved on
+_background = set()
+
+
+def latency_budget(endpoint: str) -> Optional[float]:
+    """
+    LATENCY_BUDGET_<ENDPOINT> overrides the default; 0 means no budget
+    """
+    value = os.getenv(f"LATENCY_BUDGET_{endpoint.upper()}")
+    if value is not None:
+        return float(value) or None
+    return DEFAULT_BUDGETS.get(endpoint)
+
+
+class Deadline:
+    """
+    A budget started now; `remaining()` is None when there is no budget
+    """
+
+    def __init__(self, budget: Optional[float]):
+        self.at = None if budget is None else time.monotonic() + budget
+
+    def remaining(self) -> Optional[float]:
+        return None if self.at is None else max(0.0, self.at - time.monotonic())
+
+
+def degradation_reason(error: Exception) -> str:
+    return "circuit_open" if isinstance(error, CircuitOpen) else "timeout"
+
+
+def degraded(result: Dict, reason: str) -> Dict:
+    """
+    Label a fallback result so clients can tell it apart from a full answer
+    """
+    return dict(result, degraded=reason)
+
+
+async def within_budget(call: Awaitable[T], budget: Optional[float], keep_running: bool = False) -> T:
+    """
+    Await `call` for at most `budget` seconds, raising asyncio.TimeoutError
+    past it. With `keep_running` the call is not cancelled but left to
+    finish in the background, so whatever it stores (analysis cache,
+    ingredient store) is there for the next request.
+    """
+    if budget is None:
+        return await call
+    # The task sees its deadline, so circuit breakers can tell a budget cut from other cancellations
+    token = budget_deadline.set(Deadline(budget))
+    try:
+        task = asyncio.ensure_future(call)
+    finally:
+        budget_deadline.reset(token)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task) if keep_running else task, budget)
+    except BaseException:
+        if keep_running and not task.done():
+            _background.add(task)
+            task.add_done_callback(_landed)
+        raise
+
+
+def _landed(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Background call error: {task.exception()}")
+
+
+async def stream_within_budget(stream: AsyncIterator[T], deadline: Deadline,
+                               first_only: bool = False) -> AsyncIterator[T]:
+    """
+    Items of `stream` until `deadline`, then asyncio.TimeoutError. With
+    `first_only` only the first item is held to the deadline. The stream
+    is consumed by its own task, so the deadline never fires while the
+    caller is handling an item.
+    """
+    if deadline.at is None:
+        async for item in stream:
+            yield item
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in stream:
+                await queue.put((item, None))
+            await queue.put((done, None))
+        except Exception as e:
+            await queue.put((done, e))
+
+    # Deadline the pump runs under, lifted once the first item is in with `first_only`
+    bound = Deadline(None)
+    bound.at = deadline.at
+    token = budget_deadline.set(bound)
+    try:
+        task = asyncio.ensure_future(pump())
+    finally:
+        budget_deadline.reset(token)
+    bounded = True
+    try:
+        while True:
+            if bounded:
+                item, error = await asyncio.wait_for(queue.get(), deadline.remaining())
+                bounded = not first_only
+                if not bounded:
+                    bound.at = None
+            else:
+                item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        task.cancel()
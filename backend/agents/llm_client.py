@@ -0,0 +1,255 @@
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+from collections import Counter
+from typing import AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import httpx
+import itertools
+import json
+import os
+
+from .circuit_breaker import CircuitBreaker
+from .dispatcher import LLMDispatcher, estimate_tokens, priority_for
+
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+# Mark static prompt prefixes for the provider's prompt cache (PROMPT_CACHING=0 turns it off)
+PROMPT_CACHING = os.getenv("PROMPT_CACHING", "1") != "0"
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+# Identical concurrent create_message calls share one upstream request (LLM_SINGLE_FLIGHT=0 turns it off)
+SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "1") != "0"
+
+
+def cached_text(text: str) -> Dict:
+    """
+    Text block ending a cacheable prefix: everything up to and including
+    it (tools, system, earlier blocks) is served from the prompt cache on
+    repeat calls. Prefixes under the model's minimum length are not cached.
+    """
+    block = {"type": "text", "text": text}
+    if PROMPT_CACHING:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+
+def request_key(kwargs: Dict) -> str:
+    """
+    Canonical hash of a messages.create request
+    """
+    canonical = json.dumps(kwargs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class LLMClient:
+    """
+    Shared async Anthropic client with a bounded connection pool. Every
+    call is admitted by an LLMDispatcher (priority, rate limits, retries)
+    and goes through the circuit breaker of its agent and model
+    """
+
+    def __init__(self, max_concurrency: int = None, max_connections: int = None, timeout: float = None,
+                 http_client: httpx.AsyncClient = None, single_flight: bool = None,
+                 dispatcher: LLMDispatcher = None):
+        self.single_flight = SINGLE_FLIGHT if single_flight is None else single_flight
+        self.dispatcher = dispatcher or LLMDispatcher(max_concurrency)
+        self.max_concurrency = self.dispatcher.max_concurrency
+        max_connections = max_connections or int(os.getenv("LLM_MAX_CONNECTIONS", str(self.max_concurrency)))
+        timeout = timeout or float(os.getenv("LLM_TIMEOUT", "60"))
+
+        self.client = AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            base_url=os.getenv("ANTHROPIC_BASE_URL") or None,
+            timeout=timeout,
+            # Retries go through the dispatcher, which backs off for every caller
+            max_retries=0,
+            http_client=http_client or DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+                timeout=timeout,
+            ),
+        )
+        # agent -> calls and token counts, including prompt-cache reads / writes
+        self.usage: Dict[str, Counter] = {}
+        # request key -> the upstream call identical requests are waiting on
+        self._in_flight: Dict[str, _Flight] = {}
+        # "agent/model" -> breaker, created on first call
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, agent: str, model: str) -> CircuitBreaker:
+        name = f"{agent}/{model}"
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            breaker = self.breakers[name] = CircuitBreaker(name)
+        return breaker
+
+    def _record_usage(self, agent: str, usage) -> int:
+        """
+        Add a response's usage to the agent's totals; returns the tokens it used
+        """
+        totals = self.usage.setdefault(agent, Counter())
+        totals["calls"] += 1
+        used = 0
+        for field in USAGE_FIELDS:
+            count = getattr(usage, field, None) or 0
+            totals[field] += count
+            used += count
+        return used
+
+    async def _create(self, agent: str, kwargs: Dict):
+        priority = kwargs.pop("priority", None) or priority_for(agent)
+        cost = estimate_tokens(kwargs)
+        breaker = self.breaker(agent, kwargs["model"])
+        for attempt in itertools.count():
+            async with self.dispatcher.slot(priority, cost, shed=attempt == 0) as slot:
+                try:
+                    with breaker.guard():
+                        message = await self.client.messages.create(**kwargs)
+                except Exception as e:
+                    delay = self.dispatcher.retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    slot.settle(self._record_usage(agent, message.usage))
+                    return message
+            await asyncio.sleep(delay)
+
+    async def create_message(self, agent: str = "other", **kwargs):
+        """
+        Send one messages.create call, waiting for a free concurrency slot;
+        `agent` labels the token usage.
+
+        A call identical to one already in flight waits for that one's
+        result instead of going upstream. Cancelling a caller leaves the
+        shared call running for the others; it is cancelled only when
+        every caller waiting on it has gone.
+        """
+        kwargs.setdefault("model", DEFAULT_MODEL)
+        if not self.single_flight:
+            return await self._create(agent, kwargs)
+
+        key = request_key(kwargs)
+        flight = self._in_flight.get(key)
+        if flight is None:
+            flight = self._in_flight[key] = _Flight(asyncio.ensure_future(self._create(agent, kwargs)))
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+        else:
+            self.usage.setdefault(agent, Counter())["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Last caller gone: stop the upstream call, and don't let newcomers join it
+                self._land(key, flight)
+                flight.task.cancel()
+
+    def _land(self, key: str, flight: _Flight):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+
+    async def stream_text(self, agent: str = "other", **kwargs) -> AsyncIterator[str]:
+        """
+        Same as create_message, but yields text deltas as they arrive;
+        the dispatcher slot is held until the stream ends, and given up
+        while backing off before a retry. Only failures before the first
+        delta are retried.
+        """
+        kwargs.setdefault("model", DEFAULT_MODEL)
+        priority = kwargs.pop("priority", None) or priority_for(agent)
+        cost = estimate_tokens(kwargs)
+        breaker = self.breaker(agent, kwargs["model"])
+        for attempt in itertools.count():
+            sent_any = False
+            async with self.dispatcher.slot(priority, cost, shed=attempt == 0) as slot:
+                try:
+                    with breaker.guard():
+                        async with self.client.messages.stream(**kwargs) as stream:
+                            async for text in stream.text_stream:
+                                sent_any = True
+                                yield text
+                            message = await stream.get_final_message()
+                except Exception as e:
+                    delay = None if sent_any else self.dispatcher.retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    slot.settle(self._record_usage(agent, message.usage))
+                    return
+            await asyncio.sleep(delay)
+
+    async def create_batch(self, requests: Dict[str, Dict]):
+        """
+        Submit {custom_id: create_message kwargs} through the Message Batches
+        API; returns the batch, which finishes asynchronously
+        """
+        return await self.client.messages.batches.create(requests=[
+            {"custom_id": custom_id, "params": dict({k: v for k, v in kwargs.items() if k != "agent"},
+                                                    model=kwargs.get("model", DEFAULT_MODEL))}
+            for custom_id, kwargs in requests.items()
+        ])
+
+    async def retrieve_batch(self, batch_id: str):
+        return await self.client.messages.batches.retrieve(batch_id)
+
+    async def batch_results(self, batch_id: str, agent: str = "other") -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """
+        (custom_id, reply text) for each request of an ended batch; the text
+        is None for requests that errored, expired or were canceled
+        """
+        async for item in await self.client.messages.batches.results(batch_id):
+            if item.result.type == "succeeded":
+                self._record_usage(agent, item.result.message.usage)
+                yield item.custom_id, item.result.message.content[0].text
+            else:
+                yield item.custom_id, None
+
+    def stats(self) -> Dict:
+        usage = {}
+        for agent, totals in self.usage.items():
+            prompt = totals["input_tokens"] + totals["cache_creation_input_tokens"] + totals["cache_read_input_tokens"]
+            usage[agent] = dict(totals, cache_hit_rate=totals["cache_read_input_tokens"] / prompt if prompt else 0.0)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "dispatcher": self.dispatcher.stats(),
+            "circuits": {name: breaker.stats() for name, breaker in self.breakers.items()},
+            "prompt_caching": PROMPT_CACHING,
+            "single_flight": self.single_flight,
+            "in_flight": len(self._in_flight),
+            "coalesced": sum(totals["coalesced"] for totals in self.usage.values()),
+            "usage": usage,
+        }
+
+    async def close(self):
+        await self.client.close()
+
+
+_default_client = None
+
+
+def get_llm_client() -> LLMClient:
+    """
+    Process-wide LLM client, created on first use
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = LLMClient()
+    return _default_client
+
+
+async def close_llm_client():
+    global _default_client
+    if _default_client is not None:
+        await _default_client.close()
+        _default_client = None
@@ -0,0 +1,282 @@
+from collections import deque
+from typing import Dict, List, Tuple
+import hashlib
+import re
+
+# Canonical ingredient -> synonyms / INCI spellings (the canonical name matches itself).
+# Only true synonyms share an entry: salts, esters and numbered variants
+# (sodium hyaluronate, tocopheryl acetate, ceramide NP / AP ...) are distinct
+# INCI ingredients and get their own, since IDs key the ingredient store and
+# the analysis cache.
+SYNONYMS = {
+    "water": ["aqua", "eau", "purified water", "water/aqua/eau"],
+    "glycerin": ["glycerine", "glycerol"],
+    "butylene glycol": [],
+    "propylene glycol": [],
+    "propanediol": [],
+    "pentylene glycol": [],
+    "hyaluronic acid": ["hyaluronan"],
+    "sodium hyaluronate": [],
+    "hydrolyzed hyaluronic acid": [],
+    "ceramides": ["ceramide"],
+    "ceramide np": ["ceramide 3"],
+    "ceramide ap": ["ceramide 6 ii"],
+    "ceramide eop": ["ceramide 1"],
+    "ceramide ns": ["ceramide 2"],
+    "cholesterol": [],
+    "squalane": [],
+    "squalene": [],
+    "dimethicone": [],
+    "cyclopentasiloxane": [],
+    "cetearyl alcohol": ["cetostearyl alcohol"],
+    "cetyl alcohol": [],
+    "stearyl alcohol": [],
+    "behenyl alcohol": [],
+    "benzyl alcohol": [],
+    "caprylic/capric triglyceride": ["caprylic capric triglyceride"],
+    "shea butter": ["butyrospermum parkii butter", "butyrospermum parkii (shea) butter"],
+    "jojoba oil": ["simmondsia chinensis seed oil", "simmondsia chinensis (jojoba) seed oil"],
+    "panthenol": ["provitamin b5", "d-panthenol", "dexpanthenol"],
+    "allantoin": [],
+    "tocopherol": ["vitamin e"],
+    "tocopheryl acetate": ["vitamin e acetate"],
+    "xanthan gum": [],
+    "carbomer": [],
+    "sodium hydroxide": [],
+    "phenoxyethanol": [],
+    "ethylhexylglycerin": [],
+    "disodium edta": [],
+    "sodium chloride": [],
+    "fragrance": ["parfum", "perfume", "aroma", "fragrance (parfum)", "parfum (fragrance)"],
+    "alcohol": ["ethanol", "ethyl alcohol"],
+    "alcohol denat": ["alcohol denat.", "denatured alcohol", "sd alcohol", "sd alcohol 40",
+                      "sd alcohol 40-b", "alcohol denatured"],
+    "zinc oxide": [],
+    "titanium dioxide": [],
+    "aloe barbadensis leaf juice": ["aloe vera", "aloe vera juice"],
+    "aloe barbadensis leaf extract": ["aloe vera extract"],
+    "centella asiatica extract": ["centella asiatica", "cica"],
+    "petrolatum": ["petroleum jelly"],
+    "mineral oil": ["paraffinum liquidum"],
+    "lanolin": [],
+    "urea": [],
+    "peptides": ["peptide"],
+    "palmitoyl tripeptide-1": [],
+    "palmitoyl tetrapeptide-7": [],
+    "palmitoyl pentapeptide-4": ["matrixyl"],
+    "tranexamic acid": [],
+    "azelaic acid": [],
+    "niacinamide": ["nicotinamide", "vitamin b3"],
+    "retinol": [],
+    "retinal": ["retinaldehyde"],
+    "retinyl palmitate": [],
+    "retinyl retinoate": [],
+    "hydroxypinacolone retinoate": ["granactive retinoid"],
+    "tretinoin": [],
+    "adapalene": [],
+    "tazarotene": [],
+    "retinoid": ["retinoids"],
+    "glycolic acid": [],
+    "lactic acid": [],
+    "mandelic acid": [],
+    "malic acid": [],
+    "tartaric acid": [],
+    "citric acid": [],
+    "aha": ["alpha hydroxy acid", "alpha hydroxy acids", "ahas"],
+    "salicylic acid": [],
+    "betaine salicylate": [],
+    "willow bark extract": ["salix alba bark extract", "salix alba (willow) bark extract"],
+    "bha": ["beta hydroxy acid", "bhas"],
+    "ascorbic acid": ["l-ascorbic acid", "vitamin c"],
+    "ascorbyl glucoside": [],
+    "sodium ascorbyl phosphate": [],
+    "magnesium ascorbyl phosphate": [],
+    "tetrahexyldecyl ascorbate": [],
+    "ethyl ascorbic acid": ["3-o-ethyl ascorbic acid"],
+    "benzoyl peroxide": [],
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s/-]+")
+# "Alcohol-Free", "fragrance free": the ingredient is absent, not present
+_NEGATED = re.compile(r"[\s-]free\b")
+_INCI_SEPARATOR = re.compile(r"[,;\n•]+")
+# Commas inside parentheses belong to the ingredient, e.g. "Extract (Leaf, Root)"
+_INCI_SEPARATOR_OUTSIDE_PARENS = re.compile(r"[,;\n•]+(?![^()]*\))")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase, drop punctuation other than '/' and '-', collapse whitespace
+    """
+    return " ".join(_PUNCTUATION.sub(" ", str(text).lower()).split())
+
+
+class IngredientNormalizer:
+    """
+    Synonym / INCI dictionary compiled into an Aho-Corasick automaton.
+
+    Free text maps to canonical integer IDs in one pass; whole-word,
+    leftmost-longest matches win so "cetearyl alcohol" is not "alcohol",
+    and a match followed by "-free" does not count.
+    Ingredients with no dictionary match get a transient ID hashed from
+    their normalized text: stable across calls, and never stored, so
+    unknown names do not grow the table.
+    """
+
+    def __init__(self, synonyms: Dict[str, List[str]] = None, memo_size: int = 100000):
+        synonyms = synonyms or SYNONYMS
+        self.names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self.memo_size = memo_size
+        self._memo: Dict[str, Tuple[int, ...]] = {}
+
+        # Trie as parallel arrays: goto[state] = {char: state}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int]]] = [[]]  # (pattern length, canonical id)
+
+        for canonical, variants in synonyms.items():
+            canonical_id = self._intern(normalize_text(canonical))
+            for variant in [canonical] + list(variants):
+                self._add_pattern(normalize_text(variant), canonical_id)
+        self.dictionary_size = len(self.names)
+        self._build_failure_links()
+
+    def _intern(self, name: str) -> int:
+        ingredient_id = self._name_ids.get(name)
+        if ingredient_id is None:
+            ingredient_id = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+        return ingredient_id
+
+    def _add_pattern(self, pattern: str, canonical_id: int):
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), canonical_id))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, text: str) -> List[int]:
+        """
+        Canonical IDs found in free text, in order of appearance, without repeats
+        """
+        ids = []
+        for _, _, canonical_id in self._matches(normalize_text(text)):
+            if canonical_id not in ids:
+                ids.append(canonical_id)
+        return ids
+
+    def _matches(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        Non-overlapping leftmost-longest (start, end, canonical id) matches in normalized text
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, canonical_id in out[state]:
+                start = end - length
+                if ((start == 0 or not text[start - 1].isalnum())
+                        and (end == len(text) or not text[end].isalnum())
+                        and not _NEGATED.match(text, end)):
+                    matches.append((start, -length, canonical_id))
+
+        kept = []
+        covered_until = 0
+        for start, negative_length, canonical_id in sorted(matches):
+            if start >= covered_until:
+                covered_until = start - negative_length
+                kept.append((start, covered_until, canonical_id))
+        return kept
+
+    def ids(self, ingredient: str) -> Tuple[int, ...]:
+        """
+        IDs for one ingredient entry (memoized by raw string)
+        """
+        cached = self._memo.get(ingredient)
+        if cached is not None:
+            return cached
+        found = self.scan(ingredient)
+        result = tuple(found) if found else (self._transient_id(normalize_text(ingredient)),)
+        if len(self._memo) >= self.memo_size:
+            self._memo.clear()
+        self._memo[ingredient] = result
+        return result
+
+    def _transient_id(self, name: str) -> int:
+        # Above every dictionary ID, so `ingredient_id >= dictionary_size` means unknown
+        digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+        return self.dictionary_size + int.from_bytes(digest, "big")
+
+    def is_known(self, ingredient_id: int) -> bool:
+        return ingredient_id < self.dictionary_size
+
+    def id_for(self, term: str) -> int:
+        return self.ids(term)[0]
+
+    def name(self, ingredient_id: int) -> str:
+        """
+        Canonical name of a dictionary ID (transient IDs have none)
+        """
+        return self.names[ingredient_id]
+
+    def canonical(self, ingredient: str) -> str:
+        """
+        Stable string key for one ingredient: the canonical name when the
+        whole entry is spelled with one dictionary entry's synonyms ("Aqua",
+        "Parfum (Fragrance)"), otherwise the normalized text, so
+        "Lactobacillus/Water Ferment" is not "water"
+        """
+        text = normalize_text(ingredient)
+        matches = self._matches(text)
+        if matches and len({canonical_id for _, _, canonical_id in matches}) == 1:
+            # Text between and around the matches must be separators only
+            gaps = []
+            covered_until = 0
+            for start, end, _ in matches:
+                gaps.append(text[covered_until:start])
+                covered_until = end
+            gaps.append(text[covered_until:])
+            if not any(char.isalnum() for gap in gaps for char in gap):
+                return self.names[matches[0][2]]
+        return text
+
+    @staticmethod
+    def split_inci(text: str) -> List[str]:
+        """
+        Split a raw INCI list (e.g. OCR output) into ingredient entries
+        """
+        separator = _INCI_SEPARATOR_OUTSIDE_PARENS if "(" in text else _INCI_SEPARATOR
+        return [part.strip() for part in separator.split(text) if part.strip()]
+
+
+_default_normalizer = None
+
+
+def get_normalizer() -> IngredientNormalizer:
+    global _default_normalizer
+    if _default_normalizer is None:
+        _default_normalizer = IngredientNormalizer()
+    return _default_normalizer
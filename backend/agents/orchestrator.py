@@ -1,21 +1,172 @@
-from anthropic import Anthropic
 import json
-from typing import Dict
-import os
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+from .llm_client import LLMClient, cached_text, get_llm_client
+from .circuit_breaker import CircuitOpen
+from .dispatcher import LLMOverloaded
+from .latency_budget import (DEGRADING, Deadline, degradation_reason, latency_budget, stream_within_budget,
+                             within_budget)
 from .profile_agent import ProfileIntelligenceAgent
 from .analysis_agent import AnalysisAgent
 from .recommendation_agent import RecommendationAgent
+from .intent_classifier import IntentClassifier, get_intent_classifier
+from .speculation import Speculation, Speculator
+from .structured_output import StructuredOutput, get_structured_output
+from monitoring.instrumentation import count_fallback, instrumented
 
 class OrchestratorAgent:
-    def __init__(self):
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        self.profile_agent = ProfileIntelligenceAgent()
-        self.analysis_agent = AnalysisAgent()
-        self.recommendation_agent = RecommendationAgent()
+    def __init__(self, client: LLMClient = None, profile_agent: ProfileIntelligenceAgent = None,
+                 analysis_agent: AnalysisAgent = None, recommendation_agent: RecommendationAgent = None,
+                 intent_classifier: IntentClassifier = None, speculator: Speculator = None,
+                 output: StructuredOutput = None):
+        self.client = client or get_llm_client()
+        self.output = output or get_structured_output()
+        self.intent_classifier = intent_classifier or get_intent_classifier()
+        self.speculator = speculator or Speculator()
+        self.profile_agent = profile_agent or ProfileIntelligenceAgent(self.client)
+        self.analysis_agent = analysis_agent or AnalysisAgent(self.client)
+        self.recommendation_agent = recommendation_agent or RecommendationAgent(self.client)
+        # Past this, a chat turn is answered with a canned reply
+        self.budget = latency_budget("chat")
         
+    @instrumented("orchestrator")
     async def route_request(self, user_message: str, user_profile: Dict, conversation_history: list = []) -> Dict:
         """
-        Intelligently route user requests to appropriate agents
+        Intelligently route user requests to appropriate agents.
+        Past the chat budget the reply is a canned one, labelled degraded.
+        """
+        try:
+            return await within_budget(self._respond(user_message, user_profile, conversation_history), self.budget)
+
+        except LLMOverloaded:
+            raise
+        except DEGRADING as e:
+            return self._fallback_reply(degradation_reason(e))
+        except Exception as e:
+            print(f"Orchestrator error: {e}")
+            return self._fallback_reply("error")
+
+    async def _respond(self, user_message: str, user_profile: Dict, conversation_history: list) -> Dict:
+        routing, speculation = await self._route(
+            user_message, user_profile, conversation_history,
+            speculate=lambda: self.speculator.start(self._general_chat(user_message, user_profile)),
+        )
+        
+        # Execute the routed action
+        if speculation is not None and routing["agent"] == "CHAT":
+            result = await self.speculator.keep(speculation)
+        else:
+            if speculation is not None:
+                self.speculator.discard(speculation)
+            result = await self._execute_agent_action(routing, user_message, user_profile)
+        
+        response = {
+            "agent_used": routing["agent"],
+            "response": result,
+            "confidence": routing.get("confidence", 0.8),
+            "routed_by": routing["routed_by"],
+        }
+        if "degraded" in routing:
+            response["degraded"] = routing["degraded"]
+        return response
+
+    def _fallback_reply(self, reason: str) -> Dict:
+        if reason == "error":
+            text = "I'm here to help! Could you rephrase that?"
+        else:
+            text = "I'm a little busy right now - could you ask me again in a moment?"
+        return {"agent_used": "CHAT", "response": text, "confidence": 0.5, "degraded": reason, "routed_by": "fallback"}
+
+    @instrumented("orchestrator")
+    async def stream_request(self, user_message: str, user_profile: Dict,
+                             conversation_history: list = []) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        route_request as (event, data) pairs: "agent" once routed, then
+        "delta" text chunks; CHAT replies are streamed token by token.
+        A "degraded" event with the reason precedes fallback text; the
+        chat budget covers routing and the reply's first chunk.
+        """
+        deadline = Deadline(self.budget)
+        try:
+            routing, speculation = await within_budget(self._route(
+                user_message, user_profile, conversation_history,
+                speculate=lambda: self.speculator.start_stream(self._general_chat_stream(user_message, user_profile)),
+            ), deadline.remaining())
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            reply = self._fallback_reply(degradation_reason(e) if isinstance(e, DEGRADING) else "error")
+            if reply["degraded"] == "error":
+                print(f"Orchestrator error: {e}")
+            yield "agent", {"agent_used": "CHAT", "confidence": 0.5, "routed_by": "fallback"}
+            yield "degraded", {"reason": reply["degraded"]}
+            yield "delta", {"text": reply["response"]}
+            return
+
+        yield "agent", {"agent_used": routing["agent"], "confidence": routing.get("confidence", 0.8),
+                        "routed_by": routing["routed_by"]}
+        if "degraded" in routing:
+            yield "degraded", {"reason": routing["degraded"]}
+        if routing["agent"] == "CHAT":
+            if speculation is not None:
+                chunks = self.speculator.keep_stream(speculation)
+            else:
+                chunks = self._general_chat_stream(user_message, user_profile)
+            sent_any = False
+            try:
+                async for text in stream_within_budget(chunks, deadline, first_only=True):
+                    sent_any = True
+                    yield "delta", {"text": text}
+            except DEGRADING as e:
+                if sent_any:
+                    raise
+                reply = self._fallback_reply(degradation_reason(e))
+                yield "degraded", {"reason": reply["degraded"]}
+                yield "delta", {"text": reply["response"]}
+        else:
+            if speculation is not None:
+                self.speculator.discard(speculation)
+            try:
+                text = await within_budget(self._execute_agent_action(routing, user_message, user_profile),
+                                           deadline.remaining())
+            except LLMOverloaded:
+                raise
+            except Exception as e:
+                reply = self._fallback_reply(degradation_reason(e) if isinstance(e, DEGRADING) else "error")
+                if reply["degraded"] == "error":
+                    print(f"Orchestrator error: {e}")
+                yield "degraded", {"reason": reply["degraded"]}
+                text = reply["response"]
+            yield "delta", {"text": text}
+
+    async def _route(self, user_message: str, user_profile: Dict, conversation_history: list,
+                     speculate: Callable[[], Speculation] = None) -> Tuple[Dict, Optional[Speculation]]:
+        """
+        Decide which agent should handle the message: locally when the
+        intent classifier is confident, otherwise by asking the LLM.
+        While the LLM decides, `speculate` may start the likely CHAT reply;
+        it is returned alongside the decision for the caller to keep or discard.
+        """
+        routing, guess = self.intent_classifier.decide(user_message)
+        if routing is not None:
+            return dict(routing, routed_by="local"), None
+
+        speculation = speculate() if speculate is not None and self.speculator.wants(guess) else None
+        try:
+            routing = await self._llm_route(user_message, user_profile, conversation_history)
+            return dict(routing, routed_by="llm"), speculation
+        except CircuitOpen as e:
+            # Routing model unavailable: go with the local classifier's best guess
+            return {"agent": guess, "action": "local", "parameters": {}, "confidence": 0.5,
+                    "reasoning": "local guess", "degraded": degradation_reason(e), "routed_by": "fallback"}, speculation
+        except BaseException:
+            if speculation is not None:
+                self.speculator.discard(speculation)
+            raise
+
+    @instrumented("orchestrator")
+    async def _llm_route(self, user_message: str, user_profile: Dict, conversation_history: list) -> Dict:
+        """
+        Ask the LLM which agent should handle the message
         """
         
         system_prompt = """You are an intelligent orchestrator for a skincare AI system.
@@ -36,55 +187,34 @@ Decide which agent to use and return ONLY valid JSON:
 }
 """
 
-        try:
-            # Build conversation context
-            context = "\n".join([
-                f"{msg['role']}: {msg['content']}" 
-                for msg in conversation_history[-5:]  # Last 5 messages
-            ])
-            
-            message = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=500,
-                temperature=0.1,
-                system=system_prompt,
-                messages=[{
-                    "role": "user",
-                    "content": f"""User profile: {json.dumps(user_profile)}
+        # Build conversation context
+        context = "\n".join([
+            f"{msg['role']}: {msg['content']}" 
+            for msg in conversation_history[-5:]  # Last 5 messages
+        ])
+        
+        return await self.output.request(self.client, dict(
+            agent="orchestrator",
+            model="claude-sonnet-4-20250514",
+            max_tokens=500,
+            temperature=0.1,
+            system=[cached_text(system_prompt)],
+            messages=[{
+                "role": "user",
+                "content": [
+                    # Same for every turn of a user's session: cached after the first
+                    cached_text(f"User profile: {json.dumps(user_profile, sort_keys=True)}"),
+                    {"type": "text", "text": f"""
 
 Conversation context:
 {context}
 
 New message: {user_message}
 
-Route this request."""
-                }]
-            )
-            
-            response_text = message.content[0].text.strip()
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            
-            routing = json.loads(response_text)
-            
-            # Execute the routed action
-            result = await self._execute_agent_action(routing, user_message, user_profile)
-            
-            return {
-                "agent_used": routing["agent"],
-                "response": result,
-                "confidence": routing.get("confidence", 0.8)
-            }
-            
-        except Exception as e:
-            print(f"Orchestrator error: {e}")
-            return {
-                "agent_used": "CHAT",
-                "response": "I'm here to help! Could you rephrase that?",
-                "confidence": 0.5
-            }
+Route this request."""},
+                ]
+            }]
+        ), required_keys=("agent",))
     
     async def _execute_agent_action(self, routing: Dict, message: str, profile: Dict) -> str:
         """
@@ -108,33 +238,60 @@ Route this request."""
         else:
             return "I can help with that! Could you provide more details?"
     
-    async def _general_chat(self, message: str, profile: Dict) -> str:
-        """
-        General conversational AI
-        """
+    def _general_chat_request(self, message: str, profile: Dict) -> Dict:
         system_prompt = """You are a friendly skincare advisor AI. 
 
 Provide helpful, accurate information about skincare.
 Be conversational and empathetic.
 Keep responses concise (2-3 paragraphs max).
 """
+        return dict(
+            agent="orchestrator",
+            model="claude-sonnet-4-20250514",
+            max_tokens=500,
+            temperature=0.7,
+            system=[cached_text(system_prompt)],
+            messages=[{
+                "role": "user",
+                "content": [
+                    cached_text(f"User profile: {json.dumps(profile, sort_keys=True)}"),
+                    {"type": "text", "text": f"\n\nMessage: {message}"},
+                ]
+            }]
+        )
 
+    @instrumented("orchestrator")
+    async def _general_chat(self, message: str, profile: Dict) -> str:
+        """
+        General conversational AI
+        """
         try:
-            response = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=500,
-                temperature=0.7,
-                system=system_prompt,
-                messages=[{
-                    "role": "user",
-                    "content": f"User profile: {json.dumps(profile)}\n\nMessage: {message}"
-                }]
-            )
+            response = await self.client.create_message(**self._general_chat_request(message, profile))
             
             return response.content[0].text
             
+        except (LLMOverloaded, CircuitOpen):
+            raise
         except Exception as e:
+            count_fallback("orchestrator", "_general_chat")
             return "I'm here to help with your skincare questions!"
+
+    async def _general_chat_stream(self, message: str, profile: Dict) -> AsyncIterator[str]:
+        """
+        _general_chat, yielding the reply as it is generated
+        """
+        sent_any = False
+        try:
+            async for text in self.client.stream_text(**self._general_chat_request(message, profile)):
+                sent_any = True
+                yield text
+        except (LLMOverloaded, CircuitOpen):
+            raise
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            if not sent_any:
+                count_fallback("orchestrator", "_general_chat_stream")
+                yield "I'm here to help with your skincare questions!"
     
     def _format_profile_response(self, analysis: Dict) -> str:
         """
@@ -1,12 +1,33 @@
-from anthropic import Anthropic
 import json
+import re
 from typing import Dict, List
-import os
+from .llm_client import LLMClient, cached_text, get_llm_client
+from .dispatcher import LLMOverloaded
+from .latency_budget import DEGRADING, degradation_reason, degraded, latency_budget, within_budget
+from .structured_output import StructuredOutput, get_structured_output
+from monitoring.instrumentation import count_fallback, instrumented
+
+SKIN_TYPES = ("combination", "sensitive", "oily", "dry", "normal")
+
+# concern -> words in a description that point to it
+CONCERN_KEYWORDS = {
+    "acne": ("acne", "breakout", "pimple", "blemish", "spots"),
+    "wrinkles": ("wrinkle", "fine line", "aging", "ageing"),
+    "dark_spots": ("dark spot", "hyperpigmentation", "pigmentation", "melasma", "acne scar"),
+    "redness": ("redness", "red ", "rosacea", "flush"),
+    "dryness": ("dry", "flaky", "tight"),
+    "oiliness": ("oily", "shiny", "greasy"),
+    "sensitivity": ("sensitive", "sting", "irritat"),
+}
 
 class ProfileIntelligenceAgent:
-    def __init__(self):
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    def __init__(self, client: LLMClient = None, output: StructuredOutput = None):
+        self.client = client or get_llm_client()
+        self.output = output or get_structured_output()
+        # Past this, the profile comes from keyword matching
+        self.budget = latency_budget("profile")
         
+    @instrumented("profile")
     async def analyze_description(self, description: str) -> Dict:
         """
         Extract structured profile from natural language
@@ -33,30 +54,26 @@ Extract structured information and return ONLY valid JSON (no markdown, no backt
 Be thorough but only extract what's mentioned or clearly implied."""
 
         try:
-            message = self.client.messages.create(
+            analysis = await within_budget(self.output.request(self.client, dict(
+                agent="profile",
                 model="claude-sonnet-4-20250514",
                 max_tokens=2000,
                 temperature=0.3,
-                system=system_prompt,
+                system=[cached_text(system_prompt)],
                 messages=[{
                     "role": "user",
                     "content": f"User describes their skin: {description}"
                 }]
-            )
-            
-            response_text = message.content[0].text.strip()
-            
-            # Remove markdown code blocks if present
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            
-            analysis = json.loads(response_text)
+            ), required_keys=("skin_type", "concerns")), self.budget)
             return analysis
             
+        except LLMOverloaded:
+            raise
+        except DEGRADING as e:
+            return degraded(self._fallback_profile(description), degradation_reason(e))
         except Exception as e:
             print(f"Profile analysis error: {e}")
+            count_fallback("profile", "analyze_description")
             return {
                 "error": str(e),
                 "skin_type": "normal",
@@ -64,6 +81,7 @@ Be thorough but only extract what's mentioned or clearly implied."""
                 "confidence": 0.0
             }
     
+    @instrumented("profile")
     async def generate_questions(self, current_profile: Dict) -> List[str]:
         """
         Generate contextual follow-up questions
@@ -76,31 +94,40 @@ Be empathetic and specific. Return ONLY a JSON array of strings:
 """
 
         try:
-            message = self.client.messages.create(
+            questions = await within_budget(self.output.request(self.client, dict(
+                agent="profile",
                 model="claude-sonnet-4-20250514",
                 max_tokens=500,
                 temperature=0.7,
-                system=system_prompt,
+                system=[cached_text(system_prompt)],
                 messages=[{
                     "role": "user",
                     "content": f"Current profile: {json.dumps(current_profile)}"
                 }]
-            )
-            
-            response_text = message.content[0].text.strip()
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            
-            questions = json.loads(response_text)
+            ), min_items=1), self.budget)
             return questions
             
+        except LLMOverloaded:
+            raise
         except Exception as e:
             print(f"Question generation error: {e}")
+            count_fallback("profile", "generate_questions")
             return [
                 "How does your skin feel by midday?",
                 "Do you have any specific product preferences?",
                 "What's your main skin goal right now?"
             ]
 
+    def _fallback_profile(self, description: str) -> Dict:
+        """
+        Skin type and concerns by keyword, when the LLM is over budget or unavailable
+        """
+        text = f" {description.lower()} "
+        skin_type = next((t for t in SKIN_TYPES if re.search(rf"\b{t}\b", text)), "normal")
+        concerns = [concern for concern, words in CONCERN_KEYWORDS.items() if any(word in text for word in words)]
+        return {
+            "skin_type": skin_type,
+            "concerns": concerns,
+            "confidence": 0.3,
+            "follow_up_questions": ["How does your skin feel by midday?"],
+        }
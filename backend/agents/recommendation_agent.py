@@ -1,12 +1,65 @@
-from anthropic import Anthropic
 import json
-from typing import Dict, List
-import os
+from typing import AsyncIterator, Dict, List, Tuple
+from .llm_client import LLMClient, cached_text, get_llm_client
+from .dispatcher import LLMOverloaded
+from .interactions import get_interaction_graph
+from .latency_budget import (DEGRADING, Deadline, degradation_reason, degraded, latency_budget,
+                             stream_within_budget, within_budget)
+from .normalizer import get_normalizer
+from .structured_output import JsonSectionStream, StructuredOutput, get_structured_output
+from monitoring.instrumentation import count_fallback, instrumented
+
+# A routine without these is re-requested from where the reply stopped
+ROUTINE_SECTIONS = ("morning", "night")
+
+# Rule-based routine, used when the LLM is over budget or unavailable
+CLEANSERS = {
+    "oily": "Gel or foaming cleanser",
+    "dry": "Cream or milky cleanser",
+    "combination": "Gentle gel cleanser",
+    "sensitive": "Fragrance-free gentle cleanser",
+}
+MOISTURIZERS = {
+    "oily": "Oil-free gel moisturizer",
+    "dry": "Rich ceramide cream",
+    "combination": "Lightweight lotion",
+    "sensitive": "Fragrance-free barrier cream",
+}
+TREATMENTS = {
+    "acne": "Salicylic acid (BHA) serum",
+    "dark_spots": "Vitamin C serum",
+    "wrinkles": "Retinol serum",
+    "redness": "Niacinamide serum",
+    "dryness": "Hyaluronic acid serum",
+}
+
+
+def safe_treatments(concerns: List[str], allergies: List[str]) -> List[str]:
+    """
+    TREATMENTS for the concerns, in order, minus those with an active the
+    user is allergic to and those that interact with an earlier pick
+    """
+    normalizer = get_normalizer()
+    graph = get_interaction_graph()
+    allergens = {i for allergy in allergies for i in normalizer.ids(allergy)}
+    picked = []
+    for concern in concerns:
+        treatment = TREATMENTS.get(concern)
+        if treatment is None or treatment in picked or allergens.intersection(normalizer.ids(treatment)):
+            continue
+        if not graph.check(picked + [treatment]).warnings:
+            picked.append(treatment)
+    return picked
+
 
 class RecommendationAgent:
-    def __init__(self):
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    def __init__(self, client: LLMClient = None, output: StructuredOutput = None):
+        self.client = client or get_llm_client()
+        self.output = output or get_structured_output()
+        # Past this, a routine comes from the rule-based template
+        self.budget = latency_budget("routine")
     
+    @instrumented("recommendation")
     async def find_alternatives(self, product: Dict, user_profile: Dict, reason: str = "better_match") -> List[Dict]:
         """
         Find alternative products
@@ -34,11 +87,12 @@ Return ONLY valid JSON:
 """
 
         try:
-            message = self.client.messages.create(
+            alternatives = await self.output.request(self.client, dict(
+                agent="recommendation",
                 model="claude-sonnet-4-20250514",
                 max_tokens=2000,
                 temperature=0.5,
-                system=system_prompt,
+                system=[cached_text(system_prompt)],
                 messages=[{
                     "role": "user",
                     "content": f"""Current product: {json.dumps(product)}
@@ -49,26 +103,17 @@ Reason for alternatives: {reason}
 
 Find 3 better alternatives."""
                 }]
-            )
-            
-            response_text = message.content[0].text.strip()
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            
-            alternatives = json.loads(response_text)
+            ), min_items=3)
             return alternatives
             
+        except LLMOverloaded:
+            raise
         except Exception as e:
             print(f"Recommendation error: {e}")
+            count_fallback("recommendation", "find_alternatives")
             return []
     
-    async def build_routine(self, user_profile: Dict, budget: str = "mid-range") -> Dict:
-        """
-        Generate complete skincare routine
-        """
-        
+    def _routine_request(self, user_profile: Dict, budget: str) -> Dict:
         system_prompt = """Create a personalized skincare routine with specific product recommendations.
 
 Include:
@@ -95,32 +140,98 @@ Return ONLY valid JSON:
     "tips": ["Always apply on damp skin", "Wait 1 min between steps"]
 }
 """
-
-        try:
-            message = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=3000,
-                temperature=0.4,
-                system=system_prompt,
-                messages=[{
-                    "role": "user",
-                    "content": f"""User profile: {json.dumps(user_profile)}
+        return dict(
+            agent="recommendation",
+            model="claude-sonnet-4-20250514",
+            max_tokens=3000,
+            temperature=0.4,
+            system=[cached_text(system_prompt)],
+            messages=[{
+                "role": "user",
+                "content": f"""User profile: {json.dumps(user_profile)}
 
 Budget: {budget}
 
 Create a complete routine."""
-                }]
-            )
-            
-            response_text = message.content[0].text.strip()
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            
-            routine = json.loads(response_text)
+            }]
+        )
+
+    @instrumented("recommendation")
+    async def build_routine(self, user_profile: Dict, budget: str = "mid-range") -> Dict:
+        """
+        Generate complete skincare routine
+        """
+        try:
+            routine = await within_budget(self.output.request(
+                self.client, self._routine_request(user_profile, budget), required_keys=ROUTINE_SECTIONS
+            ), self.budget)
             return routine
             
+        except LLMOverloaded:
+            raise
+        except DEGRADING as e:
+            return degraded(self._fallback_routine(user_profile, budget), degradation_reason(e))
         except Exception as e:
             print(f"Routine generation error: {e}")
             return {"error": str(e)}
+
+    @instrumented("recommendation")
+    async def stream_routine(self, user_profile: Dict, budget: str = "mid-range") -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        build_routine as (event, data) pairs: one "section" per top-level key
+        ("morning" is sent while "night" is still generating), then "routine"
+        with the whole result, or "error". Past the routine budget the
+        sections not sent yet come from the rule-based template.
+        """
+        request = self._routine_request(user_profile, budget)
+        sections = JsonSectionStream()
+        deadline = Deadline(self.budget)
+        sent = {}
+        try:
+            async for text in stream_within_budget(self.client.stream_text(**request), deadline):
+                for name, value in sections.feed(text):
+                    sent[name] = value
+                    yield "section", {"name": name, "data": value}
+            routine = await within_budget(self.output.complete(self.client, request, sections.text,
+                                                               required_keys=ROUTINE_SECTIONS), deadline.remaining())
+            for name, value in sections.remaining(routine):
+                yield "section", {"name": name, "data": value}
+            yield "routine", routine
+
+        except LLMOverloaded:
+            raise
+        except DEGRADING as e:
+            # Sections already sent stay; the template fills in the rest
+            fallback = self._fallback_routine(user_profile, budget)
+            for name, value in fallback.items():
+                if name not in sent:
+                    yield "section", {"name": name, "data": value}
+            yield "routine", degraded(dict(fallback, **sent), degradation_reason(e))
+        except Exception as e:
+            print(f"Routine generation error: {e}")
+            yield "error", {"error": str(e)}
+
+    def _fallback_routine(self, user_profile: Dict, budget: str = "mid-range") -> Dict:
+        """
+        Basic routine from skin type and concerns, no LLM involved
+        """
+        skin_type = (user_profile.get("skin_type") or "normal").lower()
+        concerns = [c.lower().replace(" ", "_") for c in user_profile.get("concerns") or []]
+        treatments = safe_treatments(concerns, user_profile.get("allergies") or []) or ["Hydrating serum"]
+        cleanser = CLEANSERS.get(skin_type, "Gentle cleanser")
+        moisturizer = MOISTURIZERS.get(skin_type, "Daily moisturizer")
+
+        def steps(*picks):
+            return [{"step": i, "product_type": product_type, "recommendation": pick,
+                     "why": f"Suited to {skin_type} skin"}
+                    for i, (product_type, pick) in enumerate(picks, start=1)]
+
+        return {
+            "morning": steps(("Cleanser", cleanser), ("Serum", treatments[0]), ("Moisturizer", moisturizer),
+                             ("Sunscreen", "Broad-spectrum sunscreen SPF 30+")),
+            "night": steps(("Cleanser", cleanser), *[("Treatment", t) for t in treatments[:2]],
+                           ("Moisturizer", moisturizer)),
+            "weekly": [],
+            "budget": budget,
+            "tips": ["Introduce one new product at a time", "Patch test actives before full use"],
+        }
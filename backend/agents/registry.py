@@ -0,0 +1,154 @@
+import importlib
+
+# name -> (module, class); modules are imported on first use to keep startup cheap
+AGENT_CLASSES = {
+    "profile": (".profile_agent", "ProfileIntelligenceAgent"),
+    "analysis": (".analysis_agent", "AnalysisAgent"),
+    "recommendation": (".recommendation_agent", "RecommendationAgent"),
+    "orchestrator": (".orchestrator", "OrchestratorAgent"),
+}
+
+
+class AgentRegistry:
+    """
+    Builds each agent once, on first use, all sharing one LLM client and
+    one set of caches. Everything stateful is owned by the registry, so two
+    registries (e.g. two apps on different databases) share nothing.
+    """
+
+    def __init__(self, client=None, session_factory=None):
+        self._client = client
+        self._owns_client = client is None
+        # None: database.connection.AsyncSessionLocal
+        self._session_factory = session_factory
+        self._agents = {}
+        self._components = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            from .llm_client import LLMClient
+            self._client = LLMClient()
+        return self._client
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from database.connection import AsyncSessionLocal
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory
+
+    def _component(self, name: str, build):
+        component = self._components.get(name)
+        if component is None:
+            component = self._components[name] = build()
+        return component
+
+    @property
+    def analysis_cache(self):
+        from .analysis_cache import AnalysisCache
+        return self._component("analysis_cache", AnalysisCache)
+
+    @property
+    def ingredient_store(self):
+        from .ingredient_store import IngredientStore
+        return self._component("ingredient_store", lambda: IngredientStore(self.session_factory))
+
+    @property
+    def structured_output(self):
+        from .structured_output import StructuredOutput
+        return self._component("structured_output", StructuredOutput)
+
+    @property
+    def intent_classifier(self):
+        """
+        The orchestrator's routing model; training it does not build any agent
+        """
+        from .intent_classifier import IntentClassifier
+        return self._component("intent_classifier", IntentClassifier)
+
+    def get(self, name: str):
+        agent = self._agents.get(name)
+        if agent is None:
+            agent = self._agents[name] = self._build(name)
+        return agent
+
+    def _build(self, name: str):
+        module_name, class_name = AGENT_CLASSES[name]
+        agent_class = getattr(importlib.import_module(module_name, __package__), class_name)
+
+        if name == "orchestrator":
+            return agent_class(
+                self.client,
+                profile_agent=self.profile,
+                analysis_agent=self.analysis,
+                recommendation_agent=self.recommendation,
+                intent_classifier=self.intent_classifier,
+                output=self.structured_output,
+            )
+        if name == "analysis":
+            return agent_class(
+                self.client,
+                cache=self.analysis_cache,
+                ingredient_store=self.ingredient_store,
+                output=self.structured_output,
+            )
+        return agent_class(self.client, output=self.structured_output)
+
+    @property
+    def profile(self):
+        return self.get("profile")
+
+    @property
+    def analysis(self):
+        return self.get("analysis")
+
+    @property
+    def recommendation(self):
+        return self.get("recommendation")
+
+    @property
+    def orchestrator(self):
+        return self.get("orchestrator")
+
+    async def train_intent_classifier(self) -> int:
+        """
+        Refit the orchestrator's local routing model on logged conversations
+        """
+        try:
+            return await self.intent_classifier.train_from_history(self.session_factory)
+        except Exception as e:
+            print(f"Intent classifier training error: {e}")
+            return 0
+
+    async def warm_analysis_cache(self) -> int:
+        """
+        Preload scan results computed offline by jobs.preanalyze_catalog
+        """
+        try:
+            return await self.analysis_cache.warm(self.session_factory)
+        except Exception as e:
+            print(f"Analysis cache warm-up error: {e}")
+            return 0
+
+    def stats(self) -> dict:
+        """
+        stats() of the shared client and agent components, for /metrics;
+        nothing is built just to report on it
+        """
+        stats = {name: component.stats() for name, component in self._components.items()}
+        if self._client is not None:
+            stats["llm"] = self._client.stats()
+        orchestrator = self._agents.get("orchestrator")
+        if orchestrator is not None:
+            stats["speculator"] = orchestrator.speculator.stats()
+        return stats
+
+    async def close(self):
+        """
+        Close the client if this registry created it
+        """
+        if self._client is not None and self._owns_client:
+            await self._client.close()
+            self._client = None
+        self._agents.clear()
@@ -0,0 +1,148 @@
+from typing import Dict, List, Sequence
+import numpy as np
+
+from .normalizer import IngredientNormalizer, get_normalizer
+
+BASE_SCORE = 70
+ALLERGY_PENALTY = -30
+
+# (skin_type, any of these ingredients, score delta, kind, message), applied in order
+FALLBACK_RULES = [
+    ("dry", ("alcohol", "alcohol denat"), -20, "warning", "❌ Contains alcohol - drying for your skin"),
+    ("dry", ("hyaluronic acid", "sodium hyaluronate"), 10, "benefit", "✅ Hyaluronic acid - great for hydration"),
+    ("sensitive", ("fragrance", "parfum"), -15, "warning", "⚠️ Contains fragrance - may irritate"),
+]
+
+
+def _ingredients_of(product) -> List[str]:
+    """
+    Accept product dicts or ProductDB rows
+    """
+    if isinstance(product, dict):
+        return product.get("ingredients", []) or []
+    return product.ingredients or []
+
+
+class ScoringEngine:
+    """
+    Rule-based product scoring compiled to matrices, so a whole catalog
+    can be scored against one or many profiles in a single pass.
+
+    Ingredients, rule terms and allergies all go through the shared
+    normalizer, so columns are canonical ingredient IDs. products x terms (P)
+    is a 0/1 incidence matrix over every ID a rule or allergy mentions;
+    rules and allergies become terms x rules / terms x allergies matrices,
+    and scores are P @ weights.
+    """
+
+    def __init__(self, rules=FALLBACK_RULES, normalizer: IngredientNormalizer = None):
+        self.rules = rules
+        self.normalizer = normalizer or get_normalizer()
+        self.rule_ids = [[self.normalizer.id_for(t) for t in terms] for _, terms, _, _, _ in rules]
+        self.rule_skin_types = np.array([r[0] for r in rules], dtype=object)
+        self.rule_deltas = np.array([r[2] for r in rules], dtype=np.int64)
+
+    def _compile(self, products: Sequence, profiles: Sequence[Dict]):
+        vocab: Dict[int, int] = {}
+        for ids in self.rule_ids:
+            for ingredient_id in ids:
+                vocab.setdefault(ingredient_id, len(vocab))
+
+        # One entry per listed allergy: (profile index, text, ingredient IDs)
+        allergies = []
+        for p, profile in enumerate(profiles):
+            for allergy in profile.get("allergies", []) or []:
+                ids = self.normalizer.ids(allergy)
+                for ingredient_id in ids:
+                    vocab.setdefault(ingredient_id, len(vocab))
+                allergies.append((p, allergy.lower(), ids))
+
+        # products x terms incidence
+        rows, cols = [], []
+        for i, product in enumerate(products):
+            for ingredient in _ingredients_of(product):
+                for ingredient_id in self.normalizer.ids(ingredient):
+                    j = vocab.get(ingredient_id)
+                    if j is not None:
+                        rows.append(i)
+                        cols.append(j)
+        incidence = np.zeros((len(products), len(vocab)), dtype=np.int64)
+        incidence[rows, cols] = 1
+
+        # terms x rules: does the rule fire on this term
+        rule_terms = np.zeros((len(vocab), len(self.rules)), dtype=np.int64)
+        for r, ids in enumerate(self.rule_ids):
+            rule_terms[[vocab[i] for i in ids], r] = 1
+
+        # terms x allergies, and allergies x profiles ownership
+        allergy_terms = np.zeros((len(vocab), len(allergies)), dtype=np.int64)
+        owners = np.zeros((len(allergies), len(profiles)), dtype=np.int64)
+        for a, (p, _, ids) in enumerate(allergies):
+            allergy_terms[[vocab[i] for i in ids], a] = 1
+            owners[a, p] = 1
+
+        skin_types = np.array([p.get("skin_type", "normal") for p in profiles], dtype=object)
+        applies = self.rule_skin_types[:, None] == skin_types[None, :]  # rules x profiles
+
+        return allergies, incidence, rule_terms, allergy_terms, owners, applies
+
+    def _evaluate(self, products: Sequence, profiles: Sequence[Dict]):
+        allergies, incidence, rule_terms, allergy_terms, owners, applies = self._compile(products, profiles)
+
+        rule_hits = (incidence @ rule_terms) > 0  # products x rules
+        allergy_hits = (incidence @ allergy_terms) > 0  # products x allergies
+        weights = applies * self.rule_deltas[:, None]  # rules x profiles
+        scores = BASE_SCORE + rule_hits @ weights + ALLERGY_PENALTY * (allergy_hits @ owners)
+        return scores, allergies, allergy_hits, rule_hits, applies
+
+    def score_matrix(self, products: Sequence, profiles: Sequence[Dict]) -> np.ndarray:
+        """
+        Raw (unclamped) scores, shape (len(products), len(profiles))
+        """
+        return self._evaluate(products, profiles)[0]
+
+    def score(self, products: Sequence, profiles: Sequence[Dict]) -> List[List[Dict]]:
+        """
+        Full fallback analyses, result[i][j] for products[i] and profiles[j]
+        """
+        scores, allergies, allergy_hits, rule_hits, applies = self._evaluate(products, profiles)
+
+        results = []
+        for i in range(len(products)):
+            row = []
+            for j in range(len(profiles)):
+                warnings = [
+                    f"⚠️ Contains {text} - you're allergic!"
+                    for a, (p, text, _) in enumerate(allergies) if p == j and allergy_hits[i, a]
+                ]
+                benefits = []
+                for r, (_, _, _, kind, message) in enumerate(self.rules):
+                    if applies[r, j] and rule_hits[i, r]:
+                        (warnings if kind == "warning" else benefits).append(message)
+                row.append(self._result(int(scores[i, j]), warnings, benefits))
+            results.append(row)
+        return results
+
+    def score_one(self, product, profile: Dict) -> Dict:
+        return self.score([product], [profile])[0][0]
+
+    def rank(self, products: Sequence, profile: Dict, top_k: int = None) -> List[tuple]:
+        """
+        (index, score) pairs for the best-scoring products for one profile
+        """
+        scores = np.clip(self.score_matrix(products, [profile])[:, 0], 0, 100)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [(int(i), int(scores[i])) for i in order]
+
+    @staticmethod
+    def _result(score: int, warnings: List[str], benefits: List[str]) -> Dict:
+        return {
+            "overall_score": max(0, min(100, score)),
+            "recommendation": "recommended" if score >= 70 else "caution" if score >= 50 else "not_recommended",
+            "summary": f"Score: {score}/100",
+            "ingredient_analyses": [],
+            "warnings": warnings,
+            "benefits": benefits,
+            "interactions": [],
+            "usage_tips": []
+        }
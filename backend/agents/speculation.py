@@ -0,0 +1,115 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Dict, Optional
+import asyncio
+import os
+import statistics
+import time
+
+# off:    never speculate
+# chat:   start the CHAT reply alongside LLM routing when the local classifier's best guess is CHAT
+# always: start it for every message that goes to LLM routing
+SPECULATION_MODES = ("off", "chat", "always")
+
+
+@dataclass
+class Speculation:
+    task: asyncio.Task
+    started: float
+    queue: Optional[asyncio.Queue] = None
+
+
+class Speculator:
+    """
+    Runs the likely downstream call while the routing call is in flight,
+    then either keeps its result or cancels it. Tracks how often the guess
+    was wasted and how much latency the kept ones saved.
+    """
+
+    def __init__(self, mode: str = None, window: int = 1000):
+        self.mode = mode or os.getenv("ORCHESTRATOR_SPECULATION", "off")
+        if self.mode not in SPECULATION_MODES:
+            raise ValueError(f"ORCHESTRATOR_SPECULATION must be one of {SPECULATION_MODES}, got {self.mode!r}")
+        self.started = 0
+        self.used = 0
+        self.wasted = 0
+        self.wasted_completed = 0  # finished before being discarded: full token cost spent
+        self.saved_seconds = 0.0
+        self._saved = deque(maxlen=window)
+
+    def wants(self, guess: str) -> bool:
+        return self.mode == "always" or (self.mode == "chat" and guess == "CHAT")
+
+    @staticmethod
+    async def _timed(call: Awaitable):
+        started = time.perf_counter()
+        result = await call
+        return result, time.perf_counter() - started
+
+    def start(self, call: Awaitable) -> Speculation:
+        self.started += 1
+        return Speculation(asyncio.create_task(self._timed(call)), time.perf_counter())
+
+    def start_stream(self, chunks: AsyncIterator[str]) -> Speculation:
+        """
+        Buffer a streamed reply until the route is known
+        """
+        queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for chunk in chunks:
+                    queue.put_nowait(chunk)
+            finally:
+                queue.put_nowait(None)
+
+        self.started += 1
+        return Speculation(asyncio.create_task(self._timed(pump())), time.perf_counter(), queue)
+
+    def _record_used(self, head_start: float, call_seconds: float):
+        # Sequential would be routing + call; speculative is max(routing, call)
+        saved = min(head_start, call_seconds)
+        self.used += 1
+        self.saved_seconds += saved
+        self._saved.append(saved)
+
+    async def keep(self, speculation: Speculation):
+        head_start = time.perf_counter() - speculation.started
+        result, call_seconds = await speculation.task
+        self._record_used(head_start, call_seconds)
+        return result
+
+    async def keep_stream(self, speculation: Speculation) -> AsyncIterator[str]:
+        head_start = time.perf_counter() - speculation.started
+        try:
+            while True:
+                chunk = await speculation.queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+            _, call_seconds = await speculation.task
+            self._record_used(head_start, call_seconds)
+        finally:
+            if not speculation.task.done():
+                speculation.task.cancel()
+
+    def discard(self, speculation: Speculation):
+        self.wasted += 1
+        if speculation.task.done():
+            if not speculation.task.cancelled() and speculation.task.exception() is None:
+                self.wasted_completed += 1
+        else:
+            speculation.task.cancel()
+
+    def stats(self) -> Dict:
+        decided = self.used + self.wasted
+        return {
+            "mode": self.mode,
+            "started": self.started,
+            "used": self.used,
+            "wasted": self.wasted,
+            "wasted_completed": self.wasted_completed,
+            "waste_rate": self.wasted / decided if decided else 0.0,
+            "saved_p50_ms": statistics.median(self._saved) * 1000 if self._saved else 0.0,
+            "saved_total_seconds": round(self.saved_seconds, 3),
+        }
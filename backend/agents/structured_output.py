@@ -0,0 +1,264 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import os
+import time
+import jiter
+
+
+class StructuredOutputError(ValueError):
+    """
+    The reply holds no usable JSON, even after repair
+    """
+
+
+def json_body(text: str) -> str:
+    """
+    Text from the first { or [ on: skips a leading ```json fence or any other preamble
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):] if starts else ""
+
+
+def parse_json(text: str) -> Any:
+    """
+    Strict parse of the JSON object or array in a reply, ignoring fences
+    and trailing prose; raises StructuredOutputError
+    """
+    body = json_body(text)
+    body = body[:max(body.rfind("}"), body.rfind("]")) + 1]
+    try:
+        return jiter.from_json(body.encode())
+    except ValueError as e:
+        raise StructuredOutputError(f"invalid JSON: {e}") from None
+
+
+def member_ends(body: str) -> List[int]:
+    """
+    Offsets of the ',' (or closing bracket) after each top-level member of
+    a JSON object or array, from a lexical scan that survives truncation
+    """
+    ends = []
+    depth = 0
+    in_string = escaped = False
+    for i, char in enumerate(body):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                ends.append(i)
+                break
+        elif char == "," and depth == 1:
+            ends.append(i)
+    return ends
+
+
+def repair_json(text: str) -> Tuple[Any, Optional[str]]:
+    """
+    (value, prefix) for a truncated or malformed reply: the longest run of
+    complete top-level members that parses, closed off. `prefix` is the
+    JSON text of those members without the closing bracket, which is where
+    a continuation picks up; None when the value itself was complete and
+    only the text around it was off.
+    """
+    body = json_body(text)
+    if not body:
+        raise StructuredOutputError("reply has no JSON object or array")
+    closer = "}" if body[0] == "{" else "]"
+    for end in reversed(member_ends(body)):
+        if body[end] == closer:
+            try:
+                return jiter.from_json(body[:end + 1].encode()), None
+            except ValueError:
+                continue
+        prefix = body[:end].rstrip()
+        try:
+            return jiter.from_json((prefix + closer).encode()), prefix
+        except ValueError:
+            continue
+    return ({} if closer == "}" else []), body[0]
+
+
+def missing_sections(value: Any, required_keys: Sequence[str] = (), min_items: int = 0) -> List:
+    """
+    Required object keys, or array positions below `min_items`, that the value lacks
+    """
+    if isinstance(value, dict):
+        return [key for key in required_keys if key not in value]
+    if isinstance(value, list):
+        return list(range(len(value), min_items))
+    return []
+
+
+def continuation_request(request: Dict, prefill: str) -> Dict:
+    """
+    The original request with the recovered JSON prefilled as the assistant
+    turn, so the model only generates what comes after it
+    """
+    return dict(request, messages=list(request["messages"]) + [{"role": "assistant", "content": prefill}])
+
+
+class JsonSectionStream:
+    """
+    Incremental parser for a streamed JSON object or array.
+
+    feed() returns the top-level members (object keys or array indexes)
+    that are complete, i.e. the model has moved on to the next one, so
+    "morning" can be sent before "night" has been generated.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._emitted = 0
+
+    @staticmethod
+    def _members(parsed) -> List[Tuple[Any, Any]]:
+        if isinstance(parsed, dict):
+            return list(parsed.items())
+        if isinstance(parsed, list):
+            return list(enumerate(parsed))
+        return []
+
+    def _take(self, members: List[Tuple[Any, Any]]) -> List[Tuple[Any, Any]]:
+        fresh = members[self._emitted:]
+        self._emitted = max(self._emitted, len(members))
+        return fresh
+
+    def feed(self, delta: str) -> List[Tuple[Any, Any]]:
+        self.text += delta
+        # A member can only complete on one of these
+        if not any(char in delta for char in ",}]"):
+            return []
+        body = json_body(self.text)
+        if not body:
+            return []
+        try:
+            parsed = jiter.from_json(body.encode(), partial_mode=True)
+        except ValueError:
+            return []
+        # The last member may still be growing
+        return self._take(self._members(parsed)[:-1])
+
+    def remaining(self, parsed) -> List[Tuple[Any, Any]]:
+        """
+        Members of the final value not yet returned by feed()
+        """
+        return self._take(self._members(parsed))
+
+
+class StructuredOutput:
+    """
+    Shared JSON handling for agent replies.
+
+    A reply that does not parse is cut back to its complete top-level
+    members; the model is then asked to continue from there (the members
+    so far prefilled as its turn), so only the missing part is generated
+    again. Required keys or items absent from a complete reply are asked
+    for the same way.
+    """
+
+    def __init__(self, max_continuations: int = None):
+        self.max_continuations = (max_continuations if max_continuations is not None
+                                  else int(os.getenv("STRUCTURED_OUTPUT_CONTINUATIONS", "1")))
+        # agent -> parsed / continued / repaired / failed replies
+        self.outcomes: Dict[str, Counter] = {}
+        # agent -> continuation calls sent (a reply may need several)
+        self.continuations: Counter = Counter()
+        self.parses = 0
+        self.parse_seconds = 0.0
+
+    def _parse(self, text: str) -> Tuple[Any, Optional[str]]:
+        """
+        (value, None) when the text holds a complete value, else (repaired value, prefix)
+        """
+        started = time.perf_counter()
+        try:
+            return parse_json(text), None
+        except StructuredOutputError:
+            return repair_json(text)
+        finally:
+            self.parses += 1
+            self.parse_seconds += time.perf_counter() - started
+
+    async def request(self, client, request: Dict, required_keys: Sequence[str] = (), min_items: int = 0) -> Any:
+        """
+        Send `request` through client.create_message and return its parsed JSON
+        """
+        message = await client.create_message(**request)
+        return await self.complete(client, request, message.content[0].text, required_keys, min_items)
+
+    async def complete(self, client, request: Dict, text: str, required_keys: Sequence[str] = (),
+                       min_items: int = 0) -> Any:
+        """
+        Parse a finished reply to `request` (streamed or not), re-requesting
+        only the missing part when it is truncated, malformed or lacks a
+        required section. Returns the best value recovered; raises
+        StructuredOutputError when there is nothing usable.
+        """
+        outcomes = self.outcomes.setdefault(request.get("agent", "other"), Counter())
+        try:
+            value, prefix = self._parse(text)
+        except StructuredOutputError:
+            outcomes["failed"] += 1
+            raise
+        missing = missing_sections(value, required_keys, min_items)
+        if prefix is None and not missing:
+            outcomes["parsed"] += 1
+            return value
+
+        continuations = 0
+        while (prefix is not None or missing) and continuations < self.max_continuations:
+            if prefix is None:
+                # Complete but short: reopen it after the last member
+                body = json_body(text)
+                prefix = body[:max(body.rfind("}"), body.rfind("]"))].rstrip()
+            prefill = prefix if prefix.endswith(("{", "[")) else prefix + ","
+            continuations += 1
+            self.continuations[request.get("agent", "other")] += 1
+            try:
+                message = await client.create_message(**continuation_request(request, prefill))
+            except Exception as e:
+                print(f"Structured output continuation error: {e}")
+                break
+            text = prefill + message.content[0].text
+            value, prefix = self._parse(text)
+            missing = missing_sections(value, required_keys, min_items)
+
+        if prefix is None and not missing:
+            outcomes["continued"] += 1
+        elif value:
+            outcomes["repaired"] += 1
+        else:
+            outcomes["failed"] += 1
+            raise StructuredOutputError(f"no usable JSON in reply (missing {missing})")
+        return value
+
+    def stats(self) -> Dict:
+        totals = sum(self.outcomes.values(), Counter())
+        return {
+            "max_continuations": self.max_continuations,
+            # Replies that needed repair or a continuation to be usable
+            "recovered": totals["continued"] + totals["repaired"],
+            "by_agent": {agent: dict(counts) for agent, counts in self.outcomes.items()},
+            "continuations": dict(self.continuations),
+            "avg_parse_us": self.parse_seconds / self.parses * 1e6 if self.parses else 0.0,
+        }
+
+
+_default_output = None
+
+
+def get_structured_output() -> StructuredOutput:
+    global _default_output
+    if _default_output is None:
+        _default_output = StructuredOutput()
+    return _default_output
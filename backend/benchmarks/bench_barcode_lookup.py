@@ -0,0 +1,81 @@
+"""
+Barcode lookups per second against a large products table, for the indexed
+SQLite path, the hot in-memory tier and the negative cache.
+
+    python -m benchmarks.bench_barcode_lookup --rows 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine
+
+from database.connection import Base
+from database.models import ProductDB
+from database.product_lookup import ProductLookup
+
+BATCH = 50000
+
+
+def build_catalog(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine, tables=[ProductDB.__table__])
+    with engine.begin() as conn:
+        for start in range(0, rows, BATCH):
+            conn.execute(ProductDB.__table__.insert(), [
+                {
+                    "product_id": uuid.uuid4().hex,
+                    "barcode": f"{i:013d}",
+                    "name": f"Product {i}",
+                    "brand": "BenchLab",
+                    "category": "moisturizer",
+                    "ingredients": ["Water", "Glycerin", "Niacinamide", "Ceramides", "Squalane"],
+                }
+                for i in range(start, min(start + BATCH, rows))
+            ])
+    return engine
+
+
+def measure(label: str, lookup: ProductLookup, barcodes):
+    start = time.perf_counter()
+    for barcode in barcodes:
+        lookup.get_sync(barcode)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>28}: {len(barcodes) / elapsed:12,.0f} lookups/s  ({elapsed / len(barcodes) * 1e6:8.2f} us each)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="skincare-bench-") as workdir:
+        path = os.path.join(workdir, "catalog.db")
+        start = time.perf_counter()
+        engine = build_catalog(path, args.rows)
+        print(f"built {args.rows:,} rows in {time.perf_counter() - start:.1f}s")
+
+        rng = random.Random(1)
+        uniform = [f"{rng.randrange(args.rows):013d}" for _ in range(args.lookups)]
+        # Skewed traffic: most scans hit a small set of popular products
+        popular = [f"{rng.randrange(args.rows):013d}" for _ in range(1000)]
+        skewed = [rng.choice(popular) if rng.random() < 0.9 else f"{rng.randrange(args.rows):013d}"
+                  for _ in range(args.lookups)]
+        unknown = [f"unknown-{rng.randrange(500)}" for _ in range(args.lookups)]
+
+        measure("indexed SQLite only", ProductLookup(engine, max_entries=1), uniform)
+        measure("hot tier, 90% popular", ProductLookup(engine), skewed)
+        warm = ProductLookup(engine)
+        for barcode in popular:
+            warm.get_sync(barcode)
+        measure("hot tier, all warm", warm, [rng.choice(popular) for _ in range(args.lookups)])
+        measure("negative cache, unknown", ProductLookup(engine), unknown)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
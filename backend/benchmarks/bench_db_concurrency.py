@@ -0,0 +1,140 @@
+"""
+Mixed read/write load against the database from inside one event loop,
+the way request handlers use it. "loop lag" is how late a 1 ms timer fires
+while the load runs, i.e. how long an in-flight LLM call waits to resume.
+
+  before:  sync Session calls in async handlers, default SQLite settings
+  async:   AsyncSession (aiosqlite), default rollback journal
+  after:   AsyncSession (aiosqlite) with WAL and the tuned pragmas
+
+    python -m benchmarks.bench_db_concurrency --seconds 5 --readers 32 --writers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database.connection import Base, make_async_engine
+from database.models import FeedbackDB, User
+
+
+def seed(path: str, users: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    ids = [str(uuid.uuid4()) for _ in range(users)]
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([User(user_id=i, name="Bench", age=30, skin_type="dry", concerns=[], allergies=[],
+                         climate="temperate", lifestyle={}, medical_conditions=[]) for i in ids])
+        db.commit()
+    engine.dispose()
+    return ids
+
+
+async def run_sync(path, ids, seconds, readers, writers):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(bind=engine)
+
+    async def read_once(i):
+        with Session() as db:
+            db.get(User, ids[i % len(ids)])
+
+    async def write_once(i):
+        with Session() as db:
+            db.add(FeedbackDB(user_id=ids[i % len(ids)], product_id="bench", outcome="ok", rating=5))
+            db.commit()
+
+    try:
+        return await drive(read_once, write_once, seconds, readers, writers)
+    finally:
+        engine.dispose()
+
+
+async def run_async(engine, ids, seconds, readers, writers):
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def read_once(i):
+        async with Session() as db:
+            await db.execute(select(User).where(User.user_id == ids[i % len(ids)]))
+
+    async def write_once(i):
+        async with Session() as db:
+            db.add(FeedbackDB(user_id=ids[i % len(ids)], product_id="bench", outcome="ok", rating=5))
+            await db.commit()
+
+    try:
+        return await drive(read_once, write_once, seconds, readers, writers)
+    finally:
+        await engine.dispose()
+
+
+async def drive(read_once, write_once, seconds, readers, writers):
+    deadline = time.perf_counter() + seconds
+    read_latencies, writes, lags = [], [0], []
+
+    async def ticker():
+        # How late a 1 ms timer fires = how long other coroutines (LLM calls) wait
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    async def reader(n):
+        i = n
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await read_once(i)
+            read_latencies.append(time.perf_counter() - start)
+            i += readers
+            await asyncio.sleep(0)
+
+    async def writer(n):
+        i = n
+        while time.perf_counter() < deadline:
+            await write_once(i)
+            writes[0] += 1
+            i += writers
+            await asyncio.sleep(0)
+
+    await asyncio.gather(ticker(), *[reader(n) for n in range(readers)], *[writer(n) for n in range(writers)])
+    ms = sorted(x * 1000 for x in read_latencies)
+    lag_ms = sorted(x * 1000 for x in lags)
+    return {
+        "reads/s": len(ms) / seconds,
+        "writes/s": writes[0] / seconds,
+        "read p50 ms": statistics.median(ms) if ms else 0,
+        "read p99 ms": ms[int(len(ms) * 0.99)] if ms else 0,
+        "loop lag p99 ms": lag_ms[int(len(lag_ms) * 0.99)] if lag_ms else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=32)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="skincare-dbbench-") as workdir:
+        modes = {
+            "before": lambda path, ids: run_sync(path, ids, args.seconds, args.readers, args.writers),
+            "async": lambda path, ids: run_async(create_async_engine(f"sqlite+aiosqlite:///{path}"),
+                                                 ids, args.seconds, args.readers, args.writers),
+            "after": lambda path, ids: run_async(make_async_engine(f"sqlite:///{path}"),
+                                                 ids, args.seconds, args.readers, args.writers),
+        }
+        for name, run in modes.items():
+            path = os.path.join(workdir, f"{name}.db")
+            ids = seed(path, args.users)
+            result = asyncio.run(run(path, ids))
+            print(f"{name:>7}: " + "  ".join(f"{k} {v:9.1f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+CPU cost of the per-request Python hot paths, outside the LLM calls:
+profile dicts from a User row, prompt building (json.dumps of profiles and
+ingredient lists), reply parsing, the rule-based fallback scorer, composing
+an analysis from per-ingredient results, and ORM row hydration. Fixtures
+are sized like heavy real traffic: long INCI lists, users with many
+concerns and allergies, hundreds of conversation rows.
+
+Each case is reported relative to a fixed pure-Python calibration loop, so
+a baseline recorded on one machine still applies on another; a case more
+than --tolerance slower than benchmarks/baselines/hot_paths.json fails.
+
+    python -m benchmarks.bench_hot_paths                  # compare with the stored baseline
+    python -m benchmarks.bench_hot_paths --save           # record a new baseline
+"""
+from typing import Callable, Dict, List
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import timeit
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "bench-key")
+
+from agents.analysis_agent import AnalysisAgent
+from agents.analysis_cache import AnalysisCache
+from agents.ingredient_store import normalize_ingredient
+from agents.recommendation_agent import RecommendationAgent
+from agents.structured_output import parse_json
+from database.connection import Base, make_engine
+from database.models import ConversationHistory, User
+from loadtest.fake_anthropic import ROUTINE_REPLY, reply_for
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "hot_paths.json")
+# Shared CI machines swing single cases by ~30%; a real regression is usually 2x
+DEFAULT_TOLERANCE = 0.5
+
+INGREDIENT_COUNT = 60
+HISTORY_ROWS = 500
+
+INCI = [
+    "Aqua", "Glycerin", "Niacinamide", "Butylene Glycol", "Cetearyl Alcohol", "Dimethicone", "Squalane",
+    "Caprylic/Capric Triglyceride", "Sodium Hyaluronate", "Ceramide NP", "Ceramide AP", "Ceramide EOP",
+    "Phytosphingosine", "Cholesterol", "Panthenol", "Allantoin", "Tocopherol", "Ascorbyl Glucoside",
+    "Salicylic Acid", "Glycolic Acid", "Lactic Acid", "Retinol", "Bakuchiol", "Zinc PCA", "Centella Asiatica Extract",
+    "Camellia Sinensis Leaf Extract", "Butyrospermum Parkii Butter", "Cetyl Alcohol", "Stearic Acid",
+    "Glyceryl Stearate", "PEG-100 Stearate", "Polysorbate 20", "Carbomer", "Xanthan Gum", "Sodium Hydroxide",
+    "Disodium EDTA", "Phenoxyethanol", "Ethylhexylglycerin", "Parfum (Fragrance)", "Limonene", "Linalool",
+    "Alcohol Denat.", "Titanium Dioxide", "Zinc Oxide", "Ethylhexyl Methoxycinnamate", "Octocrylene",
+    "Avobenzone", "Azelaic Acid", "Tranexamic Acid", "Adenosine", "Palmitoyl Tripeptide-1", "Acetyl Hexapeptide-8",
+    "Madecassoside", "Beta-Glucan", "Sodium PCA", "Urea", "Lanolin", "Isopropyl Myristate", "Coconut Oil",
+    "Sodium Lauryl Sulfate", "Citric Acid", "Potassium Sorbate",
+]
+CONCERNS = ["acne", "dryness", "redness", "hyperpigmentation", "fine lines", "oiliness", "dullness",
+            "enlarged pores", "sensitivity", "dark circles", "uneven texture", "dehydration"]
+ALLERGIES = ["fragrance", "limonene", "linalool", "lanolin", "coconut oil", "alcohol denat.", "methylisothiazolinone",
+             "benzyl alcohol", "citral", "eugenol", "propylene glycol", "cocamidopropyl betaine",
+             "formaldehyde", "parabens", "balsam of peru"]
+
+
+def calibration():
+    """
+    Fixed pure-Python work every case is measured against
+    """
+    total = 0
+    for i in range(2000):
+        total += i * i % 7
+    return total
+
+
+class Fixtures:
+    """
+    A User row with a heavy profile, a long-INCI product, a fenced reply
+    for every ingredient, and HISTORY_ROWS conversation rows on a scratch
+    SQLite database, removed by close()
+    """
+
+    def __init__(self, seed: int = 5):
+        rng = random.Random(seed)
+        self.ingredients = rng.sample(INCI, INGREDIENT_COUNT)
+        self.product = {"product_id": "bench", "name": "Barrier Cream", "brand": "BenchLab",
+                        "ingredients": self.ingredients}
+
+        self._workdir = tempfile.TemporaryDirectory(prefix="skincare-hotpaths-")
+        path = os.path.join(self._workdir.name, "bench.db")
+        self.engine = make_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.user_id = "bench-user"
+        with self.Session() as db:
+            db.add(User(user_id=self.user_id, name="Bench User", age=34, skin_type="combination",
+                        concerns=CONCERNS, allergies=ALLERGIES, climate="humid",
+                        lifestyle={"sleep_hours": 6, "stress": "high", "diet": "vegetarian", "exercise": "daily"},
+                        medical_conditions=["rosacea", "eczema"]))
+            for i in range(HISTORY_ROWS):
+                role = "user" if i % 2 == 0 else "assistant"
+                message = " ".join(rng.choices(INCI + CONCERNS, k=40 if role == "assistant" else 12))
+                db.add(ConversationHistory(user_id=self.user_id, role=role, message=message,
+                                           agent_used=None if role == "user" else "CHAT"))
+            db.commit()
+        with self.Session() as db:
+            self.user = db.get(User, self.user_id)
+
+        self.profile = self.chat_profile(self.user)
+        self.analysis_reply = "```json\n" + reply_for(self.ingredients_request()) + "\n```"
+        self.routine_reply = "```json\n" + json.dumps(ROUTINE_REPLY, indent=2) + "\n```"
+        self.known = {normalize_ingredient(entry["ingredient"]): entry for entry in parse_json(self.analysis_reply)}
+
+        self.analysis = AnalysisAgent(client=object(), cache=AnalysisCache(), ingredient_store=object())
+        self.recommendation = RecommendationAgent(client=object())
+
+    def close(self):
+        self.engine.dispose()
+        self._workdir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ingredients_request(self) -> Dict:
+        return {"agent": "analysis", "messages": [{
+            "role": "user", "content": f"Skin type: combination\n\nIngredients: {json.dumps(self.ingredients)}",
+        }]}
+
+    @staticmethod
+    def chat_profile(user: User) -> Dict:
+        # Same shape as main.load_chat_context
+        return {
+            "user_id": user.user_id,
+            "skin_type": user.skin_type,
+            "concerns": user.concerns,
+            "allergies": user.allergies,
+            "age": user.age,
+            "work_location": getattr(user, "work_location", None),
+        }
+
+    @staticmethod
+    def skin_profile(user: User) -> Dict:
+        # Same shape as main.skin_profile
+        return {
+            "skin_type": user.skin_type,
+            "concerns": user.concerns,
+            "allergies": user.allergies,
+            "age": user.age,
+        }
+
+
+def cases(f: Fixtures) -> Dict[str, Callable]:
+    def profile_dicts():
+        f.chat_profile(f.user)
+        f.skin_profile(f.user)
+
+    def prompt_json():
+        json.dumps(f.profile, sort_keys=True)
+        f.recommendation._routine_request(f.profile, "mid-range")
+        f.analysis._ingredients_request(f.ingredients, f.profile["skin_type"])
+
+    def user_row():
+        with f.Session() as db:
+            db.get(User, f.user_id)
+
+    def history_rows():
+        with f.Session() as db:
+            db.execute(
+                select(ConversationHistory)
+                .where(ConversationHistory.user_id == f.user_id)
+                .order_by(ConversationHistory.timestamp.desc(), ConversationHistory.id.desc())
+            ).scalars().all()
+
+    return {
+        "profile_dicts": profile_dicts,
+        "prompt_json": prompt_json,
+        "parse_analysis_reply": lambda: parse_json(f.analysis_reply),
+        "parse_routine_reply": lambda: parse_json(f.routine_reply),
+        "fallback_analysis": lambda: f.analysis._fallback_analysis(f.product, f.profile),
+        "compose_analysis": lambda: f.analysis._compose_analysis(f.product, f.profile, f.known),
+        "orm_user_row": user_row,
+        "orm_history_rows": history_rows,
+    }
+
+
+def measure(fn: Callable, repeat: int, seconds: float) -> float:
+    """
+    Best-of-`repeat` microseconds per call, each run lasting about `seconds`
+    """
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * seconds / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def run(repeat: int = 20, seconds: float = 0.02, only: List[str] = None) -> Dict:
+    results = {}
+    calibrations = []
+    with Fixtures() as fixtures:
+        for name, fn in cases(fixtures).items():
+            if only and name not in only:
+                continue
+            # Calibrate next to each case so a busy machine skews both alike
+            calibration_us = measure(calibration, repeat, seconds)
+            us = measure(fn, repeat, seconds)
+            calibrations.append(calibration_us)
+            results[name] = {"us": us, "relative": us / calibration_us}
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_us": min(calibrations) if calibrations else 0.0,
+        "fixtures": {"ingredients": INGREDIENT_COUNT, "history_rows": HISTORY_ROWS,
+                     "concerns": len(CONCERNS), "allergies": len(ALLERGIES)},
+        "cases": results,
+    }
+
+
+def combine(reports: List[Dict], pick: Callable = min) -> Dict:
+    """
+    One report from several runs: per case, the run `pick` chooses by
+    relative cost (min for retries, median_low for a baseline)
+    """
+    combined = dict(reports[0], cases=dict(reports[0]["cases"]))
+    for name in combined["cases"]:
+        runs = [report["cases"][name] for report in reports if name in report["cases"]]
+        relative = pick([result["relative"] for result in runs])
+        combined["cases"][name] = next(result for result in runs if result["relative"] == relative)
+    combined["calibration_us"] = min(report["calibration_us"] for report in reports)
+    return combined
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, float]:
+    """
+    {case: relative change} for cases whose cost relative to the
+    calibration loop grew by more than `tolerance`
+    """
+    regressions = {}
+    for name, current in report["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        change = current["relative"] / base["relative"] - 1
+        if change > tolerance:
+            regressions[name] = change
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=0.02, help="length of each timed run")
+    parser.add_argument("--only", default="", help="comma-separated case names")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--retries", type=int, default=2, help="re-measure regressed cases before failing")
+    parser.add_argument("--save", action="store_true", help="write the median of three runs as the baseline")
+    args = parser.parse_args()
+    only = [name for name in args.only.split(",") if name]
+
+    if args.save:
+        report = combine([run(args.repeat, args.seconds, only) for _ in range(3)], statistics.median_low)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        baseline = report
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report = run(args.repeat, args.seconds, only)
+        regressions = compare(report, baseline, args.tolerance)
+        for _ in range(args.retries):
+            if not regressions:
+                break
+            # A noisy neighbour slows one measurement; a real regression stays slow
+            report = combine([report, run(args.repeat, args.seconds, list(regressions))])
+            regressions = compare(report, baseline, args.tolerance)
+
+    print(f"calibration: {report['calibration_us']:.1f} us (best)")
+    for name, result in report["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        line = f"{name:>22}: {result['us']:9.1f} us  {result['relative']:7.3f}x calibration"
+        if base and not args.save:
+            line += f"  ({result['relative'] / base['relative'] - 1:+.0%} vs baseline)"
+        print(line)
+
+    if args.save:
+        print(f"Baseline written to {args.baseline}")
+        return
+    for name, change in regressions.items():
+        print(f"REGRESSION {name}: {change:+.0%} over the baseline")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
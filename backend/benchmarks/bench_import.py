@@ -0,0 +1,71 @@
+"""
+Catalog import throughput on a synthetic CSV or JSONL file.
+
+    python -m benchmarks.bench_import --rows 500000 --format csv
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import tracemalloc
+
+from sqlalchemy import create_engine
+
+from database.connection import Base
+from database.importer import import_catalog
+from database.models import ProductDB
+
+INGREDIENTS = ["Water", "Glycerin", "Niacinamide", "Cetearyl Alcohol", "Dimethicone", "Parfum (Fragrance)",
+               "Sodium Hyaluronate", "Squalane", "Ceramide NP", "Panthenol", "Phenoxyethanol", "Retinol"]
+
+
+def write_catalog(path: str, rows: int, fmt: str):
+    rng = random.Random(3)
+    fields = ["barcode", "name", "brand", "category", "ingredients", "price"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        for i in range(rows):
+            # ~2% repeated barcodes to exercise dedupe
+            barcode = f"{rng.randrange(i) if i and rng.random() < 0.02 else i:013d}"
+            record = {
+                "barcode": barcode,
+                "name": f"Product {i}",
+                "brand": f"Brand {i % 500}",
+                "category": "moisturizer",
+                "ingredients": ", ".join(rng.sample(INGREDIENTS, 8)),
+                "price": f"{rng.uniform(5, 80):.2f}",
+            }
+            if writer:
+                writer.writerow(record)
+            else:
+                f.write(json.dumps(record) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="skincare-import-") as workdir:
+        source = os.path.join(workdir, f"catalog.{args.format}")
+        write_catalog(source, args.rows, args.format)
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'catalog.db')}")
+        Base.metadata.create_all(bind=engine, tables=[ProductDB.__table__])
+
+        tracemalloc.start()
+        stats = import_catalog(source, batch_size=args.batch_size, resume=False, bind=engine)
+        _, peak = tracemalloc.get_traced_memory()
+        engine.dispose()
+
+    print(f"{stats.imported:,} rows upserted from {stats.rows_read:,} read in {stats.seconds:.1f}s "
+          f"-> {stats.rows_per_minute:,.0f} rows/min, peak traced memory {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
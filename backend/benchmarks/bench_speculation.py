@@ -0,0 +1,87 @@
+"""
+Chat latency with and without speculative CHAT replies, for messages the
+local classifier leaves to the routing LLM call.
+
+    python -m benchmarks.bench_speculation --requests 200 --chat-share 0.7
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from agents.intent_classifier import IntentClassifier
+from agents.orchestrator import OrchestratorAgent
+from agents.speculation import Speculator
+
+
+class StubClient:
+    """
+    LLMClient stand-in: routing takes `route_latency`, replies `reply_latency`
+    """
+
+    def __init__(self, route_latency: float, reply_latency: float, chat_share: float, seed: int = 7):
+        self.route_latency = route_latency
+        self.reply_latency = reply_latency
+        self.chat_share = chat_share
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    async def create_message(self, **kwargs):
+        self.calls += 1
+        content = kwargs["messages"][-1]["content"]
+        if "Route this request." in "".join(block["text"] for block in content):
+            await asyncio.sleep(self.route_latency)
+            agent = "CHAT" if self.random.random() < self.chat_share else "RECOMMENDATION"
+            text = f'{{"agent": "{agent}", "confidence": 0.9}}'
+        else:
+            await asyncio.sleep(self.reply_latency)
+            text = "Here are a few tips."
+        return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+
+async def run(mode: str, args) -> dict:
+    client = StubClient(args.route_latency, args.reply_latency, args.chat_share)
+    # threshold > 1: every message goes to LLM routing, which is what speculation targets
+    orchestrator = OrchestratorAgent(client, profile_agent=object(), analysis_agent=object(),
+                                     recommendation_agent=object(),
+                                     intent_classifier=IntentClassifier(threshold=1.01),
+                                     speculator=Speculator(mode))
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(n):
+        async with semaphore:
+            start = time.perf_counter()
+            await orchestrator.route_request(f"question {n} about my skin", {"skin_type": "dry"}, [])
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[one(n) for n in range(args.requests)])
+    ms = sorted(x * 1000 for x in latencies)
+    stats = orchestrator.speculator.stats()
+    return {
+        "p50 ms": statistics.median(ms),
+        "p95 ms": ms[int(len(ms) * 0.95)],
+        "LLM calls": client.calls,
+        "waste rate": stats["waste_rate"],
+        "saved p50 ms": stats["saved_p50_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--chat-share", type=float, default=0.7)
+    parser.add_argument("--route-latency", type=float, default=0.15)
+    parser.add_argument("--reply-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    for mode in ("off", "always"):
+        result = asyncio.run(run(mode, args))
+        print(f"{mode:>6}: " + "  ".join(f"{k} {v:8.2f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Cold-start benchmark: how long a fresh worker takes to import the app,
+run startup, and answer its first request. A gunicorn worker recycle pays
+the same cost, so this is what max_requests restarts cost us.
+
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_SCRIPT = r"""
+import asyncio, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {backend!r})
+import main
+imported = time.perf_counter()
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        import httpx
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://worker") as client:
+            await client.get("/health")
+        return ready
+
+ready = asyncio.run(boot())
+first = time.perf_counter()
+print(imported - start, ready - start, first - start)
+"""
+
+
+def run_worker(workdir: str):
+    output = subprocess.run(
+        [sys.executable, "-c", WORKER_SCRIPT.format(backend=BACKEND_DIR)],
+        cwd=workdir, capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1]
+    return [float(x) for x in output.split()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="skincare-startup-") as workdir:
+        os.makedirs(os.path.join(workdir, "static"))
+
+        run_worker(workdir)  # warm the OS page cache and create the schema once
+        samples = [run_worker(workdir) for _ in range(args.runs)]
+
+    for i, label in enumerate(["import", "startup complete", "first response"]):
+        values = [s[i] * 1000 for s in samples]
+        print(f"{label:>16}: median {statistics.median(values):7.1f} ms  "
+              f"min {min(values):7.1f} ms  max {max(values):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Parse time of agent replies, and how many damaged replies the shared
+structured-output layer saves compared with the old
+"strip ``` fences, then json.loads" handling.
+
+    python -m benchmarks.bench_structured_output --replies 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from agents.structured_output import StructuredOutput, StructuredOutputError, missing_sections, parse_json, repair_json
+from loadtest.fake_anthropic import ROUTINE_REPLY, reply_for
+
+ROUTINE_REQUEST = {"agent": "recommendation", "messages": [{"role": "user", "content": "Create a complete routine."}]}
+ROUTINE_KEYS = ("morning", "night")
+
+DAMAGE = ("clean", "fenced", "preamble", "trailing_prose", "truncated", "bad_member")
+
+
+def old_parse(text: str):
+    response_text = text.strip()
+    if response_text.startswith("```"):
+        response_text = response_text.split("```")[1]
+        if response_text.startswith("json"):
+            response_text = response_text[4:]
+    return json.loads(response_text)
+
+
+def ingredients_request(count: int):
+    names = json.dumps([f"Ingredient {n}" for n in range(count)])
+    return {"agent": "analysis", "messages": [{"role": "user", "content": f"Skin type: dry\n\nIngredients: {names}"}]}
+
+
+def damaged(text: str, kind: str, rng: random.Random) -> str:
+    if kind == "fenced":
+        return f"```json\n{text}\n```"
+    if kind == "preamble":
+        return f"Here is the JSON you asked for:\n{text}"
+    if kind == "trailing_prose":
+        return f"{text}\n\nLet me know if you need anything else!"
+    if kind == "truncated":
+        # max_tokens hit somewhere in the second half
+        return text[:rng.randrange(len(text) // 2, len(text) - 1)]
+    if kind == "bad_member":
+        # An unescaped quote inside some string value
+        quotes = [i for i, char in enumerate(text) if char == '"' and text[i - 2:i] == ": "]
+        at = rng.choice(quotes) + 2
+        return text[:at] + 'say "hi' + text[at:]
+    return text
+
+
+class ReplayClient:
+    """
+    Serves the canned remainder for continuation requests; counts generated characters
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.generated = 0
+
+    async def create_message(self, **kwargs):
+        self.calls += 1
+        text = reply_for(kwargs)
+        self.generated += len(text)
+        return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+
+def bench_parse(args):
+    samples = {
+        "routine": json.dumps(ROUTINE_REPLY),
+        f"{args.ingredients} ingredients": reply_for(ingredients_request(args.ingredients)),
+    }
+    for name, text in samples.items():
+        fenced = f"```json\n{text}\n```"
+        truncated = text[:int(len(text) * 0.8)]
+        timings = {}
+        for label, parse, reply in (("json.loads", old_parse, fenced), ("jiter", parse_json, fenced),
+                                    ("repair (truncated)", repair_json, truncated)):
+            started = time.perf_counter()
+            for _ in range(args.iterations):
+                parse(reply)
+            timings[label] = (time.perf_counter() - started) / args.iterations * 1e6
+        print(f"{name:>16} ({len(text):>5} chars): "
+              + ", ".join(f"{label} {us:.1f} us" for label, us in timings.items()))
+
+
+async def bench_recovery(args):
+    rng = random.Random(args.seed)
+    client = ReplayClient()
+    output = StructuredOutput(max_continuations=1)
+    old_ok = repaired_ok = continued_ok = 0
+    by_kind = {kind: Counter() for kind in DAMAGE}
+    rerequest_chars = 0
+
+    for _ in range(args.replies):
+        if rng.random() < 0.5:
+            request, keys, items = ROUTINE_REQUEST, ROUTINE_KEYS, 0
+        else:
+            count = rng.randrange(3, args.ingredients + 1)
+            request, keys, items = ingredients_request(count), (), count
+        kind = rng.choice(DAMAGE)
+        clean = reply_for(request)
+        text = damaged(clean, kind, rng)
+
+        try:
+            value = old_parse(text)
+            usable = not missing_sections(value, keys, items)
+        except ValueError:
+            usable = False
+        old_ok += usable
+        by_kind[kind]["old"] += usable
+
+        try:
+            value, prefix = repair_json(text)
+            usable = prefix is None and not missing_sections(value, keys, items)
+        except StructuredOutputError:
+            usable = False
+        repaired_ok += usable
+        by_kind[kind]["repair"] += usable
+
+        calls = client.calls
+        try:
+            value = await output.complete(client, request, text, keys, items)
+            usable = not missing_sections(value, keys, items)
+        except StructuredOutputError:
+            usable = False
+        if client.calls > calls:
+            rerequest_chars += len(clean)
+        continued_ok += usable
+        by_kind[kind]["continued"] += usable
+
+    print(f"\n{args.replies} replies, damage mix {', '.join(DAMAGE)}:")
+    print(f"  json.loads after fence strip: {old_ok} usable")
+    print(f"  jiter + repair, no new call:  {repaired_ok} usable")
+    print(f"  + continuation:               {continued_ok} usable "
+          f"({continued_ok - old_ok} saved, {client.calls} continuation calls)")
+    print(f"  continuations generated {client.generated} chars; re-requesting those replies whole: {rerequest_chars}")
+    for kind, counts in by_kind.items():
+        print(f"    {kind:>15}: old {counts['old']:>4}, repair {counts['repair']:>4}, continued {counts['continued']:>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replies", type=int, default=2000)
+    parser.add_argument("--ingredients", type=int, default=30)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    bench_parse(args)
+    asyncio.run(bench_recovery(args))
+
+
+if __name__ == "__main__":
+    main()
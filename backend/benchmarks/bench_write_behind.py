@@ -0,0 +1,73 @@
+"""
+Chat-style inserts (two conversation rows per request) from many concurrent
+handlers, one transaction each vs. the write-behind queue's batches.
+
+    python -m benchmarks.bench_write_behind --seconds 5 --clients 64
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from database.connection import Base, make_async_engine
+from database.models import ConversationHistory
+from database.write_behind import DURABILITY_MODES, WriteBehindQueue
+
+
+async def run(path, mode, seconds, clients, max_batch, max_delay_ms):
+    engine = make_async_engine(f"sqlite:///{path}")
+    queue = WriteBehindQueue(bind=engine, mode=mode, max_batch=max_batch, max_delay_ms=max_delay_ms)
+    deadline = time.perf_counter() + seconds
+    latencies = []
+
+    async def client(n):
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await queue.add(
+                ConversationHistory,
+                {"user_id": f"user-{n}", "role": "user", "message": f"question {i}", "agent_used": None},
+                {"user_id": f"user-{n}", "role": "assistant", "message": f"answer {i}", "agent_used": "bench"},
+            )
+            latencies.append(time.perf_counter() - start)
+            i += 1
+            await asyncio.sleep(0)  # a real handler yields on its own I/O
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client(n) for n in range(clients)])
+    await queue.close()
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    ms = sorted(x * 1000 for x in latencies)
+    return {
+        "rows/s": queue.rows_written / elapsed,
+        "transactions": queue.batches,
+        "add p50 ms": statistics.median(ms),
+        "add p99 ms": ms[int(len(ms) * 0.99)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--delay-ms", type=float, default=5)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="skincare-writebench-") as workdir:
+        for mode in DURABILITY_MODES:
+            path = os.path.join(workdir, f"{mode}.db")
+            sync_engine = create_engine(f"sqlite:///{path}")
+            Base.metadata.create_all(bind=sync_engine)
+            sync_engine.dispose()
+            result = asyncio.run(run(path, mode, args.seconds, args.clients, args.batch, args.delay_ms))
+            print(f"{mode:>9}: " + "  ".join(f"{k} {v:9.1f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
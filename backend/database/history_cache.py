@@ -0,0 +1,92 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Tuple
+import os
+
+from sqlalchemy import select
+
+from .models import ConversationHistory
+
+
+class HistoryCache:
+    """
+    Per-user ring buffer of the most recent chat turns.
+
+    A user's buffer is filled from conversations on first access and then
+    appended to on every write, so active sessions never query history.
+    Only the most recently active users are kept.
+    """
+
+    def __init__(self, turns: int = None, max_users: int = None):
+        self.turns = turns or int(os.getenv("CHAT_HISTORY_TURNS", "10"))
+        self.max_users = max_users or int(os.getenv("CHAT_HISTORY_CACHE_USERS", "10000"))
+        self._buffers: "OrderedDict[str, Deque[Dict]]" = OrderedDict()
+        # user_id -> writes seen while a load for that user was in flight
+        self._loading: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def recent(self, db, user_id: str) -> List[Dict]:
+        """
+        Last `turns` messages for a user, oldest first, as {"role", "content"}
+        """
+        buffer = self._buffers.get(user_id)
+        if buffer is not None:
+            self._buffers.move_to_end(user_id)
+            self.hits += 1
+            return list(buffer)
+
+        self.misses += 1
+        generation = self._loading.setdefault(user_id, 0)
+        rows = (await db.execute(
+            select(ConversationHistory.role, ConversationHistory.message)
+            .where(ConversationHistory.user_id == user_id)
+            .order_by(ConversationHistory.timestamp.desc(), ConversationHistory.id.desc())
+            .limit(self.turns)
+        )).all()
+        turns = [{"role": role, "content": message} for role, message in reversed(rows)]
+
+        # A write that landed during the query may be missing from it; don't keep a stale buffer
+        if self._loading.pop(user_id, None) == generation and user_id not in self._buffers:
+            self._install(user_id, turns)
+        return turns
+
+    def append(self, user_id: str, messages: Iterable[Tuple[str, str]]):
+        """
+        Record (role, content) pairs after they are committed
+        """
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            if user_id in self._loading:
+                self._loading[user_id] += 1
+            return
+        for role, content in messages:
+            buffer.append({"role": role, "content": content})
+        self._buffers.move_to_end(user_id)
+
+    def _install(self, user_id: str, turns: List[Dict]):
+        self._buffers[user_id] = deque(turns, maxlen=self.turns)
+        if len(self._buffers) > self.max_users:
+            self._buffers.popitem(last=False)
+
+    def invalidate(self, user_id: str = None):
+        if user_id is None:
+            self._buffers.clear()
+        else:
+            self._buffers.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            "users": len(self._buffers),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_default_history = None
+
+
+def get_history_cache() -> HistoryCache:
+    global _default_history
+    if _default_history is None:
+        _default_history = HistoryCache()
+    return _default_history
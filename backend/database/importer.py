@@ -0,0 +1,192 @@
+"""
+Streaming bulk importer for the products catalog.
+
+    python -m database.importer catalog.csv
+    python -m database.importer catalog.jsonl --batch-size 10000 --no-resume
+
+Rows flow through generators (read -> normalize -> batch) and are upserted
+by barcode with one executemany per batch, one transaction per batch.
+After each committed batch a checkpoint (<file>.checkpoint) records how many
+source rows are done, so an interrupted import resumes where it stopped.
+Memory use depends on the batch size, not the file size.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+import argparse
+import csv
+import json
+import os
+import time
+import uuid
+
+from agents.normalizer import get_normalizer
+from .connection import dialect_insert, engine as default_engine
+from .models import ProductDB
+
+PRODUCT_NAMESPACE = uuid.UUID("6f1c2a0e-0d7b-4c1e-9a55-2b3f8d0e7c41")
+UPDATE_COLUMNS = ("name", "brand", "category", "ingredients", "canonical_ingredients", "description", "price",
+                  "image_url")
+
+
+@dataclass
+class ImportStats:
+    rows_read: int = 0
+    imported: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_minute(self) -> float:
+        return self.imported / self.seconds * 60 if self.seconds else 0.0
+
+
+def read_records(path: str, skip: int = 0) -> Iterator[Dict]:
+    """
+    Yield raw records from a .csv or .jsonl file, skipping the first `skip`
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+        for index, record in enumerate(records):
+            if index >= skip:
+                yield record
+
+
+def clean_ingredients(raw) -> List[str]:
+    """
+    Ingredient list from a JSON array or an INCI string, whitespace
+    collapsed and exact repeats (ignoring case) dropped. Synonyms are kept
+    as listed: merging is the normalizer's job, see canonical_ingredients.
+    """
+    if isinstance(raw, str):
+        raw = get_normalizer().split_inci(raw)
+    cleaned = {}
+    for ingredient in raw or []:
+        ingredient = " ".join(str(ingredient).split())
+        if ingredient:
+            cleaned.setdefault(ingredient.casefold(), ingredient)
+    return list(cleaned.values())
+
+
+def canonical_ingredients(ingredients: List[str]) -> List[str]:
+    """
+    Normalizer canonical name for each cleaned ingredient, in the same order
+    """
+    normalizer = get_normalizer()
+    return [normalizer.canonical(ingredient) for ingredient in ingredients]
+
+
+def normalize_record(record: Dict) -> Optional[Dict]:
+    barcode = str(record.get("barcode") or "").strip()
+    if not barcode:
+        return None
+    price = record.get("price")
+    try:
+        price = float(price) if price not in (None, "") else None
+    except ValueError:
+        price = None
+    ingredients = clean_ingredients(record.get("ingredients"))
+    return {
+        "product_id": record.get("product_id") or str(uuid.uuid5(PRODUCT_NAMESPACE, barcode)),
+        "barcode": barcode,
+        "name": (record.get("name") or "").strip() or None,
+        "brand": (record.get("brand") or "").strip() or None,
+        "category": (record.get("category") or "").strip() or None,
+        "ingredients": ingredients,
+        "canonical_ingredients": canonical_ingredients(ingredients),
+        "description": record.get("description") or None,
+        "price": price,
+        "image_url": record.get("image_url") or None,
+    }
+
+
+def batches(records: Iterable[Dict], size: int, stats: ImportStats) -> Iterator[List[Dict]]:
+    """
+    Group normalized rows into batches, deduped by barcode (last one wins)
+    """
+    batch: Dict[str, Dict] = {}
+    for record in records:
+        stats.rows_read += 1
+        row = normalize_record(record)
+        if row is None:
+            stats.skipped += 1
+        else:
+            if row["barcode"] in batch:
+                stats.duplicates += 1
+            batch[row["barcode"]] = row
+        if stats.rows_read % size == 0 and batch:
+            yield list(batch.values())
+            batch = {}
+    if batch:
+        yield list(batch.values())
+
+
+def _upsert_statement(bind):
+    statement = dialect_insert(ProductDB.__table__, bind)
+    return statement.on_conflict_do_update(
+        index_elements=["barcode"],
+        set_={column: statement.excluded[column] for column in UPDATE_COLUMNS},
+    )
+
+
+def _read_checkpoint(path: str) -> int:
+    try:
+        with open(path) as f:
+            return json.load(f)["rows_done"]
+    except (OSError, ValueError, KeyError):
+        return 0
+
+
+def _write_checkpoint(path: str, rows_done: int, stats: ImportStats):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"rows_done": rows_done, "imported": stats.imported}, f)
+    os.replace(tmp, path)
+
+
+def import_catalog(path: str, batch_size: int = 5000, resume: bool = True, bind=None) -> ImportStats:
+    """
+    Stream a CSV / JSONL catalog into products
+    """
+    bind = bind or default_engine
+    checkpoint_path = f"{path}.checkpoint"
+    start_row = _read_checkpoint(checkpoint_path) if resume else 0
+    stats = ImportStats()
+    statement = _upsert_statement(bind)
+    started = time.perf_counter()
+
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            # WAL / synchronous=NORMAL come from the engine; give the bulk load a bigger page cache
+            conn.exec_driver_sql("PRAGMA cache_size=-65536")
+            conn.commit()
+
+        for batch in batches(read_records(path, skip=start_row), batch_size, stats):
+            with conn.begin():
+                conn.execute(statement, batch)
+            stats.imported += len(batch)
+            _write_checkpoint(checkpoint_path, start_row + stats.rows_read, stats)
+
+    stats.seconds = time.perf_counter() - started
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import a product catalog (CSV or JSONL)")
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--no-resume", action="store_true", help="ignore any existing checkpoint")
+    args = parser.parse_args()
+
+    from .connection import init_db
+    init_db()
+
+    result = import_catalog(args.path, batch_size=args.batch_size, resume=not args.no_resume)
+    print(f"✅ Imported {result.imported:,} rows ({result.rows_read:,} read, {result.skipped:,} skipped, "
+          f"{result.duplicates:,} duplicates) in {result.seconds:.1f}s "
+          f"- {result.rows_per_minute:,.0f} rows/min")
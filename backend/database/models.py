@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, JSON, DateTime, Text
+from sqlalchemy import Column, String, Integer, Float, JSON, DateTime, Text, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from .connection import Base
 
@@ -27,6 +27,8 @@ class ProductDB(Base):
     brand = Column(String)
     category = Column(String)
     ingredients = Column(JSON)
+    # Normalizer canonical name per entry of `ingredients` (set by database.importer)
+    canonical_ingredients = Column(JSON, nullable=True)
     description = Column(Text, nullable=True)
     price = Column(Float, nullable=True)
     image_url = Column(String, nullable=True)
@@ -45,11 +47,47 @@ class FeedbackDB(Base):
 
 class ConversationHistory(Base):
     __tablename__ = "conversations"
+    # Serves "latest N turns for a user" without a sort
+    __table_args__ = (Index("ix_conversations_user_id_timestamp", "user_id", "timestamp"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, index=True)
     role = Column(String)  # user/assistant
     message = Column(Text)
     agent_used = Column(String, nullable=True)
+    # Assistant rows: how agent_used was chosen - "llm", "local" (intent classifier) or "fallback"
+    routed_by = Column(String, nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
 
+class IngredientAnalysisDB(Base):
+    __tablename__ = "ingredient_analyses"
+    __table_args__ = (UniqueConstraint("ingredient", "skin_type", name="uq_ingredient_skin_type"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    ingredient = Column(String)  # normalized (lowercase) name
+    skin_type = Column(String)
+    analysis = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AnalysisResultDB(Base):
+    __tablename__ = "analysis_results"
+    __table_args__ = (UniqueConstraint("ingredients_key", "profile_key", name="uq_analysis_results_key"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    ingredients_key = Column(String)  # agents.analysis_cache.ingredients_key
+    profile_key = Column(String)  # agents.analysis_cache.profile_key
+    product_id = Column(String, nullable=True)
+    analysis = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RoutineArchetypeDB(Base):
+    __tablename__ = "routine_archetypes"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    archetype = Column(String, unique=True, index=True)  # database.routine_table.archetype_key
+    skin_type = Column(String)
+    budget = Column(String)
+    profile = Column(JSON)  # the representative profile the routine was generated for
+    routine = Column(JSON)
+    users = Column(Integer)  # users in the archetype when it was generated
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import os
+import time
+
+from sqlalchemy import bindparam, select
+
+from .connection import async_engine, engine
+from .models import ProductDB
+
+PRODUCT_COLUMNS = (
+    ProductDB.product_id, ProductDB.barcode, ProductDB.name, ProductDB.brand,
+    ProductDB.category, ProductDB.ingredients, ProductDB.price, ProductDB.image_url,
+)
+
+# Core statement (no ORM session) so SQLAlchemy reuses the compiled SQL
+BARCODE_QUERY = select(*PRODUCT_COLUMNS).where(ProductDB.barcode == bindparam("barcode"))
+
+
+class ProductLookup:
+    """
+    Barcode -> product resolution: a bounded in-memory LRU of hot barcodes
+    in front of the unique barcode index on products. Entries expire after
+    `ttl` seconds, so catalog re-imports (a separate process) reach running
+    workers. Misses are cached too, for a shorter time, so repeated scans
+    of unknown codes stay cheap.
+    """
+
+    def __init__(self, bind=engine, async_bind=async_engine, max_entries: int = None,
+                 max_negative_entries: int = None, negative_ttl: float = None, ttl: float = None):
+        self.bind = bind
+        self.async_bind = async_bind
+        self.max_entries = max_entries or int(os.getenv("PRODUCT_CACHE_SIZE", "50000"))
+        self.max_negative_entries = max_negative_entries or int(os.getenv("PRODUCT_NEGATIVE_CACHE_SIZE", "50000"))
+        self.negative_ttl = negative_ttl or float(os.getenv("PRODUCT_NEGATIVE_TTL", "300"))
+        self.ttl = ttl or float(os.getenv("PRODUCT_CACHE_TTL", "900"))
+        # barcode -> (expires at, product)
+        self._hot: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.db_lookups = 0
+
+    def _cached(self, barcode: str):
+        """
+        (found, product) from the in-memory tiers
+        """
+        entry = self._hot.get(barcode)
+        if entry is not None:
+            expires_at, product = entry
+            if expires_at > time.monotonic():
+                self._hot.move_to_end(barcode)
+                self.hits += 1
+                return True, product
+            del self._hot[barcode]
+
+        expires_at = self._missing.get(barcode)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                self.negative_hits += 1
+                return True, None
+            del self._missing[barcode]
+        return False, None
+
+    def _remember(self, barcode: str, product: Optional[Dict]):
+        if product is None:
+            self._missing[barcode] = time.monotonic() + self.negative_ttl
+            self._missing.move_to_end(barcode)
+            if len(self._missing) > self.max_negative_entries:
+                self._missing.popitem(last=False)
+        else:
+            self._hot[barcode] = (time.monotonic() + self.ttl, product)
+            self._hot.move_to_end(barcode)
+            if len(self._hot) > self.max_entries:
+                self._hot.popitem(last=False)
+
+    def _query(self, barcode: str) -> Optional[Dict]:
+        self.db_lookups += 1
+        with self.bind.connect() as conn:
+            row = conn.execute(BARCODE_QUERY, {"barcode": barcode}).first()
+        return dict(row._mapping) if row is not None else None
+
+    def get_sync(self, barcode: str) -> Optional[Dict]:
+        found, product = self._cached(barcode)
+        if not found:
+            product = self._query(barcode)
+            self._remember(barcode, product)
+        return product
+
+    async def get(self, barcode: str) -> Optional[Dict]:
+        found, product = self._cached(barcode)
+        if not found:
+            self.db_lookups += 1
+            async with self.async_bind.connect() as conn:
+                row = (await conn.execute(BARCODE_QUERY, {"barcode": barcode})).first()
+            product = dict(row._mapping) if row is not None else None
+            self._remember(barcode, product)
+        return product
+
+    def invalidate(self, barcode: str = None):
+        """
+        Forget one barcode (after an insert/update), or everything
+        """
+        if barcode is None:
+            self._hot.clear()
+            self._missing.clear()
+        else:
+            self._hot.pop(barcode, None)
+            self._missing.pop(barcode, None)
+
+    def stats(self) -> Dict:
+        return {
+            "hot_entries": len(self._hot),
+            "negative_entries": len(self._missing),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "db_lookups": self.db_lookups,
+        }
+
+
+_default_lookup = None
+
+
+def get_product_lookup() -> ProductLookup:
+    global _default_lookup
+    if _default_lookup is None:
+        _default_lookup = ProductLookup()
+    return _default_lookup
@@ -0,0 +1,133 @@
+from typing import Dict, Optional, Tuple
+import asyncio
+import os
+import time
+
+from sqlalchemy import select
+
+from .connection import async_engine
+from .models import RoutineArchetypeDB
+
+BUDGETS = ("budget", "mid-range", "premium")
+
+# (ages below, band, age the band's routine is generated for)
+AGE_BANDS = (
+    (25, "under-25", 21),
+    (35, "25-34", 30),
+    (50, "35-49", 42),
+    (None, "50-plus", 58),
+)
+
+
+def _terms(values) -> Tuple[str, ...]:
+    return tuple(sorted({"_".join(str(v).lower().split()) for v in values or [] if str(v).strip()}))
+
+
+def age_band(age) -> Tuple[str, Optional[int]]:
+    """
+    (band, representative age); "any" when the age is unknown
+    """
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "any", None
+    for upper, band, typical in AGE_BANDS:
+        if upper is None or age < upper:
+            return band, typical
+
+
+def profile_key(profile: Dict) -> str:
+    """
+    The routine-relevant part of a profile: skin type, concerns and
+    allergies (order and case ignored) and age band
+    """
+    return "|".join([
+        (profile.get("skin_type") or "normal").lower(),
+        ",".join(_terms(profile.get("concerns"))),
+        ",".join(_terms(profile.get("allergies"))),
+        age_band(profile.get("age"))[0],
+    ])
+
+
+def archetype_key(profile: Dict, budget: str) -> str:
+    return f"{profile_key(profile)}|{(budget or 'mid-range').strip().lower()}"
+
+
+def archetype_profile(profile: Dict) -> Dict:
+    """
+    The profile an archetype's routine is generated for, so it suits every
+    user that maps to the same key
+    """
+    return {
+        "skin_type": (profile.get("skin_type") or "normal").lower(),
+        "concerns": list(_terms(profile.get("concerns"))),
+        "allergies": list(_terms(profile.get("allergies"))),
+        "age": age_band(profile.get("age"))[1],
+    }
+
+
+class RoutineTable:
+    """
+    Routines pre-generated per profile archetype by jobs.precompute_routines.
+    The table is small (a few hundred archetypes per budget), so it is
+    held in memory and re-read every `refresh_seconds` to pick up new runs.
+    """
+
+    def __init__(self, async_bind=async_engine, refresh_seconds: float = None):
+        self.async_bind = async_bind
+        self.refresh_seconds = refresh_seconds or float(os.getenv("ROUTINE_TABLE_REFRESH", "300"))
+        self._routines: Dict[str, Dict] = {}
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    async def _refresh(self):
+        async with self._lock:
+            if time.monotonic() < self._expires_at:
+                return
+            try:
+                async with self.async_bind.connect() as conn:
+                    rows = await conn.execute(select(RoutineArchetypeDB.archetype, RoutineArchetypeDB.routine))
+                    self._routines = {row.archetype: row.routine for row in rows}
+                self.loads += 1
+            except Exception as e:
+                print(f"Routine table load error: {e}")
+            self._expires_at = time.monotonic() + self.refresh_seconds
+
+    async def get(self, profile: Dict, budget: str) -> Optional[Dict]:
+        """
+        The stored routine for the profile's archetype, or None for a rare profile
+        """
+        if time.monotonic() >= self._expires_at:
+            await self._refresh()
+        routine = self._routines.get(archetype_key(profile, budget))
+        if routine is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return routine
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    def stats(self) -> Dict:
+        looked_up = self.hits + self.misses
+        return {
+            "archetypes": len(self._routines),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / looked_up if looked_up else 0.0,
+            "loads": self.loads,
+        }
+
+
+_default_table = None
+
+
+def get_routine_table() -> RoutineTable:
+    global _default_table
+    if _default_table is None:
+        _default_table = RoutineTable()
+    return _default_table
@@ -0,0 +1,154 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+import time
+
+from sqlalchemy import insert
+
+from .connection import async_engine
+
+# immediate: one transaction per call (the old behaviour)
+# group:     calls wait for the shared batch commit - durable when they return
+# deferred:  calls return once queued - rows still queued are lost on a crash
+DURABILITY_MODES = ("immediate", "group", "deferred")
+
+
+class WriteBehindQueue:
+    """
+    Groups small inserts (chat turns, feedback) into one transaction every
+    few milliseconds or every `max_batch` rows, whichever comes first.
+    """
+
+    def __init__(self, bind=async_engine, mode: str = None, max_batch: int = None, max_delay_ms: float = None):
+        self.bind = bind
+        self.mode = mode or os.getenv("WRITE_BEHIND_MODE", "group")
+        if self.mode not in DURABILITY_MODES:
+            raise ValueError(f"WRITE_BEHIND_MODE must be one of {DURABILITY_MODES}, got {self.mode!r}")
+        self.max_batch = max_batch or int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+        self.max_delay = (max_delay_ms or float(os.getenv("WRITE_BEHIND_DELAY_MS", "5"))) / 1000
+        self._pending: List[Tuple[object, List[Dict], Optional[asyncio.Future]]] = []
+        self._pending_rows = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.batches = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.flush_seconds = 0.0
+
+    async def add(self, model, *rows: Dict):
+        """
+        Insert rows (column dicts) into model's table
+        """
+        if self.mode == "immediate":
+            await self._write([(model, list(rows), None)])
+            return
+
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future() if self.mode == "group" else None
+        self._pending.append((model, list(rows), future))
+        self._pending_rows += len(rows)
+        self._wakeup.set()
+        if self._pending_rows >= self.max_batch:
+            self._full.set()
+        if future is not None:
+            await future
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not (self._closing and not self._pending):
+            await self._wakeup.wait()
+            if not self._closing and self._pending_rows < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        """
+        Write everything queued so far in one transaction
+        """
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        if batch:
+            await self._write(batch)
+
+    async def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            await self._insert(batch)
+            outcome = [None] * len(batch)
+        except Exception:
+            # One bad row must not fail the whole batch: retry entries one by one
+            outcome = []
+            for entry in batch:
+                try:
+                    await self._insert([entry])
+                    outcome.append(None)
+                except Exception as e:
+                    self.failures += 1
+                    print(f"Write-behind insert into {entry[0].__tablename__} failed: {e}")
+                    outcome.append(e)
+        self.flush_seconds += time.perf_counter() - started
+
+        for (model, rows, future), error in zip(batch, outcome):
+            if error is None:
+                self.rows_written += len(rows)
+            if future is not None and not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+            elif error is not None and self.mode == "immediate":
+                raise error
+
+    async def _insert(self, batch):
+        by_table: Dict[object, List[Dict]] = {}
+        for model, rows, _ in batch:
+            by_table.setdefault(model.__table__, []).extend(rows)
+        async with self.bind.begin() as conn:
+            for table, rows in by_table.items():
+                await conn.execute(insert(table), rows)
+        self.batches += 1
+
+    async def close(self):
+        """
+        Flush on shutdown, then stop the background writer
+        """
+        if self._task is not None and not self._task.done():
+            self._closing = True
+            self._wakeup.set()
+            self._full.set()
+            await self._task
+        self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "pending_rows": self._pending_rows,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "failures": self.failures,
+            "avg_batch_rows": self.rows_written / self.batches if self.batches else 0.0,
+            "flush_seconds": round(self.flush_seconds, 3),
+        }
+
+
+_default_queue = None
+
+
+def get_write_behind() -> WriteBehindQueue:
+    global _default_queue
+    if _default_queue is None:
+        _default_queue = WriteBehindQueue()
+    return _default_queue
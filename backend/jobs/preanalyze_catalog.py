@@ -0,0 +1,269 @@
+"""
+Offline job: analyze the top catalog products for the common profile
+archetypes through the Message Batches API, before anyone scans them.
+
+    python -m jobs.preanalyze_catalog --products 1000 --archetypes 50
+    python -m jobs.preanalyze_catalog --no-wait          # submit, then exit
+    python -m jobs.preanalyze_catalog                    # later: load what finished
+
+1. Pairs: the most-reviewed products in ProductDB x the largest profile
+   archetypes (agents.analysis_cache.profile_key) among users.
+2. Ingredients of those products that the ingredient store has no analysis
+   of for an archetype's skin type go out as message batches,
+   INGREDIENTS_PER_REQUEST per request, in AnalysisAgent's request format.
+3. Ended batches are parsed and written to the ingredient store.
+4. Each pair's analysis is composed and upserted into analysis_results,
+   which the API loads into its analysis cache at startup.
+
+The checkpoint file lists the submitted batches, the ingredients behind
+each request and whether the batch was loaded, so a rerun waits on
+batches already paid for instead of submitting them again. It is removed
+once every batch is loaded. Requests that errored leave their ingredients
+unanalyzed; the next run picks them up.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from sqlalchemy import func, select
+
+from agents.analysis_agent import AnalysisAgent
+from agents.analysis_cache import ingredients_key, profile_key
+from agents.ingredient_store import IngredientStore, normalize_ingredient
+from agents.structured_output import StructuredOutputError, repair_json
+from database.connection import AsyncSessionLocal, dialect_insert, engine as default_engine
+from database.models import AnalysisResultDB, FeedbackDB, ProductDB, User
+
+INGREDIENTS_PER_REQUEST = 20
+
+
+@dataclass
+class PreanalysisStats:
+    products: int = 0
+    archetypes: int = 0
+    requests_submitted: int = 0
+    batches_submitted: int = 0
+    batches_resumed: int = 0
+    ingredients_loaded: int = 0
+    requests_failed: int = 0
+    analyses_written: int = 0
+    seconds: float = 0.0
+
+
+def top_products(bind, limit: int) -> List[Dict]:
+    """
+    Products with ingredients, most feedback first, then newest
+    """
+    feedback = func.count(FeedbackDB.id)
+    with bind.connect() as conn:
+        rows = conn.execute(
+            select(ProductDB.product_id, ProductDB.barcode, ProductDB.name, ProductDB.brand,
+                   ProductDB.category, ProductDB.ingredients)
+            .outerjoin(FeedbackDB, FeedbackDB.product_id == ProductDB.product_id)
+            .group_by(ProductDB.product_id)
+            .order_by(feedback.desc(), ProductDB.created_at.desc())
+            .limit(limit)
+        )
+        return [dict(row._mapping) for row in rows if row.ingredients]
+
+
+def common_archetypes(bind, limit: int) -> List[Dict]:
+    """
+    One member profile for each of the `limit` largest analysis-cache archetypes
+    """
+    counts = Counter()
+    members = {}
+    with bind.connect() as conn:
+        rows = conn.execution_options(yield_per=5000).execute(
+            select(User.skin_type, User.concerns, User.allergies, User.age)
+        )
+        for row in rows:
+            profile = dict(row._mapping)
+            key = profile_key(profile)
+            counts[key] += 1
+            members.setdefault(key, profile)
+    return [members[key] for key, _ in counts.most_common(limit)]
+
+
+def _read_checkpoint(path: str) -> Dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"batches": {}}
+
+
+def _write_checkpoint(path: str, checkpoint: Dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def save_analyses(rows: List[Dict], bind):
+    statement = dialect_insert(AnalysisResultDB.__table__, bind)
+    statement = statement.on_conflict_do_update(
+        index_elements=["ingredients_key", "profile_key"],
+        set_={"product_id": statement.excluded.product_id, "analysis": statement.excluded.analysis},
+    )
+    with bind.begin() as conn:
+        conn.execute(statement, rows)
+
+
+class CatalogPreanalysis:
+    def __init__(self, client=None, bind=None, session_factory=AsyncSessionLocal,
+                 checkpoint_path: str = "preanalysis.checkpoint", batch_size: int = 10000,
+                 poll_seconds: float = 60):
+        if client is None:
+            from agents.llm_client import get_llm_client
+            client = get_llm_client()
+        self.client = client
+        self.bind = bind or default_engine
+        self.ingredient_store = IngredientStore(session_factory)
+        # Builds the requests and composes the results; makes no calls itself
+        self.agent = AnalysisAgent(client, ingredient_store=self.ingredient_store)
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.stats = PreanalysisStats()
+
+    async def _missing_ingredients(self, products: List[Dict], skin_types: List[str],
+                                   checkpoint: Dict) -> List[Tuple[str, List[str]]]:
+        """
+        (skin type, ingredient chunk) still to analyze, minus what pending batches already cover
+        """
+        pending = {(request["skin_type"], normalize_ingredient(name))
+                   for batch in checkpoint["batches"].values() if not batch["loaded"]
+                   for request in batch["requests"].values() for name in request["ingredients"]}
+        names = list(dict.fromkeys(i for product in products for i in product["ingredients"]))
+        work = []
+        for skin_type in skin_types:
+            known = await self.ingredient_store.get_many(names, skin_type)
+            todo = {}
+            for name in names:
+                canonical = normalize_ingredient(name)
+                if canonical not in known and (skin_type, canonical) not in pending:
+                    todo.setdefault(canonical, name)
+            todo = list(todo.values())
+            work += [(skin_type, todo[i:i + INGREDIENTS_PER_REQUEST])
+                     for i in range(0, len(todo), INGREDIENTS_PER_REQUEST)]
+        return work
+
+    async def _submit(self, work: List[Tuple[str, List[str]]], checkpoint: Dict):
+        for start in range(0, len(work), self.batch_size):
+            chunk = work[start:start + self.batch_size]
+            requests = {f"req-{i}": {"skin_type": skin_type, "ingredients": ingredients}
+                        for i, (skin_type, ingredients) in enumerate(chunk)}
+            batch = await self.client.create_batch({
+                custom_id: self.agent._ingredients_request(request["ingredients"], request["skin_type"])
+                for custom_id, request in requests.items()
+            })
+            # Recorded before anything else can fail, so the batch is never paid for twice
+            checkpoint["batches"][batch.id] = {"requests": requests, "loaded": False}
+            _write_checkpoint(self.checkpoint_path, checkpoint)
+            self.stats.batches_submitted += 1
+            self.stats.requests_submitted += len(requests)
+
+    async def _load(self, batch_id: str, batch: Dict):
+        async for custom_id, text in self.client.batch_results(batch_id, agent="analysis"):
+            request = batch["requests"].get(custom_id)
+            if request is None:
+                continue
+            try:
+                if text is None:
+                    raise StructuredOutputError("request did not succeed")
+                entries, _ = repair_json(text)
+            except StructuredOutputError as e:
+                print(f"Batch {batch_id} {custom_id}: {e}")
+                self.stats.requests_failed += 1
+                continue
+            fresh = self.agent._match_entries(request["ingredients"], entries)
+            await self.ingredient_store.put_many(fresh, request["skin_type"])
+            self.stats.ingredients_loaded += len(fresh)
+
+    async def _wait_and_load(self, checkpoint: Dict):
+        for batch_id, batch in checkpoint["batches"].items():
+            if batch["loaded"]:
+                continue
+            while (await self.client.retrieve_batch(batch_id)).processing_status != "ended":
+                await asyncio.sleep(self.poll_seconds)
+            await self._load(batch_id, batch)
+            batch["loaded"] = True
+            _write_checkpoint(self.checkpoint_path, checkpoint)
+
+    async def _write_results(self, products: List[Dict], archetypes: List[Dict]):
+        rows = []
+        for profile in archetypes:
+            skin_type = profile.get("skin_type") or "normal"
+            for product in products:
+                known = await self.ingredient_store.get_many(product["ingredients"], skin_type)
+                if len(known) < len({normalize_ingredient(i) for i in product["ingredients"]}):
+                    # Partly analyzed: leave it to the interactive path
+                    continue
+                rows.append({
+                    "ingredients_key": ingredients_key(product),
+                    "profile_key": profile_key(profile),
+                    "product_id": product["product_id"],
+                    "analysis": self.agent._compose_analysis(product, profile, known),
+                })
+        for start in range(0, len(rows), 1000):
+            save_analyses(rows[start:start + 1000], self.bind)
+        self.stats.analyses_written = len(rows)
+
+    async def run(self, products: int = 1000, archetypes: int = 50, wait: bool = True) -> PreanalysisStats:
+        started = time.perf_counter()
+        checkpoint = _read_checkpoint(self.checkpoint_path)
+        self.stats.batches_resumed = sum(not batch["loaded"] for batch in checkpoint["batches"].values())
+
+        product_rows = top_products(self.bind, products)
+        profiles = common_archetypes(self.bind, archetypes)
+        self.stats.products, self.stats.archetypes = len(product_rows), len(profiles)
+        skin_types = list(dict.fromkeys((p.get("skin_type") or "normal").lower() for p in profiles))
+
+        work = await self._missing_ingredients(product_rows, skin_types, checkpoint)
+        if work:
+            await self._submit(work, checkpoint)
+
+        if wait:
+            await self._wait_and_load(checkpoint)
+            await self._write_results(product_rows, profiles)
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+
+        self.stats.seconds = time.perf_counter() - started
+        return self.stats
+
+
+async def _main(args):
+    from agents.llm_client import close_llm_client
+    try:
+        job = CatalogPreanalysis(checkpoint_path=args.checkpoint, batch_size=args.batch_size, poll_seconds=args.poll)
+        return await job.run(args.products, args.archetypes, wait=not args.no_wait)
+    finally:
+        await close_llm_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-analyze top catalog products for common profiles")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--archetypes", type=int, default=50)
+    parser.add_argument("--checkpoint", default="preanalysis.checkpoint")
+    parser.add_argument("--batch-size", type=int, default=10000, help="requests per message batch")
+    parser.add_argument("--poll", type=float, default=60, help="seconds between batch status checks")
+    parser.add_argument("--no-wait", action="store_true", help="submit batches and exit; rerun to load them")
+    args = parser.parse_args()
+
+    from database.connection import init_db
+    init_db()
+
+    result = asyncio.run(_main(args))
+    print(f"✅ {result.products} products x {result.archetypes} archetypes: "
+          f"{result.requests_submitted} requests in {result.batches_submitted} new batches "
+          f"({result.batches_resumed} resumed), {result.ingredients_loaded} ingredient analyses loaded, "
+          f"{result.requests_failed} failed, {result.analyses_written} scan results written "
+          f"in {result.seconds:.1f}s")
@@ -0,0 +1,192 @@
+"""
+Offline job: pre-generate routines for the most common profile archetypes.
+
+    python -m jobs.precompute_routines --top 300
+    python -m jobs.precompute_routines --top 500 --min-users 2 --budgets mid-range --refresh
+
+Users are bucketed by database.routine_table.profile_key (skin type,
+concerns, allergies, age band). The largest buckets get one routine per
+budget, generated by RecommendationAgent for the bucket's representative
+profile and upserted into routine_archetypes as they finish. Archetypes
+already stored are skipped unless --refresh, so an interrupted run picks
+up where it stopped. A failed archetype is recorded and the run goes on;
+calls shed by the LLM dispatcher are retried with backoff.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from agents.dispatcher import LLMOverloaded
+from database.connection import dialect_insert, engine as default_engine
+from database.models import RoutineArchetypeDB, User
+from database.routine_table import BUDGETS, archetype_key, archetype_profile, profile_key
+
+SAVE_EVERY = 20
+# Attempts per archetype while the dispatcher sheds calls, and the first backoff (doubled each time)
+OVERLOAD_RETRIES = 4
+OVERLOAD_BACKOFF = 2.0
+
+
+@dataclass
+class PrecomputeStats:
+    users: int = 0
+    archetypes: int = 0
+    users_covered: int = 0
+    generated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    # archetype key -> why it was not stored
+    failures: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def coverage(self) -> float:
+        return self.users_covered / self.users if self.users else 0.0
+
+
+def common_archetypes(bind, top: int, min_users: int, stats: PrecomputeStats) -> List[Tuple[Dict, int]]:
+    """
+    (representative profile, user count) for the `top` largest archetypes
+    with at least `min_users` users
+    """
+    counts = Counter()
+    profiles = {}
+    with bind.connect() as conn:
+        rows = conn.execution_options(yield_per=5000).execute(
+            select(User.skin_type, User.concerns, User.allergies, User.age)
+        )
+        for row in rows:
+            profile = dict(row._mapping)
+            key = profile_key(profile)
+            counts[key] += 1
+            profiles.setdefault(key, archetype_profile(profile))
+            stats.users += 1
+
+    common = [(profiles[key], n) for key, n in counts.most_common(top) if n >= min_users]
+    stats.archetypes = len(common)
+    stats.users_covered = sum(n for _, n in common)
+    return common
+
+
+def stored_archetypes(bind) -> set:
+    with bind.connect() as conn:
+        return set(conn.execute(select(RoutineArchetypeDB.archetype)).scalars())
+
+
+def save_routines(rows: List[Dict], bind):
+    statement = dialect_insert(RoutineArchetypeDB.__table__, bind)
+    statement = statement.on_conflict_do_update(
+        index_elements=["archetype"],
+        set_={column: statement.excluded[column] for column in ("profile", "routine", "users")},
+    )
+    with bind.begin() as conn:
+        conn.execute(statement, rows)
+
+
+async def precompute(top: int = 300, min_users: int = 3, budgets=BUDGETS, refresh: bool = False,
+                     concurrency: int = 8, agent=None, bind=None) -> PrecomputeStats:
+    bind = bind or default_engine
+    if agent is None:
+        from agents.recommendation_agent import RecommendationAgent
+        agent = RecommendationAgent()
+        # Offline: wait for the model rather than store the rule-based template
+        agent.budget = None
+
+    stats = PrecomputeStats()
+    started = time.perf_counter()
+    existing = set() if refresh else stored_archetypes(bind)
+    jobs = []
+    for profile, users in common_archetypes(bind, top, min_users, stats):
+        for budget in budgets:
+            key = archetype_key(profile, budget)
+            if key in existing:
+                stats.skipped += 1
+            else:
+                jobs.append((key, profile, budget, users))
+
+    semaphore = asyncio.Semaphore(concurrency)
+    pending: List[Dict] = []
+    loop = asyncio.get_running_loop()
+
+    def fail(key: str, reason: str):
+        stats.failed += 1
+        stats.failures[key] = reason
+
+    async def save(rows: List[Dict]):
+        # The sync engine blocks; keep it off the event loop
+        try:
+            await loop.run_in_executor(None, save_routines, rows, bind)
+        except Exception as e:
+            stats.generated -= len(rows)
+            for row in rows:
+                fail(row["archetype"], f"save failed: {e}")
+
+    async def build(profile: Dict, budget: str) -> Dict:
+        for attempt in range(OVERLOAD_RETRIES):
+            try:
+                async with semaphore:
+                    return await agent.build_routine(profile, budget)
+            except LLMOverloaded as e:
+                if attempt == OVERLOAD_RETRIES - 1:
+                    raise
+                await asyncio.sleep(max(e.retry_after, OVERLOAD_BACKOFF * 2 ** attempt))
+
+    async def generate(key: str, profile: Dict, budget: str, users: int):
+        try:
+            routine = await build(profile, budget)
+        except Exception as e:
+            fail(key, f"{type(e).__name__}: {e}")
+            return
+        if "error" in routine or routine.get("degraded") or not routine.get("morning"):
+            fail(key, routine.get("error") or routine.get("degraded") or "no morning routine")
+            return
+        stats.generated += 1
+        pending.append({"archetype": key, "skin_type": profile["skin_type"], "budget": budget,
+                        "profile": profile, "routine": routine, "users": users})
+        if len(pending) >= SAVE_EVERY:
+            rows = pending[:]
+            pending.clear()
+            await save(rows)
+
+    results = await asyncio.gather(*[generate(*job) for job in jobs], return_exceptions=True)
+    for (key, *_), result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            fail(key, f"{type(result).__name__}: {result}")
+    if pending:
+        await save(pending)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+async def _main(args):
+    from agents.llm_client import close_llm_client
+    try:
+        return await precompute(args.top, args.min_users, args.budgets, args.refresh, args.concurrency)
+    finally:
+        await close_llm_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate routines for common profile archetypes")
+    parser.add_argument("--top", type=int, default=300, help="archetypes to cover, largest first")
+    parser.add_argument("--min-users", type=int, default=3, help="skip archetypes with fewer users")
+    parser.add_argument("--budgets", nargs="+", default=list(BUDGETS))
+    parser.add_argument("--concurrency", type=int, default=8, help="routines generated at once")
+    parser.add_argument("--refresh", action="store_true", help="regenerate archetypes already stored")
+    args = parser.parse_args()
+
+    from database.connection import init_db
+    init_db()
+
+    result = asyncio.run(_main(args))
+    print(f"✅ {result.archetypes} archetypes cover {result.users_covered:,} of {result.users:,} users "
+          f"({result.coverage:.0%}); {result.generated} routines generated, {result.skipped} already stored, "
+          f"{result.failed} failed in {result.seconds:.1f}s")
+    for key, reason in list(result.failures.items())[:10]:
+        print(f"  ✗ {key}: {reason}")
@@ -0,0 +1,417 @@
+"""
+Local stand-in for the Anthropic Messages API, used by the load tests.
+
+Also answers the Message Batches endpoints: a batch ends `batch_latency`
+seconds after it is created, with one canned reply per request.
+
+Time to first token is drawn from a latency distribution, output is paced
+at a token rate, and a share of calls can be failed with 429 / 5xx / 529.
+
+Run standalone:
+    python -m loadtest.fake_anthropic --port 8100 --latency 2.0 --chunk-delay 0.02
+    python -m loadtest.fake_anthropic --latency lognormal:1.2,0.5 --tokens-per-second 60 --errors 429=0.02,529=0.01
+then start the API with ANTHROPIC_BASE_URL=http://127.0.0.1:8100
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import Callable, Dict, List, Union
+import argparse
+import asyncio
+import json
+import math
+import random
+import socket
+import threading
+import time
+import uuid
+import uvicorn
+
+ANALYSIS_REPLY = {
+    "overall_score": 82,
+    "recommendation": "recommended",
+    "summary": "Gentle, hydrating formula",
+    "ingredient_analyses": [],
+    "warnings": [],
+    "benefits": ["Hydration"],
+    "interactions": [],
+    "usage_tips": ["Apply on damp skin"],
+}
+
+ROUTINE_REPLY = {
+    "morning": [
+        {"step": 1, "product_type": "Cleanser", "recommendation": "Gentle Cleanser", "why": "Low pH", "price": "$10"},
+        {"step": 2, "product_type": "Sunscreen", "recommendation": "SPF 50", "why": "UV protection", "price": "$15"},
+    ],
+    "night": [
+        {"step": 1, "product_type": "Cleanser", "recommendation": "Gentle Cleanser", "why": "Low pH", "price": "$10"},
+        {"step": 2, "product_type": "Moisturizer", "recommendation": "Ceramide Cream", "why": "Barrier", "price": "$18"},
+    ],
+    "weekly": [],
+    "total_monthly_cost": "$40-60",
+    "expected_results": "Visible improvement in 4-6 weeks",
+    "tips": ["Apply on damp skin"],
+}
+
+PROFILE_REPLY = {
+    "skin_type": "combination",
+    "concerns": ["dryness"],
+    "severity": {"dryness": "mild"},
+    "triggers": ["weather"],
+    "current_routine": ["cleanser"],
+    "goals": ["hydration"],
+    "confidence": 0.8,
+    "follow_up_questions": ["How does your skin feel by midday?"],
+}
+
+QUESTIONS_REPLY = ["How does your skin feel by midday?", "Do you wear sunscreen daily?", "What's your main goal?"]
+
+ROUTING_REPLY = {"agent": "CHAT", "action": "general_chat", "parameters": {}, "confidence": 0.9, "reasoning": "General"}
+
+CHAT_REPLY = ("Great question! A gentle cleanser, a moisturizer suited to your skin type and daily "
+              "sunscreen cover the basics. Add one active at a time and give it a few weeks.")
+
+CHUNK_CHARS = 16
+
+# Injected status -> error type in the response body
+ERROR_TYPES = {429: "rate_limit_error", 500: "api_error", 503: "api_error", 529: "overloaded_error"}
+
+
+def latency_distribution(spec: Union[float, str, Callable[[], float]], rng: random.Random = None) -> Callable[[], float]:
+    """
+    Sampler for seconds to the first token:
+        1.5 / "fixed:1.5"         always 1.5
+        "uniform:0.5,2"           uniform between the two
+        "normal:1,0.3"            mean, standard deviation (clipped at 0)
+        "lognormal:1.2,0.5"       median, sigma of the log; long right tail
+        "exponential:1"           mean
+    """
+    if callable(spec):
+        return spec
+    rng = rng or random.Random()
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+    kind, _, args = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+    values = [float(v) for v in args.split(",")]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exponential":
+        return lambda: rng.expovariate(1 / values[0])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+def parse_errors(spec: str) -> Dict[int, float]:
+    """
+    "429=0.02,529=0.01" -> {429: 0.02, 529: 0.01}
+    """
+    errors = {}
+    for item in filter(None, (spec or "").split(",")):
+        status, _, rate = item.partition("=")
+        errors[int(status)] = float(rate)
+    return errors
+
+
+def reply_for(body: Dict) -> str:
+    """
+    Canned reply text matching what the calling agent expects to parse
+    """
+    messages = body["messages"]
+    if messages[-1]["role"] == "assistant":
+        # Prefilled continuation: only the rest of the canned reply
+        prefill = messages[-1]["content"]
+        text = reply_for(dict(body, messages=messages[:-1]))
+        return text[len(prefill):] if text.startswith(prefill) else text
+
+    content = messages[-1]["content"]
+    if isinstance(content, list):
+        content = "".join(block.get("text", "") for block in content)
+
+    if "Ingredients: [" in content:
+        ingredients = json.loads(content.split("Ingredients: ", 1)[1].splitlines()[0])
+        return json.dumps([
+            {
+                "ingredient": name,
+                "category": "other",
+                "benefits": ["Hydration"],
+                "risks": ["None for this skin type"],
+                "suitability_score": 82,
+                "evidence_level": "moderate",
+                "explanation": "Well tolerated",
+                "usage_tips": ["Apply on damp skin"],
+            }
+            for name in ingredients
+        ])
+    if "Route this request." in content:
+        return json.dumps(ROUTING_REPLY)
+    if "Create a complete routine." in content:
+        return json.dumps(ROUTINE_REPLY)
+    if "User describes their skin:" in content:
+        return json.dumps(PROFILE_REPLY)
+    if "Current profile:" in content:
+        return json.dumps(QUESTIONS_REPLY)
+    if "Message: " in content:
+        return CHAT_REPLY
+    return json.dumps(ANALYSIS_REPLY)
+
+
+def _blocks(content) -> List[Dict]:
+    return [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+
+
+def usage_for(body: Dict, cache: set) -> Dict:
+    """
+    Token usage (~4 characters per token) with the provider's prompt-cache
+    accounting: the prefix up to the last cache_control block is written
+    on first sight and read afterwards
+    """
+    blocks = _blocks(body.get("system") or [])
+    for message in body["messages"]:
+        blocks += _blocks(message["content"])
+    tokens = [len(block.get("text", "")) // 4 + 1 for block in blocks]
+    marked = [i for i, block in enumerate(blocks) if block.get("cache_control")]
+    if not marked:
+        return {"input_tokens": sum(tokens), "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+
+    end = marked[-1] + 1
+    prefix = json.dumps(blocks[:end], sort_keys=True)
+    cached = sum(tokens[:end])
+    hit = prefix in cache
+    cache.add(prefix)
+    return {
+        "input_tokens": sum(tokens[end:]),
+        "cache_creation_input_tokens": 0 if hit else cached,
+        "cache_read_input_tokens": cached if hit else 0,
+    }
+
+
+def chunks(text: str) -> List[str]:
+    return [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)]
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def error_response(status: int) -> JSONResponse:
+    headers = {"retry-after": "1"} if status in (429, 529) else {}
+    return JSONResponse(status_code=status, headers=headers, content={
+        "type": "error", "error": {"type": ERROR_TYPES.get(status, "api_error"), "message": "Injected by the fake API"},
+    })
+
+
+async def stream_events(body: Dict, text: str, chunk_delay: float, usage: Dict):
+    """
+    Messages API streaming events: one text block, CHUNK_CHARS per delta
+    """
+    message = {
+        "id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant",
+        "model": body.get("model", "fake-model"), "content": [], "stop_reason": None,
+        "stop_sequence": None, "usage": dict(usage, output_tokens=1),
+    }
+    yield _sse("message_start", {"type": "message_start", "message": message})
+    yield _sse("content_block_start", {"type": "content_block_start", "index": 0,
+                                       "content_block": {"type": "text", "text": ""}})
+    for piece in chunks(text):
+        yield _sse("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                           "delta": {"type": "text_delta", "text": piece}})
+        await asyncio.sleep(chunk_delay)
+    yield _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+    yield _sse("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                 "usage": {"output_tokens": len(text) // 4 + 1}})
+    yield _sse("message_stop", {"type": "message_stop"})
+
+
+def message_json(body: Dict, text: str, usage: Dict) -> Dict:
+    return {
+        "id": f"msg_{uuid.uuid4().hex}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "fake-model"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": dict(usage, output_tokens=len(text) // 4 + 1),
+    }
+
+
+def create_app(latency: Union[float, str, Callable[[], float]] = 1.0, chunk_delay: float = 0.0,
+               batch_latency: float = None, tokens_per_second: float = None, errors: Dict[int, float] = None,
+               seed: int = None) -> FastAPI:
+    """
+    Build a fake API: `latency` seconds to the first token (a number or a
+    latency_distribution spec), then `chunk_delay` per CHUNK_CHARS of
+    output, or output paced at `tokens_per_second` when given
+    (non-streaming calls wait for all of it). `errors` maps a status to
+    the share of calls failed with it, before any latency.
+    """
+    rng = random.Random(seed)
+    app = FastAPI()
+    app.state.latency = latency_distribution(latency, rng)
+    if tokens_per_second:
+        chunk_delay = CHUNK_CHARS / 4 / tokens_per_second
+    app.state.chunk_delay = chunk_delay
+    app.state.batch_latency = (latency if isinstance(latency, (int, float)) else 1.0) if batch_latency is None \
+        else batch_latency
+    app.state.errors = dict(errors or {})
+    app.state.calls = 0
+    app.state.injected = Counter()
+    app.state.prompt_cache = set()
+    app.state.batches = {}
+
+    def injected_status():
+        roll = rng.random()
+        for status, rate in app.state.errors.items():
+            if roll < rate:
+                return status
+            roll -= rate
+        return None
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        status = injected_status()
+        if status is not None:
+            app.state.injected[status] += 1
+            return error_response(status)
+        text = reply_for(body)
+        usage = usage_for(body, app.state.prompt_cache)
+        await asyncio.sleep(app.state.latency())
+
+        if body.get("stream"):
+            return StreamingResponse(stream_events(body, text, app.state.chunk_delay, usage),
+                                     media_type="text/event-stream")
+
+        await asyncio.sleep(app.state.chunk_delay * len(chunks(text)))
+        return message_json(body, text, usage)
+
+    def batch_json(request: Request, batch: Dict) -> Dict:
+        ended = datetime.now(timezone.utc) >= batch["ends_at"]
+        count = len(batch["requests"])
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else count, "succeeded": count if ended else 0,
+                               "errored": 0, "canceled": 0, "expired": 0},
+            "created_at": batch["created_at"].isoformat(),
+            "expires_at": (batch["created_at"] + timedelta(hours=24)).isoformat(),
+            "ended_at": batch["ends_at"].isoformat() if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{str(request.base_url).rstrip('/')}/v1/messages/batches/{batch['id']}/results"
+                           if ended else None,
+        }
+
+    @app.post("/v1/messages/batches")
+    async def create_batch(request: Request):
+        body = await request.json()
+        created_at = datetime.now(timezone.utc)
+        batch = {
+            "id": f"msgbatch_{uuid.uuid4().hex}",
+            "requests": body["requests"],
+            "created_at": created_at,
+            "ends_at": created_at + timedelta(seconds=app.state.batch_latency),
+        }
+        app.state.batches[batch["id"]] = batch
+        return batch_json(request, batch)
+
+    @app.get("/v1/messages/batches/{batch_id}")
+    async def retrieve_batch(batch_id: str, request: Request):
+        if batch_id not in app.state.batches:
+            raise HTTPException(status_code=404, detail="batch not found")
+        return batch_json(request, app.state.batches[batch_id])
+
+    @app.get("/v1/messages/batches/{batch_id}/results")
+    async def batch_results(batch_id: str):
+        batch = app.state.batches[batch_id]
+        lines = []
+        for item in batch["requests"]:
+            params = item["params"]
+            message = message_json(params, reply_for(params), usage_for(params, app.state.prompt_cache))
+            lines.append(json.dumps({"custom_id": item["custom_id"], "result": {"type": "succeeded", "message": message}}))
+        return PlainTextResponse("\n".join(lines) + "\n", media_type="application/binary")
+
+    return app
+
+
+class BackgroundServer:
+    """
+    Runs an ASGI app with uvicorn in a background thread
+    """
+
+    def __init__(self, app, port: int = 0):
+        self.app = app
+        self.port = port or _free_port()
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeAnthropicServer(BackgroundServer):
+    """
+    The fake API in a background thread
+    """
+
+    def __init__(self, latency: Union[float, str] = 1.0, port: int = 0, chunk_delay: float = 0.0,
+                 batch_latency: float = None, tokens_per_second: float = None, errors: Dict[int, float] = None,
+                 seed: int = None):
+        super().__init__(create_app(latency, chunk_delay, batch_latency, tokens_per_second, errors, seed), port)
+
+    @property
+    def calls(self) -> int:
+        return self.app.state.calls
+
+    @property
+    def injected(self) -> Counter:
+        return self.app.state.injected
+
+    @property
+    def batches(self) -> Dict[str, Dict]:
+        return self.app.state.batches
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default="1.0", help="seconds, or a distribution such as lognormal:1.2,0.5")
+    parser.add_argument("--chunk-delay", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="output pace; overrides --chunk-delay")
+    parser.add_argument("--errors", default="", help="injected failures, e.g. 429=0.02,529=0.01")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    app = create_app(args.latency, args.chunk_delay, tokens_per_second=args.tokens_per_second,
+                     errors=parse_errors(args.errors), seed=args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
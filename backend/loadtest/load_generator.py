@@ -0,0 +1,400 @@
+"""
+Mixed-workload load generator: chat, product scans, routine generation and
+feedback in a weighted mix, closed-loop (N concurrent clients) or
+open-loop (Poisson arrivals at a target rate). Reports RPS, p50/p95/p99,
+error and degraded rates per endpoint, and compares a run against a
+stored baseline so regressions between releases fail loudly.
+
+Against the API and a fake Anthropic backend, both started in-process:
+    python -m loadtest.load_generator --local --duration 30 --concurrency 32 \\
+        --latency lognormal:1.2,0.5 --tokens-per-second 80 --errors 429=0.02,529=0.01 \\
+        --json run.json --baseline loadtest/baseline.json
+
+Against a running deployment (users must already exist):
+    python -m loadtest.load_generator --target http://127.0.0.1:8000 --users id1,id2 --rps 20
+"""
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from .fake_anthropic import BackgroundServer, FakeAnthropicServer, parse_errors
+
+DEFAULT_MIX = {"chat": 0.4, "scan": 0.35, "routine": 0.15, "feedback": 0.1}
+
+CHAT_MESSAGES = [
+    "What should I use for dry patches on my cheeks?",
+    "Is niacinamide okay to use with vitamin C?",
+    "My skin gets red after washing, what am I doing wrong?",
+    "How often should I exfoliate?",
+    "Can you recommend a sunscreen for oily skin?",
+    "Why do I break out around my chin?",
+]
+INGREDIENT_POOL = [
+    "Water", "Glycerin", "Niacinamide", "Hyaluronic Acid", "Ceramide NP", "Squalane", "Panthenol",
+    "Salicylic Acid", "Glycolic Acid", "Retinol", "Ascorbic Acid", "Tocopherol", "Allantoin",
+    "Fragrance", "Alcohol Denat", "Dimethicone", "Butylene Glycol", "Phenoxyethanol", "Zinc Oxide",
+    "Centella Asiatica Extract", "Shea Butter", "Lactic Acid", "Azelaic Acid", "Sodium Lauryl Sulfate",
+]
+SKIN_TYPES = ["dry", "oily", "combination", "normal", "sensitive"]
+CONCERNS = ["acne", "dryness", "redness", "hyperpigmentation", "aging", "oiliness"]
+BUDGETS = ["budget", "mid-range", "premium"]
+OUTCOMES = ["improved", "no_change", "irritation", "breakout"]
+
+# Relative change tolerated before compare() reports a regression
+DEFAULT_TOLERANCE = 0.2
+# Absolute increase in error rate tolerated
+ERROR_RATE_TOLERANCE = 0.01
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """
+    "chat=4,scan=3,routine=2,feedback=1" -> normalised weights
+    """
+    mix = {}
+    for item in filter(None, spec.split(",")):
+        endpoint, _, weight = item.partition("=")
+        if endpoint not in DEFAULT_MIX:
+            raise ValueError(f"unknown endpoint in mix: {endpoint}")
+        mix[endpoint] = float(weight)
+    total = sum(mix.values())
+    return {endpoint: weight / total for endpoint, weight in mix.items()}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class Workload:
+    """
+    Builds the next request for an endpoint: random users, messages,
+    catalog barcodes or label ingredient lists, budgets and ratings
+    """
+
+    def __init__(self, user_ids: List[str], barcodes: List[str] = None, product_ids: List[str] = None,
+                 mix: Dict[str, float] = None, seed: int = None):
+        if not user_ids:
+            raise ValueError("the load generator needs at least one existing user id")
+        self.user_ids = user_ids
+        self.barcodes = barcodes or []
+        self.product_ids = product_ids or []
+        self.mix = mix or DEFAULT_MIX
+        self.rng = random.Random(seed)
+
+    def pick(self) -> str:
+        return self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+    def request(self, endpoint: str) -> Tuple[str, Dict]:
+        """
+        (path, httpx keyword arguments) for one POST
+        """
+        rng = self.rng
+        user_id = rng.choice(self.user_ids)
+        if endpoint == "chat":
+            return "/api/chat", {"json": {"user_id": user_id, "message": rng.choice(CHAT_MESSAGES)}}
+        if endpoint == "scan":
+            if self.barcodes and rng.random() < 0.5:
+                return "/api/products/scan", {"json": {"user_id": user_id, "barcode": rng.choice(self.barcodes)}}
+            ingredients = rng.sample(INGREDIENT_POOL, rng.randint(5, 15))
+            return "/api/products/scan", {"json": {"user_id": user_id, "ingredients": ingredients}}
+        if endpoint == "routine":
+            return "/api/routine/generate", {"params": {"user_id": user_id, "budget": rng.choice(BUDGETS)}}
+        if endpoint == "feedback":
+            product_id = rng.choice(self.product_ids) if self.product_ids else str(uuid.uuid4())
+            return "/api/feedback", {"json": {"user_id": user_id, "product_id": product_id,
+                                              "rating": rng.randint(1, 5), "outcome": rng.choice(OUTCOMES)}}
+        raise ValueError(f"unknown endpoint: {endpoint}")
+
+
+def degraded_reason(endpoint: str, body) -> Optional[str]:
+    """
+    Why a 200 was served by a local fallback instead of the LLM, if it was
+    """
+    if not isinstance(body, dict):
+        return None
+    if endpoint == "scan":
+        body = body.get("analysis") or {}
+    return body.get("degraded")
+
+
+class Recorder:
+    """
+    Latency, status and fallback tallies per endpoint
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Counter] = {}
+        self.degraded: Dict[str, Counter] = {}
+
+    def record(self, endpoint: str, seconds: float, status, degraded: str = None):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        self.statuses.setdefault(endpoint, Counter())[str(status)] += 1
+        if degraded:
+            self.degraded.setdefault(endpoint, Counter())[degraded] += 1
+
+    def summary(self, elapsed: float) -> Dict:
+        endpoints = {endpoint: self._summarize(endpoint, self.latencies[endpoint], elapsed)
+                     for endpoint in sorted(self.latencies)}
+        everything = [seconds for latencies in self.latencies.values() for seconds in latencies]
+        return {
+            "duration": elapsed,
+            "endpoints": endpoints,
+            "total": self._summarize(None, everything, elapsed),
+        }
+
+    def _summarize(self, endpoint: Optional[str], latencies: List[float], elapsed: float) -> Dict:
+        statuses = self.statuses.get(endpoint) if endpoint else sum(self.statuses.values(), Counter())
+        degraded = self.degraded.get(endpoint, Counter()) if endpoint else sum(self.degraded.values(), Counter())
+        errors = {status: n for status, n in statuses.items() if not status.startswith("2")}
+        requests = len(latencies)
+        ms = [seconds * 1000 for seconds in latencies]
+        return {
+            "requests": requests,
+            "rps": requests / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(ms, 0.5),
+            "p95_ms": percentile(ms, 0.95),
+            "p99_ms": percentile(ms, 0.99),
+            "error_rate": sum(errors.values()) / requests if requests else 0.0,
+            "errors": errors,
+            "degraded_rate": sum(degraded.values()) / requests if requests else 0.0,
+            "degraded": dict(degraded),
+        }
+
+
+async def send(client: httpx.AsyncClient, workload: Workload, recorder: Recorder):
+    endpoint = workload.pick()
+    path, kwargs = workload.request(endpoint)
+    started = time.perf_counter()
+    try:
+        response = await client.post(path, **kwargs)
+    except httpx.HTTPError as e:
+        recorder.record(endpoint, time.perf_counter() - started, type(e).__name__)
+        return
+    seconds = time.perf_counter() - started
+    reason = None
+    if response.status_code == 200:
+        try:
+            reason = degraded_reason(endpoint, response.json())
+        except ValueError:
+            pass
+    recorder.record(endpoint, seconds, response.status_code, reason)
+
+
+async def run_load(client: httpx.AsyncClient, workload: Workload, duration: float, concurrency: int = 16,
+                   rps: float = None) -> Dict:
+    """
+    Drive the mix for `duration` seconds. Closed loop by default:
+    `concurrency` clients each sending their next request when the last
+    one returns. With `rps`, open loop: Poisson arrivals at that rate,
+    whatever the latency (shows queueing that a closed loop hides).
+    """
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    if rps:
+        in_flight = set()
+        next_at = started
+        while True:
+            next_at += workload.rng.expovariate(rps)
+            if next_at >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            task = asyncio.create_task(send(client, workload, recorder))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    else:
+        async def loop():
+            while time.perf_counter() < deadline:
+                await send(client, workload, recorder)
+        await asyncio.gather(*[loop() for _ in range(concurrency)])
+
+    return recorder.summary(time.perf_counter() - started)
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    Regressions of `report` against `baseline`: lower RPS or higher
+    p95 / p99 by more than `tolerance` (relative), or an error rate more
+    than ERROR_RATE_TOLERANCE higher
+    """
+    regressions = []
+    sections = {**baseline.get("endpoints", {}), "total": baseline.get("total", {})}
+    for name, base in sections.items():
+        current = report["total"] if name == "total" else report["endpoints"].get(name)
+        if current is None:
+            regressions.append(f"{name}: no requests in this run")
+            continue
+        if base.get("rps") and current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {current['rps']:.1f} < baseline {base['rps']:.1f}")
+        for key in ("p95_ms", "p99_ms"):
+            if base.get(key) and current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {current[key]:.0f} > baseline {base[key]:.0f}")
+        if current["error_rate"] > base.get("error_rate", 0.0) + ERROR_RATE_TOLERANCE:
+            regressions.append(f"{name}: error rate {current['error_rate']:.1%} > baseline {base['error_rate']:.1%}")
+    return regressions
+
+
+def format_report(report: Dict) -> str:
+    lines = [f"{'endpoint':>10} {'requests':>9} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+             f"{'errors':>7} {'degraded':>8}"]
+    rows = {**report["endpoints"], "total": report["total"]}
+    for name, row in rows.items():
+        lines.append(f"{name:>10} {row['requests']:9d} {row['rps']:8.1f} {row['p50_ms']:8.0f} {row['p95_ms']:8.0f} "
+                     f"{row['p99_ms']:8.0f} {row['error_rate']:7.1%} {row['degraded_rate']:8.1%}")
+    errors = {status: n for status, n in report["total"]["errors"].items()}
+    if errors:
+        lines.append(f"errors by status: {errors}")
+    if report.get("upstream"):
+        lines.append(f"upstream: {report['upstream']}")
+    return "\n".join(lines)
+
+
+# ---------- in-process stack ----------
+
+@contextmanager
+def scratch_app(anthropic_base_url: str, **env):
+    """
+    A fresh main.create_app on a SQLite file in a temporary directory
+    (removed on exit), talking to `anthropic_base_url`. `env` overrides
+    (e.g. LLM_MAX_CONCURRENCY="1") apply until exit, so they reach the
+    components the app builds lazily and nothing else.
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    env = {"ANTHROPIC_BASE_URL": anthropic_base_url, "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY", "test-key"),
+           **env}
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update({name: str(value) for name, value in env.items()})
+
+    import main
+    try:
+        with tempfile.TemporaryDirectory(prefix="skincare-app-") as workdir:
+            static_dir = os.path.join(workdir, "static")
+            os.makedirs(static_dir)
+            app = main.create_app(database_url=f"sqlite:///{os.path.join(workdir, 'skincare.db')}",
+                                  static_dir=static_dir)
+            app.state.database.init_db()
+            try:
+                yield app
+            finally:
+                app.state.database.engine.dispose()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def seed(session_factory, n_users: int, n_products: int,
+         rng: random.Random) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Users with varied profiles and a catalog of products; returns
+    (user ids, barcodes, product ids)
+    """
+    from database.models import ProductDB, User
+
+    user_ids = [str(uuid.uuid4()) for _ in range(n_users)]
+    barcodes = [f"LOAD{i:08d}" for i in range(n_products)]
+    product_ids = [str(uuid.uuid4()) for _ in range(n_products)]
+    with session_factory() as db:
+        for user_id in user_ids:
+            db.add(User(user_id=user_id, name="Load Test", age=rng.randint(18, 65), skin_type=rng.choice(SKIN_TYPES),
+                        concerns=rng.sample(CONCERNS, 2), allergies=[], climate="temperate", lifestyle={},
+                        medical_conditions=[]))
+        for product_id, barcode in zip(product_ids, barcodes):
+            db.add(ProductDB(product_id=product_id, barcode=barcode, name=f"Cream {barcode}", brand="LoadLab",
+                             ingredients=rng.sample(INGREDIENT_POOL, rng.randint(8, 20))))
+        db.commit()
+    return user_ids, barcodes, product_ids
+
+
+@contextmanager
+def local_stack(fake: FakeAnthropicServer, n_users: int = 50, n_products: int = 200, seed_value: int = None):
+    """
+    Start the API on a scratch SQLite database and static dir, pointed at
+    `fake`; yields (base url, Workload fixtures)
+    """
+    with scratch_app(fake.base_url) as app:
+        user_ids, barcodes, product_ids = seed(app.state.database.SessionLocal, n_users, n_products,
+                                               random.Random(seed_value))
+        with BackgroundServer(app) as api:
+            yield api.base_url, {"user_ids": user_ids, "barcodes": barcodes, "product_ids": product_ids}
+
+
+async def drive(base_url: str, workload: Workload, duration: float, concurrency: int, rps: float,
+                timeout: float) -> Dict:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        return await run_load(client, workload, duration, concurrency, rps)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--local", action="store_true", help="start the API and a fake Anthropic backend in-process")
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", default="", help="comma-separated existing user ids (with --target)")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rps", type=float, default=None, help="open loop at this arrival rate")
+    parser.add_argument("--mix", default="", help="e.g. chat=4,scan=3,routine=2,feedback=1")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--latency", default="1.0", help="fake backend time to first token, or a distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--errors", default="", help="fake backend failures, e.g. 429=0.02,529=0.01")
+    parser.add_argument("--json", default=None, help="write the report here")
+    parser.add_argument("--baseline", default=None, help="compare against this report; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    config = {key: value for key, value in vars(args).items() if key not in ("json", "baseline", "users")}
+
+    if args.local:
+        with FakeAnthropicServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                 errors=parse_errors(args.errors), seed=args.seed) as fake:
+            with local_stack(fake, seed_value=args.seed) as (base_url, fixtures):
+                workload = Workload(mix=mix, seed=args.seed, **fixtures)
+                report = asyncio.run(drive(base_url, workload, args.duration, args.concurrency, args.rps, args.timeout))
+            report["upstream"] = {"calls": fake.calls, "injected": dict(fake.injected)}
+    else:
+        workload = Workload([user_id for user_id in args.users.split(",") if user_id], mix=mix, seed=args.seed)
+        report = asyncio.run(drive(args.target, workload, args.duration, args.concurrency, args.rps, args.timeout))
+
+    report["config"] = config
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,121 @@
 from unittest import result
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
+import json
+import os
 import uuid
 
 # Load environment variables
 load_dotenv()
 
 # ---------------- DATABASE ----------------
-from database.connection import get_db, engine, Base
+from database.connection import Database
 from database.models import User, ProductDB, FeedbackDB, ConversationHistory
+from database.product_lookup import ProductLookup
+from database.history_cache import HistoryCache
+from database.write_behind import WriteBehindQueue
+from database.routine_table import RoutineTable
 
-Base.metadata.create_all(bind=engine)
+# ---------------- METRICS ----------------
+from monitoring.metrics import get_metrics
+from monitoring.instrumentation import MetricsMiddleware, stats_collector
+
+metrics = get_metrics()
 
 # ---------------- SCHEMAS ----------------
 from models.schemas import UserProfileCreate, ChatMessage, ProductScan, UserFeedback
 
 # ---------------- AGENTS ----------------
-from agents.orchestrator import OrchestratorAgent
-from agents.profile_agent import ProfileIntelligenceAgent
-from agents.analysis_agent import AnalysisAgent
-from agents.recommendation_agent import RecommendationAgent
-
-# ---------------- FASTAPI INIT ----------------
-app = FastAPI(
-    title="🤖 Agentic Skincare Intelligence API",
-    description="AI-powered personalized skincare analysis",
-    version="2.0.0",
-)
-
-# ---------------- STATIC FILES ----------------
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-@app.get("/favicon.ico", include_in_schema=False)
-async def favicon():
-    return FileResponse("static/favicon.ico")
-
-# ---------------- CORS ----------------
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # ⚠️ restrict in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# ---------------- AGENT INIT ----------------
-try:
-    orchestrator = OrchestratorAgent()
-    profile_agent = ProfileIntelligenceAgent()
-    analysis_agent = AnalysisAgent()
-    recommendation_agent = RecommendationAgent()
-    print("✅ AI Agents initialized successfully")
-except Exception as e:
-    print("❌ Agent initialization failed:", e)
-    raise
+# Agents (and their LLM client) are built lazily on first use
+from agents.registry import AgentRegistry
+from agents.dispatcher import LLMOverloaded
+
+# ---------------- LIFESPAN ----------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    state = app.state
+    state.database.init_db()
+    # Refit the local intent classifier on logged chats in the background;
+    # until it finishes, routing uses the seed model
+    training = asyncio.create_task(state.agents.train_intent_classifier())
+    # Pre-analyzed catalog products become analysis cache hits
+    warming = asyncio.create_task(state.agents.warm_analysis_cache())
+    yield
+    training.cancel()
+    warming.cancel()
+    await state.write_behind.close()
+    await state.agents.close()
+    await state.database.dispose()
+
+# ---------------- COMPONENTS ----------------
+# Each app owns its database, caches and agents (see create_app); handlers get them from app.state
+async def get_async_db(request: Request):
+    async with request.app.state.database.AsyncSessionLocal() as db:
+        yield db
+
+def get_agents(request: Request) -> AgentRegistry:
+    return request.app.state.agents
+
+def get_product_lookup(request: Request) -> ProductLookup:
+    return request.app.state.product_lookup
+
+def get_history_cache(request: Request) -> HistoryCache:
+    return request.app.state.history_cache
+
+def get_write_behind(request: Request) -> WriteBehindQueue:
+    return request.app.state.write_behind
+
+def get_routine_table(request: Request) -> RoutineTable:
+    return request.app.state.routine_table
+
+router = APIRouter()
+
+# ---------------- SSE ----------------
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def shed_as_error(events):
+    # Once streaming has started the status is sent; a shed call ends the stream with an "error" event
+    try:
+        async for event in events:
+            yield event
+    except LLMOverloaded as e:
+        yield sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+
+def sse_response(events) -> StreamingResponse:
+    # no-cache / no proxy buffering so each event reaches the client as it is sent
+    return StreamingResponse(shed_as_error(events), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # ================= ROOT =================
-@app.get("/")
+@router.get("/")
 def root():
     return {"message": "🌸 Skincare Intelligence API", "status": "running", "version": "2.0.0", "docs": "/docs"}
 
-@app.get("/health")
+@router.get("/health")
 def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    # Prometheus text exposition format
+    return PlainTextResponse(metrics.render(request.app.state.collect_stats), media_type="text/plain; version=0.0.4")
+
 # ================= USER =================
-@app.post("/api/users/create-from-description")
-async def create_user_from_description(data: UserProfileCreate, db: Session = Depends(get_db)):
+@router.post("/api/users/create-from-description")
+async def create_user_from_description(data: UserProfileCreate, db: AsyncSession = Depends(get_async_db),
+                                       agents: AgentRegistry = Depends(get_agents)):
     try:
         # Analyze description via AI agent
-        analysis = await profile_agent.analyze_description(data.description)
+        analysis = await agents.profile.analyze_description(data.description)
         user_id = str(uuid.uuid4())
 
         # Create user in DB including work_location
@@ -93,8 +133,8 @@ async def create_user_from_description(data: UserProfileCreate, db: Session = De
         )
 
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
 
         # Return profile including work_location
         profile_response = analysis
@@ -102,12 +142,14 @@ async def create_user_from_description(data: UserProfileCreate, db: Session = De
 
         return {"user_id": user_id, "profile": profile_response, "message": "Profile created successfully!"}
 
+    except LLMOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/users/{user_id}")
-def get_user(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.user_id == user_id).first()
+@router.get("/api/users/{user_id}")
+async def get_user(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {
@@ -122,10 +164,8 @@ def get_user(user_id: str, db: Session = Depends(get_db)):
     }
 
 # ================= CHAT =================
-@app.post("/api/chat")
-async def chat(message: ChatMessage, db: Session = Depends(get_db)):
-
-    user = db.query(User).filter(User.user_id == message.user_id).first()
+async def load_chat_context(message: ChatMessage, db: AsyncSession, history_cache: HistoryCache):
+    user = await db.get(User, message.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -138,97 +178,267 @@ async def chat(message: ChatMessage, db: Session = Depends(get_db)):
         "work_location": getattr(user, "work_location", None),
     }
 
-    history = db.query(ConversationHistory)\
-        .filter(ConversationHistory.user_id == message.user_id)\
-        .order_by(ConversationHistory.timestamp.desc())\
-        .limit(10)\
-        .all()
-
-    conversation_context = [
-        {"role": h.role, "content": h.message}
-        for h in reversed(history)
-    ]
-
-    result = {
-        "response": "Based on your skin profile, I recommend a salicylic acid cleanser, niacinamide serum, and lightweight oil-free moisturizer. Use sunscreen daily.",
-        "agent_used": "demo_agent",
-        "confidence": 0.97
-    }
-
-    db.add(ConversationHistory(user_id=message.user_id, role="user", message=message.message))
-    db.add(ConversationHistory(user_id=message.user_id, role="assistant", message=result["response"], agent_used="demo_agent"))
-    db.commit()
-
+    conversation_context = await history_cache.recent(db, message.user_id)
+    # Return the pooled connection while waiting on the LLM
+    await db.close()
+    return user_profile, conversation_context
+
+async def save_chat_turn(write_behind: WriteBehindQueue, history_cache: HistoryCache,
+                         user_id: str, user_message: str, response: str, agent_used: str, routed_by: str):
+    # routed_by tells the intent classifier which logged turns it may learn from
+    await write_behind.add(
+        ConversationHistory,
+        {"user_id": user_id, "role": "user", "message": user_message, "agent_used": None, "routed_by": None},
+        {"user_id": user_id, "role": "assistant", "message": response, "agent_used": agent_used,
+         "routed_by": routed_by},
+    )
+    history_cache.append(user_id, [("user", user_message), ("assistant", response)])
+
+@router.post("/api/chat")
+async def chat(message: ChatMessage, db: AsyncSession = Depends(get_async_db),
+               agents: AgentRegistry = Depends(get_agents),
+               history_cache: HistoryCache = Depends(get_history_cache),
+               write_behind: WriteBehindQueue = Depends(get_write_behind)):
+    user_profile, conversation_context = await load_chat_context(message, db, history_cache)
+
+    result = await agents.orchestrator.route_request(message.message, user_profile, conversation_context)
+
+    await save_chat_turn(write_behind, history_cache, message.user_id, message.message, result["response"],
+                         result["agent_used"], result["routed_by"])
     return result
 
+@router.post("/api/chat/stream")
+async def chat_stream(message: ChatMessage, db: AsyncSession = Depends(get_async_db),
+                      agents: AgentRegistry = Depends(get_agents),
+                      history_cache: HistoryCache = Depends(get_history_cache),
+                      write_behind: WriteBehindQueue = Depends(get_write_behind)):
+    """
+    /api/chat over SSE: "agent", then "delta" text chunks, then "done";
+    a "degraded" event with the reason precedes fallback text
+    """
+    user_profile, conversation_context = await load_chat_context(message, db, history_cache)
+
+    async def events():
+        agent_used, routed_by, parts = "CHAT", "fallback", []
+        async for event, data in agents.orchestrator.stream_request(message.message, user_profile, conversation_context):
+            if event == "agent":
+                agent_used, routed_by = data["agent_used"], data["routed_by"]
+            elif event == "degraded":
+                routed_by = "fallback"
+            elif event == "delta":
+                parts.append(data["text"])
+            yield sse_event(event, data)
+
+        await save_chat_turn(write_behind, history_cache, message.user_id, message.message, "".join(parts),
+                             agent_used, routed_by)
+        yield sse_event("done", {"agent_used": agent_used})
+
+    return sse_response(events())
+
 # ================= PRODUCT SCAN =================
-@app.post("/api/products/scan")
-async def scan_product(scan: ProductScan, db: Session = Depends(get_db)):
-    try:
-        user = db.query(User).filter(User.user_id == scan.user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+def skin_profile(user: User) -> dict:
+    return {
+        "skin_type": user.skin_type,
+        "concerns": user.concerns,
+        "allergies": user.allergies,
+        "age": user.age,
+    }
 
+async def resolve_scanned_product(scan: ProductScan, product_lookup: ProductLookup) -> dict:
+    product_data = await product_lookup.get(scan.barcode) if scan.barcode else None
+    if product_data is None:
+        # Unknown barcode: analyze what the client read off the label, if anything
+        if not scan.ingredients:
+            raise HTTPException(status_code=404, detail="Product not found")
         product_data = {
             "product_id": str(uuid.uuid4()),
             "barcode": scan.barcode,
-            "name": "Demo Moisturizer",
-            "brand": "DemoLab",
-            "ingredients": ["Water", "Niacinamide", "Ceramides"],
+            "name": scan.product_name,
+            "brand": scan.brand,
+            "ingredients": scan.ingredients,
         }
+    return product_data
 
-        user_profile = {
-            "skin_type": user.skin_type,
-            "concerns": user.concerns,
-            "allergies": user.allergies,
-            "age": user.age,
-        }
+@router.post("/api/products/scan")
+async def scan_product(scan: ProductScan, db: AsyncSession = Depends(get_async_db),
+                       agents: AgentRegistry = Depends(get_agents),
+                       product_lookup: ProductLookup = Depends(get_product_lookup)):
+    try:
+        user = await db.get(User, scan.user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        user_profile = skin_profile(user)
+
+        # Return the pooled connection while waiting on the lookup and the LLM
+        await db.close()
 
-        analysis = await analysis_agent.analyze_product(product_data, user_profile)
+        product_data = await resolve_scanned_product(scan, product_lookup)
+        analysis = await agents.analysis.analyze_product(product_data, user_profile)
         return {"product": product_data, "analysis": analysis}
 
+    except HTTPException:
+        raise
+    except LLMOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/api/products/scan/stream")
+async def scan_product_stream(scan: ProductScan, db: AsyncSession = Depends(get_async_db),
+                              agents: AgentRegistry = Depends(get_agents),
+                              product_lookup: ProductLookup = Depends(get_product_lookup)):
+    """
+    /api/products/scan over SSE: "product", one "ingredient" per
+    ingredient analysis as it completes, then "analysis"
+    """
+    user = await db.get(User, scan.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user_profile = skin_profile(user)
+    await db.close()
+
+    product_data = await resolve_scanned_product(scan, product_lookup)
+
+    async def events():
+        yield sse_event("product", product_data)
+        async for event, data in agents.analysis.stream_analysis(product_data, user_profile):
+            yield sse_event(event, data)
+
+    return sse_response(events())
+
 # ================= ROUTINE =================
-@app.post("/api/routine/generate")
-async def generate_routine(user_id: str, budget: str = "mid-range", db: Session = Depends(get_db)):
+@router.post("/api/routine/generate")
+async def generate_routine(user_id: str, budget: str = "mid-range", db: AsyncSession = Depends(get_async_db),
+                           agents: AgentRegistry = Depends(get_agents),
+                           routine_table: RoutineTable = Depends(get_routine_table)):
     try:
-        user = db.query(User).filter(User.user_id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        user_profile = {
-            "skin_type": user.skin_type,
-            "concerns": user.concerns,
-            "allergies": user.allergies,
-            "age": user.age,
-        }
+        user_profile = skin_profile(user)
+
+        # Return the pooled connection while waiting on the LLM
+        await db.close()
 
-        routine = await recommendation_agent.build_routine(user_profile, budget)
+        routine = await routine_table.get(user_profile, budget)
+        if routine is None:
+            # Rare profile: generate live
+            routine = await agents.recommendation.build_routine(user_profile, budget)
         return routine
 
+    except LLMOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/api/routine/generate/stream")
+async def generate_routine_stream(user_id: str, budget: str = "mid-range", db: AsyncSession = Depends(get_async_db),
+                                  agents: AgentRegistry = Depends(get_agents),
+                                  routine_table: RoutineTable = Depends(get_routine_table)):
+    """
+    /api/routine/generate over SSE: one "section" per routine key
+    ("morning" before "night"), then "routine" with the whole result
+    """
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user_profile = skin_profile(user)
+    await db.close()
+
+    async def events():
+        routine = await routine_table.get(user_profile, budget)
+        if routine is not None:
+            for name, value in routine.items():
+                yield sse_event("section", {"name": name, "data": value})
+            yield sse_event("routine", routine)
+            return
+        async for event, data in agents.recommendation.stream_routine(user_profile, budget):
+            yield sse_event(event, data)
+
+    return sse_response(events())
+
 # ================= FEEDBACK =================
-@app.post("/api/feedback")
-async def submit_feedback(feedback: UserFeedback, db: Session = Depends(get_db)):
+@router.post("/api/feedback")
+async def submit_feedback(feedback: UserFeedback, write_behind: WriteBehindQueue = Depends(get_write_behind)):
     try:
-        entry = FeedbackDB(
-            user_id=feedback.user_id,
-            product_id=feedback.product_id,
-            outcome=feedback.outcome,
-            rating=feedback.rating,
-            notes=feedback.notes,
-        )
-        db.add(entry)
-        db.commit()
+        await write_behind.add(FeedbackDB, {
+            "user_id": feedback.user_id,
+            "product_id": feedback.product_id,
+            "outcome": feedback.outcome,
+            "rating": feedback.rating,
+            "notes": feedback.notes,
+        })
         return {"message": "Feedback saved successfully"}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# ================= APP =================
+def create_app(database_url: str = None, static_dir: str = "static") -> FastAPI:
+    """
+    The API on its own database (DATABASE_URL by default) with its own
+    lookup, caches, write-behind queue and agents
+    """
+    app = FastAPI(
+        title="🤖 Agentic Skincare Intelligence API",
+        description="AI-powered personalized skincare analysis",
+        version="2.0.0",
+        lifespan=lifespan,
+    )
+
+    database = Database(database_url)
+    app.state.database = database
+    app.state.product_lookup = ProductLookup(bind=database.engine, async_bind=database.async_engine)
+    app.state.history_cache = HistoryCache()
+    # Chat turns and feedback are inserted in batches (WRITE_BEHIND_MODE)
+    app.state.write_behind = WriteBehindQueue(bind=database.async_engine)
+    # Routines for common profiles, pre-generated by jobs.precompute_routines
+    app.state.routine_table = RoutineTable(async_bind=database.async_engine)
+    app.state.agents = AgentRegistry(session_factory=database.AsyncSessionLocal)
+    state = app.state
+    app.state.collect_stats = stats_collector(lambda: dict(
+        state.agents.stats(),
+        product_lookup=state.product_lookup.stats(),
+        history_cache=state.history_cache.stats(),
+        write_behind=state.write_behind.stats(),
+        routine_table=state.routine_table.stats(),
+    ))
+
+    # ---------------- STATIC FILES ----------------
+    app.mount("/static", StaticFiles(directory=static_dir, check_dir=False), name="static")
+
+    @app.get("/favicon.ico", include_in_schema=False)
+    async def favicon():
+        return FileResponse(os.path.join(static_dir, "favicon.ico"))
+
+    # ---------------- CORS ----------------
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # ⚠️ restrict in production
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Outermost, so CORS and error handling are inside the timing
+    app.add_middleware(MetricsMiddleware)
+
+    # ---------------- OVERLOAD ----------------
+    @app.exception_handler(LLMOverloaded)
+    async def llm_overloaded(request, exc: LLMOverloaded):
+        # LLM calls queued past their deadline: ask the client to come back instead of timing out
+        return JSONResponse(status_code=503, content={"detail": str(exc)},
+                            headers={"Retry-After": str(max(1, round(exc.retry_after)))})
+
+    app.include_router(router)
+    return app
+
+app = create_app()
+
 # ================= LOCAL RUN =================
 if __name__ == "__main__":
     import uvicorn
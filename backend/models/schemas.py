@@ -108,6 +108,7 @@ class FeedbackResponse(BaseModel):
 # ======================
 
 class ProductScan(BaseModel):
+    user_id: str
     barcode: Optional[str] = None
     product_name: Optional[str] = None
     brand: Optional[str] = None
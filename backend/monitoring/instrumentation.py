@@ -0,0 +1,225 @@
+"""
+What the API measures: request latency per route, agent method latency,
+fallback activations and database statement timings on the hot path;
+LLM usage, parse outcomes and every component's stats() at scrape time.
+"""
+from contextlib import aclosing
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List
+import functools
+import inspect
+
+from sqlalchemy import event
+
+from .metrics import Sample, get_metrics, metric_name
+
+PREFIX = "skincare"
+
+metrics = get_metrics()
+
+HTTP_LATENCY = metrics.histogram(
+    "skincare_http_request_seconds", "HTTP request latency until the last body chunk is sent",
+    ("route", "method", "status"),
+)
+AGENT_LATENCY = metrics.histogram(
+    "skincare_agent_call_seconds", "Agent method latency (streams: until the last event)", ("agent", "method"),
+)
+FALLBACKS = metrics.counter(
+    "skincare_fallbacks_total", "Answers served by a local fallback instead of the LLM", ("agent", "method", "reason"),
+)
+DB_QUERY = metrics.histogram(
+    "skincare_db_query_seconds", "Database statement execution time", ("operation",),
+)
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def count_fallback(agent: str, method: str, reason: str = "error"):
+    FALLBACKS.inc(agent, method, reason)
+
+
+def instrumented(agent: str):
+    """
+    Decorator for agent methods: latency into AGENT_LATENCY, and results
+    (or stream events) labelled "degraded" into FALLBACKS
+    """
+    def wrap(fn):
+        method = fn.__name__
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def stream(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    async with aclosing(fn(*args, **kwargs)) as events:
+                        async for event, data in events:
+                            if event == "degraded":
+                                FALLBACKS.inc(agent, method, data["reason"])
+                            elif isinstance(data, dict) and "degraded" in data:
+                                FALLBACKS.inc(agent, method, data["degraded"])
+                            yield event, data
+                finally:
+                    AGENT_LATENCY.observe(perf_counter() - started, agent, method)
+            return stream
+
+        @functools.wraps(fn)
+        async def call(*args, **kwargs):
+            started = perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            finally:
+                AGENT_LATENCY.observe(perf_counter() - started, agent, method)
+            if isinstance(result, dict) and "degraded" in result:
+                FALLBACKS.inc(agent, method, result["degraded"])
+            return result
+        return call
+    return wrap
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request, labelled with the route
+    template (/api/users/{user_id}), not the raw path
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = perf_counter()
+        status = [500]
+
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_LATENCY.observe(perf_counter() - started, route, scope["method"], status[0])
+
+
+# ---------- database ----------
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    DB_QUERY.observe(perf_counter() - started, statement.lstrip().split(" ", 1)[0].upper())
+
+
+def _failed_execute(context):
+    stack = context.connection.info.get("query_started") if context.connection is not None else None
+    if stack:
+        stack.pop()
+
+
+def instrument_engine(engine):
+    """
+    Time every statement run on `engine` (sync or async) by its first keyword
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_execute)
+    event.listen(sync_engine, "handle_error", _failed_execute)
+    return engine
+
+
+# ---------- stats() at scrape time ----------
+
+def _numeric(value) -> bool:
+    # bools count: True / False become 1 / 0
+    return isinstance(value, (int, float))
+
+
+def stats_samples(component: str, stats: Dict) -> List[Sample]:
+    """
+    Gauges for the numeric parts of a stats() dict: scalars as
+    skincare_<component>_<key>, nested dicts as labels key / field
+    """
+    samples = []
+    for key, value in stats.items():
+        name = metric_name(PREFIX, component, key)
+        help = f"{component} stats: {key}"
+        if _numeric(value):
+            samples.append((name, "gauge", help, [({}, float(value))]))
+        elif isinstance(value, dict):
+            values = []
+            for label, inner in value.items():
+                if _numeric(inner):
+                    values.append(({"key": label}, float(inner)))
+                elif isinstance(inner, dict):
+                    values += [({"key": label, "field": field}, float(leaf))
+                               for field, leaf in inner.items() if _numeric(leaf)]
+            if values:
+                samples.append((name, "gauge", help, values))
+    return samples
+
+
+def llm_samples(stats: Dict) -> List[Sample]:
+    usage = stats.get("usage", {})
+    samples = [
+        ("skincare_llm_calls_total", "counter", "LLM calls sent upstream, per agent",
+         [({"agent": agent}, totals.get("calls", 0)) for agent, totals in usage.items()]),
+        ("skincare_llm_coalesced_total", "counter", "LLM calls answered by an identical call in flight",
+         [({"agent": agent}, totals.get("coalesced", 0)) for agent, totals in usage.items()]),
+        ("skincare_llm_tokens_total", "counter", "LLM tokens per agent and kind",
+         [({"agent": agent, "type": field.replace("_tokens", "")}, totals.get(field, 0))
+          for agent, totals in usage.items()
+          for field in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")]),
+        ("skincare_llm_cache_hit_ratio", "gauge", "Share of prompt tokens read from the prompt cache",
+         [({"agent": agent}, totals.get("cache_hit_rate", 0.0)) for agent, totals in usage.items()]),
+        ("skincare_llm_in_flight", "gauge", "Distinct LLM calls in flight", [({}, stats.get("in_flight", 0))]),
+    ]
+    circuits = stats.get("circuits", {})
+    if circuits:
+        samples.append(("skincare_llm_circuit_state", "gauge", "Circuit breaker state: 0 closed, 1 half-open, 2 open",
+                        [({"circuit": name}, CIRCUIT_STATES.get(c["state"], 0)) for name, c in circuits.items()]))
+        samples += stats_samples("llm_circuit", {
+            "error_rate": {name: c["error_rate"] for name, c in circuits.items()},
+            "p99_seconds": {name: c["p99_seconds"] for name, c in circuits.items()},
+            "rejected": {name: c["rejected"] for name, c in circuits.items()},
+        })
+    if "dispatcher" in stats:
+        samples += stats_samples("llm_dispatcher", stats["dispatcher"])
+    return samples
+
+
+def structured_output_samples(stats: Dict) -> List[Sample]:
+    by_agent = stats.get("by_agent", {})
+    return [
+        ("skincare_structured_output_replies_total", "counter",
+         "Agent JSON replies by outcome (parsed, continued, repaired, failed)",
+         [({"agent": agent, "outcome": outcome}, count)
+          for agent, outcomes in by_agent.items() for outcome, count in outcomes.items()]),
+        ("skincare_structured_output_continuations_total", "counter",
+         "Continuation calls sent to complete truncated or short replies",
+         [({"agent": agent}, count) for agent, count in stats.get("continuations", {}).items()]),
+        ("skincare_structured_output_avg_parse_us", "gauge", "Average JSON parse time",
+         [({}, stats.get("avg_parse_us", 0.0))]),
+    ]
+
+
+def stats_collector(components: Callable[[], Dict[str, Dict]]) -> Callable[[], Iterable[Sample]]:
+    """
+    Collector over {component name: stats()}; "llm" and
+    "structured_output" get their own metric names, the rest are flattened
+    """
+    def collect():
+        samples = []
+        for component, stats in components().items():
+            if component == "llm":
+                samples += llm_samples(stats)
+            elif component == "structured_output":
+                samples += structured_output_samples(stats)
+            else:
+                samples += stats_samples(component, stats)
+        return samples
+    return collect
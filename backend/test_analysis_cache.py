@@ -0,0 +1,153 @@
+"""
+AnalysisCache must key on exactly the inputs analyze_product depends on
+(ingredients, skin type, allergies), expire entries after the TTL, evict
+least recently used entries past its size, and AnalysisAgent must compose
+the product result, usage tips included, from per-ingredient analyses.
+
+    python test_analysis_cache.py
+"""
+import asyncio
+import json
+import time
+
+from agents.analysis_agent import AnalysisAgent
+from agents.analysis_cache import AnalysisCache, profile_key
+from agents.ingredient_store import normalize_ingredient
+
+PRODUCT = {"ingredients": ["Aqua", "Glycerin", "Retinol", "Glycolic Acid"]}
+PROFILE = {"skin_type": "dry", "concerns": ["dryness"], "allergies": ["Parfum"], "age": 31}
+
+
+class StubStore:
+    """
+    In-memory stand-in for IngredientStore
+    """
+
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+        self.writes = 0
+
+    async def get_many(self, ingredients, skin_type):
+        names = {normalize_ingredient(i) for i in ingredients}
+        return {n: self.entries[(n, skin_type)] for n in names if (n, skin_type) in self.entries}
+
+    async def put_many(self, analyses, skin_type):
+        for name, analysis in analyses.items():
+            self.entries[(normalize_ingredient(name), skin_type)] = analysis
+            self.writes += 1
+
+
+class StubOutput:
+    """
+    StructuredOutput returning one canned entry per requested ingredient
+    """
+
+    def __init__(self):
+        self.requested = []
+
+    async def request(self, client, request, min_items=None):
+        names = json.loads(request["messages"][0]["content"].split("Ingredients: ", 1)[1])
+        self.requested.append(names)
+        return [{"ingredient": name, "benefits": [f"{name} benefit"], "risks": ["None"], "suitability_score": 80,
+                 "usage_tips": ["Patch test first"] if name == "Retinol" else []} for name in names]
+
+
+def entry(name, score, risks=(), benefits=(), tips=None):
+    analysis = {"ingredient": name, "suitability_score": score, "risks": list(risks), "benefits": list(benefits)}
+    if tips is not None:
+        analysis["usage_tips"] = tips
+    return analysis
+
+
+def test_profile_key_fields():
+    base = profile_key(PROFILE)
+    assert profile_key(dict(PROFILE, concerns=["acne", "aging"], age=64)) == base
+    assert profile_key(dict(PROFILE, allergies=["Fragrance"])) == base  # synonym
+    assert profile_key(dict(PROFILE, skin_type="DRY")) == base
+    assert profile_key(dict(PROFILE, skin_type="oily")) != base
+    assert profile_key(dict(PROFILE, allergies=["Parfum", "Lanolin"])) != base
+
+
+def test_hits_copies_and_invalidation():
+    cache = AnalysisCache(max_entries=10, ttl_seconds=60)
+    assert cache.get(PRODUCT, PROFILE) is None
+    cache.put(PRODUCT, PROFILE, {"overall_score": 80, "warnings": []})
+
+    hit = cache.get(PRODUCT, dict(PROFILE, concerns=["acne"], age=50))
+    assert hit == {"overall_score": 80, "warnings": []}
+    hit["warnings"].append("mutated")
+    assert cache.get(PRODUCT, PROFILE)["warnings"] == []
+    assert cache.get({"ingredients": ["Water", "Glycerin", "Retinol", "Glycolic Acid"]}, PROFILE) is not None
+    assert cache.get({"ingredients": list(reversed(PRODUCT["ingredients"]))}, PROFILE) is None
+
+    cache.put(PRODUCT, dict(PROFILE, skin_type="oily"), {"overall_score": 60})
+    assert cache.invalidate(PRODUCT, PROFILE) == 1 and cache.invalidate(PRODUCT, PROFILE) == 0
+    cache.put(PRODUCT, PROFILE, {"overall_score": 80})
+    assert cache.invalidate(PRODUCT) == 2 and cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 2
+
+
+def test_ttl_and_lru():
+    cache = AnalysisCache(max_entries=2, ttl_seconds=0.05)
+    cache.put(PRODUCT, PROFILE, {"overall_score": 80})
+    time.sleep(0.1)
+    assert cache.get(PRODUCT, PROFILE) is None and cache.stats()["entries"] == 0
+
+    cache = AnalysisCache(max_entries=2, ttl_seconds=60)
+    products = [{"ingredients": [f"Extract {i}"]} for i in range(3)]
+    cache.put(products[0], PROFILE, {"n": 0})
+    cache.put(products[1], PROFILE, {"n": 1})
+    assert cache.get(products[0], PROFILE) == {"n": 0}  # now most recently used
+    cache.put(products[2], PROFILE, {"n": 2})
+    assert cache.get(products[1], PROFILE) is None
+    assert cache.get(products[0], PROFILE) == {"n": 0} and cache.get(products[2], PROFILE) == {"n": 2}
+    assert cache.stats()["evictions"] == 1 and cache.stats()["entries"] == 2
+
+
+def test_compose_analysis():
+    agent = AnalysisAgent(client=object(), cache=AnalysisCache(), ingredient_store=StubStore(), output=StubOutput())
+    known = {
+        "water": entry("Aqua", 90, benefits=["Hydration"], tips=[]),
+        "glycerin": entry("Glycerin", 90, benefits=["Hydration"]),
+        "retinol": entry("Retinol", 60, risks=["Irritation"], benefits=["Renewal"],
+                         tips=["Use at night", "Patch test first"]),
+    }
+    product = {"ingredients": PRODUCT["ingredients"] + ["Fragrance"]}
+    analysis = agent._compose_analysis(product, PROFILE, known)
+
+    # Average of the analyzed ingredients, minus the allergy penalty
+    assert analysis["overall_score"] == 80 - 30 and analysis["recommendation"] == "caution"
+    assert analysis["summary"] == "3 of 5 ingredients analyzed for dry skin"
+    assert analysis["warnings"] == ["⚠️ Contains parfum - you're allergic!", "Retinol: Irritation"]
+    assert analysis["benefits"] == ["Hydration", "Renewal"]
+    assert analysis["usage_tips"] == ["Use at night", "Patch test first"]
+    assert [e["ingredient"] for e in analysis["ingredient_analyses"]] == ["Aqua", "Glycerin", "Retinol"]
+    assert len(analysis["interactions"]) == 1 and "over-exfoliation" in analysis["interactions"][0]
+
+
+def test_analyze_only_unseen_and_cache():
+    store = StubStore({("water", "dry"): entry("Aqua", 90), ("glycerin", "dry"): entry("Glycerin", 90)})
+    output = StubOutput()
+    cache = AnalysisCache()
+    agent = AnalysisAgent(client=object(), cache=cache, ingredient_store=store, output=output)
+
+    analysis = asyncio.run(agent.analyze_product(PRODUCT, PROFILE))
+    assert output.requested == [["Retinol", "Glycolic Acid"]] and store.writes == 2
+    assert "degraded" not in analysis and analysis["usage_tips"] == ["Patch test first"]
+
+    # Same ingredients and skin type / allergies, other concerns and age: cached
+    again = asyncio.run(agent.analyze_product(PRODUCT, dict(PROFILE, concerns=["acne"], age=58)))
+    assert again == analysis and len(output.requested) == 1 and cache.stats()["hits"] == 1
+
+    # Another skin type misses the cache and the stored per-ingredient analyses
+    asyncio.run(agent.analyze_product(PRODUCT, dict(PROFILE, skin_type="oily")))
+    assert output.requested[-1] == PRODUCT["ingredients"]
+
+
+if __name__ == "__main__":
+    test_profile_key_fields()
+    test_hits_copies_and_invalidation()
+    test_ttl_and_lru()
+    test_compose_analysis()
+    test_analyze_only_unseen_and_cache()
+    print("✅ analysis cache tests passed")
@@ -0,0 +1,107 @@
+"""
+jobs.preanalyze_catalog against the fake API's batch endpoints: a run
+interrupted after submitting must resume without resubmitting, and the
+results it writes must turn interactive scans into analysis cache hits.
+
+    python test_batch_preanalysis.py
+"""
+import asyncio
+import os
+import tempfile
+import uuid
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.connection import Base, make_async_engine
+from database.models import ProductDB, User
+from loadtest.fake_anthropic import FakeAnthropicServer
+
+PRODUCTS = [
+    ["Water", "Glycerin", "Niacinamide"],
+    ["Aqua", "Squalane", "Ceramide NP"],
+    ["Water", "Salicylic Acid", "Zinc PCA"],
+]
+
+
+def make_catalog(engine):
+    with engine.begin() as conn:
+        conn.execute(ProductDB.__table__.insert(), [
+            {"product_id": f"p{i}", "barcode": str(i), "name": f"Product {i}", "brand": "BatchLab",
+             "ingredients": ingredients}
+            for i, ingredients in enumerate(PRODUCTS)
+        ])
+        conn.execute(User.__table__.insert(), [
+            {"user_id": str(uuid.uuid4()), "skin_type": skin_type, "concerns": ["dryness"], "allergies": [], "age": age}
+            for skin_type, age in [("dry", 31), ("dry", 35), ("oily", 22), ("oily", 27), ("normal", 60)]
+        ])
+
+
+def test_preanalysis_resume_and_cache_hits():
+    with tempfile.TemporaryDirectory() as workdir:
+        check_preanalysis_resume_and_cache_hits(workdir)
+
+
+def check_preanalysis_resume_and_cache_hits(workdir: str):
+    path = os.path.join(workdir, "batch.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    make_catalog(engine)
+    checkpoint = os.path.join(workdir, "preanalysis.checkpoint")
+
+    with FakeAnthropicServer(latency=0.05, batch_latency=0.3) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+        os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+        from agents.analysis_agent import AnalysisAgent
+        from agents.analysis_cache import AnalysisCache
+        from agents.ingredient_store import IngredientStore
+        from agents.llm_client import LLMClient
+        from jobs.preanalyze_catalog import CatalogPreanalysis
+
+        async def run():
+            client = LLMClient()
+            async_engine = make_async_engine(f"sqlite:///{path}")
+            Session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+            def job():
+                return CatalogPreanalysis(client, bind=engine, session_factory=Session,
+                                          checkpoint_path=checkpoint, poll_seconds=0.05)
+
+            # Interrupted run: batches submitted, nothing loaded yet
+            first = await job().run(products=10, archetypes=2, wait=False)
+            assert first.batches_submitted == 1 and first.requests_submitted == 2, first
+            assert os.path.exists(checkpoint) and len(server.batches) == 1
+
+            resumed = await job().run(products=10, archetypes=2)
+            assert resumed.batches_resumed == 1 and resumed.batches_submitted == 0, resumed
+            assert len(server.batches) == 1, "resubmitted a batch already paid for"
+            # Water / Aqua share one analysis: 7 distinct ingredients x 2 skin types
+            assert resumed.ingredients_loaded == 14 and resumed.requests_failed == 0, resumed
+            assert resumed.analyses_written == 6, resumed
+            assert not os.path.exists(checkpoint)
+
+            # Nothing left to do
+            again = await job().run(products=10, archetypes=2)
+            assert again.requests_submitted == 0 and len(server.batches) == 1, again
+
+            cache = AnalysisCache()
+            assert await cache.warm(Session) == 6
+            agent = AnalysisAgent(client, cache=cache, ingredient_store=IngredientStore(Session))
+            calls = server.calls
+            scans = [await agent.analyze_product({"ingredients": ingredients}, profile)
+                     for ingredients in PRODUCTS
+                     for profile in ({"skin_type": "dry", "concerns": ["Dryness"], "allergies": [], "age": 33},
+                                     {"skin_type": "oily", "concerns": ["dryness"], "allergies": [], "age": 25})]
+            assert cache.stats()["hits"] == 6, cache.stats()
+            assert server.calls == calls
+            assert all(scan["overall_score"] == 82 for scan in scans), scans
+            await client.close()
+            await async_engine.dispose()
+
+        asyncio.run(run())
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    test_preanalysis_resume_and_cache_hits()
+    print("✅ batch pre-analysis tests passed")
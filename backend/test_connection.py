@@ -0,0 +1,87 @@
+"""
+The database layer must map DATABASE_URL to matching sync / async drivers,
+size the Postgres pool from the environment, apply the SQLite pragmas to
+every connection (sync and async), and let readers run while a write
+transaction is open.
+
+    python test_connection.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import select, text
+
+from database import connection
+from database.connection import Database, async_url, normalize_url
+from database.models import User
+
+
+def test_urls_and_pool_options():
+    assert normalize_url("postgres://u:p@db/app") == "postgresql://u:p@db/app"
+    assert normalize_url("sqlite:///./x.db") == "sqlite:///./x.db"
+    assert async_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+    assert async_url("postgresql://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert async_url("mysql://u@db/app") == "mysql://u@db/app"
+
+    assert connection._engine_options("sqlite:///./x.db") == {}
+    saved = os.environ.get("DB_POOL_SIZE")
+    os.environ["DB_POOL_SIZE"] = "4"
+    try:
+        options = connection._engine_options("postgresql://u:p@db/app")
+    finally:
+        if saved is None:
+            del os.environ["DB_POOL_SIZE"]
+        else:
+            os.environ["DB_POOL_SIZE"] = saved
+    assert options["pool_size"] == 4 and options["pool_pre_ping"] and options["max_overflow"] == 20
+
+
+def test_sqlite_pragmas_and_concurrent_read():
+    with tempfile.TemporaryDirectory() as workdir:
+        database = Database(f"sqlite:///{os.path.join(workdir, 'app.db')}")
+        assert database.engine is not connection.engine
+        database.init_db()
+
+        with database.engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == int(connection.SQLITE_PRAGMAS["busy_timeout"])
+
+        async def read_during_write():
+            async with database.async_engine.connect() as conn:
+                assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+
+            with database.engine.connect() as writer:
+                # Uncommitted write holding SQLite's write lock
+                writer.begin()
+                writer.execute(User.__table__.insert(), {"user_id": "w1", "name": "Writer"})
+                started = time.perf_counter()
+                async with database.AsyncSessionLocal() as db:
+                    users = (await db.execute(select(User.user_id))).scalars().all()
+                elapsed = time.perf_counter() - started
+                writer.commit()
+
+            async with database.AsyncSessionLocal() as db:
+                after = (await db.execute(select(User.user_id))).scalars().all()
+            await database.dispose()
+            return users, after, elapsed
+
+        users, after, elapsed = asyncio.run(read_during_write())
+    # The reader saw the last committed state without waiting on the writer's lock
+    assert users == [] and after == ["w1"], (users, after)
+    assert elapsed < 1, elapsed
+
+
+def test_default_database_shares_module_engines():
+    database = Database()
+    assert database.url == connection.DATABASE_URL
+    assert database.engine is connection.engine and database.AsyncSessionLocal is connection.AsyncSessionLocal
+
+
+if __name__ == "__main__":
+    test_urls_and_pool_options()
+    test_sqlite_pragmas_and_concurrent_read()
+    test_default_database_shares_module_engines()
+    print("✅ connection tests passed")
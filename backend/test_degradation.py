@@ -0,0 +1,249 @@
+"""
+Latency budgets and circuit breakers: a scan over its budget must get the
+rule-based result (labelled degraded) in time while the LLM analysis still
+lands in the cache; a failing upstream must open its circuit so calls skip
+it until a half-open probe succeeds.
+
+    python test_degradation.py
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from agents.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from agents.dispatcher import LLMDispatcher
+from agents.latency_budget import DEFAULT_BUDGETS, Deadline, stream_within_budget, within_budget
+from agents.llm_client import DEFAULT_MODEL, LLMClient
+from database import models  # registers the tables
+from database.connection import Base, make_async_engine
+from loadtest.fake_anthropic import FakeAnthropicServer
+
+PROFILE = {"skin_type": "dry", "concerns": ["dryness", "redness"], "allergies": [], "age": 30}
+
+
+class ServerError(Exception):
+    status_code = 500
+
+
+def test_breaker_states():
+    breaker = CircuitBreaker("test", window=10, min_calls=4, error_rate=0.5, p99_seconds=5, cooldown=0.1)
+    for ok in (True, False, False, False):
+        try:
+            with breaker.guard():
+                if not ok:
+                    raise ServerError()
+        except ServerError:
+            pass
+    assert breaker.state == OPEN and breaker.reason == "error rate 75%", breaker.stats()
+    try:
+        with breaker.guard():
+            raise AssertionError("sent through an open circuit")
+    except CircuitOpen:
+        pass
+
+    # After the cooldown exactly one probe goes through
+    time.sleep(0.12)
+    with breaker.guard():
+        assert breaker.state == HALF_OPEN
+        try:
+            with breaker.guard():
+                raise AssertionError("second call during the probe")
+        except CircuitOpen:
+            pass
+    assert breaker.state == CLOSED and breaker.stats()["calls"] == 0
+
+    # Slow but successful calls trip it too; 4xx errors don't count as failures
+    slow = CircuitBreaker("slow", min_calls=3, p99_seconds=0.01, cooldown=10)
+    for _ in range(3):
+        with slow.guard():
+            time.sleep(0.02)
+    assert slow.state == OPEN and slow.reason.startswith("p99 latency"), slow.stats()
+    picky = CircuitBreaker("picky", min_calls=3)
+    for _ in range(5):
+        try:
+            with picky.guard():
+                raise type("BadRequest", (Exception,), {"status_code": 400})()
+        except Exception:
+            pass
+    assert picky.state == CLOSED
+
+
+def test_budget_timeouts_trip():
+    assert CircuitBreaker("default").p99_seconds < min(DEFAULT_BUDGETS.values())
+
+    async def hang(breaker):
+        with breaker.guard():
+            await asyncio.sleep(10)
+
+    async def hang_stream(breaker, first_after):
+        with breaker.guard():
+            await asyncio.sleep(first_after)
+            yield "first"
+            await asyncio.sleep(10)
+
+    async def run():
+        breaker = CircuitBreaker("hanging", min_calls=3, cooldown=10)
+        # Cancelled for other reasons (client gone): not recorded
+        task = asyncio.ensure_future(hang(breaker))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert breaker.stats()["calls"] == 0
+
+        for _ in range(3):
+            try:
+                await within_budget(hang(breaker), 0.02)
+                raise AssertionError("expected a timeout")
+            except asyncio.TimeoutError:
+                pass
+        assert breaker.state == OPEN and breaker.reason == "error rate 100%", breaker.stats()
+
+        # Streams: cut off before the first item counts, stopping after it with first_only doesn't
+        streaming = CircuitBreaker("streaming", min_calls=3, cooldown=10)
+        try:
+            async for _ in stream_within_budget(hang_stream(streaming, 10), Deadline(0.02)):
+                pass
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0.01)  # the pump task handles its cancellation
+        assert streaming.stats()["calls"] == 1 and streaming.stats()["error_rate"] == 1.0
+        streaming = CircuitBreaker("first-only", min_calls=3, cooldown=10)
+        async for _ in stream_within_budget(hang_stream(streaming, 0), Deadline(0.02), first_only=True):
+            await asyncio.sleep(0.05)
+            break
+        await asyncio.sleep(0.01)
+        assert streaming.stats()["calls"] == 0
+
+    asyncio.run(run())
+
+
+def test_fallback_routine_is_safe():
+    from agents.interactions import get_interaction_graph
+    from agents.recommendation_agent import RecommendationAgent
+
+    agent = RecommendationAgent(client=object(), output=object())
+    routine = agent._fallback_routine(dict(PROFILE, concerns=["acne", "wrinkles", "dark spots", "redness"]))
+    night = [step["recommendation"] for step in routine["night"] if step["product_type"] == "Treatment"]
+    assert night == ["Salicylic acid (BHA) serum", "Niacinamide serum"], night
+    assert get_interaction_graph().check(night).warnings == []
+
+    routine = agent._fallback_routine(dict(PROFILE, concerns=["acne", "wrinkles"], allergies=["Salicylic Acid"]))
+    assert routine["morning"][1]["recommendation"] == "Retinol serum", routine["morning"]
+    routine = agent._fallback_routine(dict(PROFILE, concerns=["wrinkles"], allergies=["retinol"]))
+    assert routine["morning"][1]["recommendation"] == "Hydrating serum"
+
+
+def routine_reply() -> str:
+    return json.dumps({"morning": [{"step": 1, "product_type": "Cleanser"}], "night": [{"step": 1}]})
+
+
+def test_circuit_skips_upstream():
+    from agents.recommendation_agent import RecommendationAgent
+
+    status = {"code": 500, "calls": 0}
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        status["calls"] += 1
+        if status["code"] != 200:
+            return httpx.Response(status["code"], json={"type": "error", "error": {"type": "api_error", "message": "down"}})
+        body = json.loads(request.content)
+        return httpx.Response(200, json={
+            "id": "msg_stub", "type": "message", "role": "assistant", "model": body["model"],
+            "content": [{"type": "text", "text": routine_reply()}], "stop_reason": "end_turn",
+            "stop_sequence": None, "usage": {"input_tokens": 5, "output_tokens": 5},
+        })
+
+    async def run():
+        client = LLMClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)),
+                           dispatcher=LLMDispatcher(max_retries=0))
+        client.client = client.client.with_options(api_key="test-key", base_url="http://stub")
+        name = f"recommendation/{DEFAULT_MODEL}"
+        client.breakers[name] = CircuitBreaker(name, min_calls=3, cooldown=0.2)
+        agent = RecommendationAgent(client)
+
+        for _ in range(3):
+            assert "error" in await agent.build_routine(PROFILE)
+        assert status["calls"] == 3 and client.stats()["circuits"][name]["state"] == OPEN
+
+        started = time.perf_counter()
+        routine = await agent.build_routine(PROFILE)
+        assert time.perf_counter() - started < 0.05
+        assert routine["degraded"] == "circuit_open" and status["calls"] == 3, routine
+        assert routine["morning"][0]["product_type"] == "Cleanser"
+        assert "Hyaluronic acid serum" in [step["recommendation"] for step in routine["night"]]
+
+        # Upstream recovers: the half-open probe closes the circuit
+        status["code"] = 200
+        await asyncio.sleep(0.25)
+        routine = await agent.build_routine(PROFILE)
+        assert "degraded" not in routine and status["calls"] == 4, routine
+        assert client.stats()["circuits"][name]["state"] == CLOSED
+        await client.close()
+
+    asyncio.run(run())
+
+
+def test_scan_budget():
+    with tempfile.TemporaryDirectory() as workdir:
+        check_scan_budget(os.path.join(workdir, "budget.db"))
+
+
+def check_scan_budget(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    with FakeAnthropicServer(latency=0.6) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+        os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+        from agents.analysis_agent import AnalysisAgent
+        from agents.analysis_cache import AnalysisCache
+        from agents.ingredient_store import IngredientStore
+
+        async def run():
+            client = LLMClient()
+            async_engine = make_async_engine(f"sqlite:///{path}")
+            Session = async_sessionmaker(async_engine, expire_on_commit=False)
+            agent = AnalysisAgent(client, cache=AnalysisCache(), ingredient_store=IngredientStore(Session))
+            agent.budget = 0.2
+            product = {"ingredients": ["Water", "Glycerin", "Alcohol Denat"]}
+
+            started = time.perf_counter()
+            analysis = await agent.analyze_product(product, PROFILE)
+            assert time.perf_counter() - started < 0.35
+            assert analysis["degraded"] == "timeout", analysis
+            assert any("alcohol" in w.lower() for w in analysis["warnings"]), analysis
+
+            # The LLM call was left running; its result is cached for the next scan
+            await asyncio.sleep(0.6)
+            analysis = await agent.analyze_product(product, PROFILE)
+            assert "degraded" not in analysis and analysis["overall_score"] == 82, analysis
+            assert server.calls == 1
+
+            # Streaming: the sections sent before the budget stay, the template fills the rest
+            from agents.recommendation_agent import RecommendationAgent
+            recommender = RecommendationAgent(client)
+            recommender.budget = 0.2
+            events = [event async for event in recommender.stream_routine(PROFILE)]
+            names = [data["name"] for event, data in events if event == "section"]
+            assert len(names) == len(set(names)) and {"morning", "night"} <= set(names), names
+            assert events[-1][0] == "routine" and events[-1][1]["degraded"] == "timeout", events[-1]
+            await client.close()
+            await async_engine.dispose()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_breaker_states()
+    test_budget_timeouts_trip()
+    test_fallback_routine_is_safe()
+    test_circuit_skips_upstream()
+    test_scan_budget()
+    print("✅ degradation tests passed")
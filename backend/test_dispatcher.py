@@ -0,0 +1,212 @@
+"""
+LLMDispatcher must admit waiting calls highest priority first, hold calls
+back when the request / token buckets run dry, retry 429s after the
+provider's retry-after while pausing every other caller, and shed calls
+that wait past their deadline, which the API turns into 503s.
+
+    python test_dispatcher.py
+"""
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+from agents.dispatcher import LLMDispatcher, LLMOverloaded
+from agents.llm_client import LLMClient
+from database.models import User
+from loadtest.fake_anthropic import BackgroundServer, FakeAnthropicServer, message_json, stream_events
+from loadtest.load_generator import scratch_app
+
+
+async def check_priority_order():
+    dispatcher = LLMDispatcher(max_concurrency=1)
+    admitted = []
+
+    async def call(priority):
+        async with dispatcher.slot(priority, 10):
+            admitted.append(priority)
+            await asyncio.sleep(0.01)
+
+    async with dispatcher.slot("background", 10):
+        # Queued lowest priority first, while the only slot is taken
+        tasks = []
+        for priority in ("background", "routine", "scan", "chat"):
+            tasks.append(asyncio.ensure_future(call(priority)))
+            await asyncio.sleep(0)
+        assert dispatcher.stats()["queued"] == {"chat": 1, "scan": 1, "routine": 1, "background": 1}
+    await asyncio.gather(*tasks)
+    assert admitted == ["chat", "scan", "routine", "background"], admitted
+    assert dispatcher.stats()["active"] == 0
+
+
+async def check_token_bucket():
+    # 10 tokens a second, at most 600 banked
+    dispatcher = LLMDispatcher(max_concurrency=8, tokens_per_minute=600)
+    started = time.perf_counter()
+    async with dispatcher.slot("scan", 600):
+        pass
+    assert time.perf_counter() - started < 0.05
+    async with dispatcher.slot("scan", 5) as slot:
+        slot.settle(5)
+    waited = time.perf_counter() - started
+    assert 0.4 < waited < 0.8, waited
+
+    # Unused estimate goes back to the bucket
+    dispatcher = LLMDispatcher(tokens_per_minute=600)
+    async with dispatcher.slot("scan", 600) as slot:
+        slot.settle(100)
+    started = time.perf_counter()
+    async with dispatcher.slot("scan", 400):
+        pass
+    assert time.perf_counter() - started < 0.05
+
+
+async def check_rate_limit_retry():
+    seen = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        text = body["messages"][0]["content"]
+        seen.append((text, time.perf_counter()))
+        if len(seen) == 1:
+            return httpx.Response(429, headers={"retry-after": "0.3"},
+                                  json={"type": "error", "error": {"type": "rate_limit_error", "message": "slow down"}})
+        return httpx.Response(200, json={
+            "id": "msg_stub", "type": "message", "role": "assistant", "model": body["model"],
+            "content": [{"type": "text", "text": text}], "stop_reason": "end_turn",
+            "stop_sequence": None, "usage": {"input_tokens": 5, "output_tokens": 5},
+        })
+
+    client = LLMClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)),
+                       dispatcher=LLMDispatcher(max_concurrency=4, backoff_base=0.01))
+    client.client = client.client.with_options(api_key="test-key", base_url="http://stub")
+    started = time.perf_counter()
+
+    async def later():
+        await asyncio.sleep(0.05)
+        return await client.create_message(agent="profile", max_tokens=10,
+                                           messages=[{"role": "user", "content": "second"}])
+
+    first, second = await asyncio.gather(
+        client.create_message(agent="analysis", max_tokens=10, messages=[{"role": "user", "content": "first"}]),
+        later(),
+    )
+    assert (first.content[0].text, second.content[0].text) == ("first", "second")
+    # The other caller was held back by the 429 as well
+    assert all(at - started >= 0.3 for text, at in seen[1:]), seen
+    stats = client.dispatcher.stats()
+    assert stats["retries"] == {"429": 1} and stats["status_errors"] == {"429": 1}, stats
+    await client.close()
+
+
+async def check_shedding():
+    dispatcher = LLMDispatcher(max_concurrency=1, deadlines={"chat": 0.1})
+    async with dispatcher.slot("scan", 10):
+        started = time.perf_counter()
+        try:
+            async with dispatcher.slot("chat", 10):
+                raise AssertionError("admitted past a taken slot")
+        except LLMOverloaded as e:
+            assert e.priority == "chat" and e.retry_after >= 1
+        assert 0.1 <= time.perf_counter() - started < 0.3
+        # Retries of admitted calls are never shed
+        async def retry_call():
+            async with dispatcher.slot("chat", 10, shed=False):
+                pass
+        retry = asyncio.ensure_future(retry_call())
+        await asyncio.sleep(0.2)
+        assert not retry.done()
+    await retry
+    assert dispatcher.stats()["shed"] == {"chat": 1}
+
+
+async def check_backoff_frees_slot():
+    attempts = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        attempts.append(body)
+        if len(attempts) % 2 == 1:
+            return httpx.Response(500, headers={"retry-after": "0.3"},
+                                  json={"type": "error", "error": {"type": "api_error", "message": "retry"}})
+        if body.get("stream"):
+            events = [event async for event in stream_events(body, "Hello there", 0, {"input_tokens": 5})]
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content="".join(events).encode())
+        return httpx.Response(200, json=message_json(body, "Hello there", {"input_tokens": 5}))
+
+    client = LLMClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)),
+                       dispatcher=LLMDispatcher(max_concurrency=1, max_retries=1), single_flight=False)
+    client.client = client.client.with_options(api_key="test-key", base_url="http://stub")
+    request = {"max_tokens": 10, "messages": [{"role": "user", "content": "Hi"}]}
+
+    async def streamed():
+        return "".join([text async for text in client.stream_text(**request)])
+
+    async def created():
+        return (await client.create_message(**request)).content[0].text
+
+    for call in (streamed, created):
+        task = asyncio.ensure_future(call())
+        await asyncio.sleep(0.15)
+        # Backing off after the 500: the only slot is free for other callers
+        assert client.dispatcher.stats()["active"] == 0, call.__name__
+        assert await task == "Hello there"
+    assert len(attempts) == 4 and client.dispatcher.stats()["retries"] == {"500": 2}
+    await client.close()
+
+
+def test_dispatcher():
+    asyncio.run(check_priority_order())
+    asyncio.run(check_token_bucket())
+    asyncio.run(check_rate_limit_retry())
+    asyncio.run(check_shedding())
+    asyncio.run(check_backoff_frees_slot())
+
+
+def test_overloaded_endpoints():
+    with FakeAnthropicServer(latency=0.5) as fake, \
+            scratch_app(fake.base_url, LLM_MAX_CONCURRENCY="1", LLM_QUEUE_DEADLINE_SCAN="0.1") as app:
+        with BackgroundServer(app) as api:
+            user_id = str(uuid.uuid4())
+            with app.state.database.SessionLocal() as db:
+                db.add(User(user_id=user_id, name="Queue Test", age=30, skin_type="dry", concerns=["dryness"],
+                            allergies=[], climate="temperate", lifestyle={}, medical_conditions=[]))
+                db.commit()
+
+            async def scans():
+                async with httpx.AsyncClient(base_url=api.base_url, timeout=30) as client:
+                    # Distinct ingredients: three upstream calls for one slot
+                    return await asyncio.gather(*[
+                        client.post("/api/products/scan", json={"user_id": user_id, "ingredients": [f"Extract {i}"]})
+                        for i in range(3)
+                    ])
+
+            responses = asyncio.run(scans())
+            statuses = sorted(r.status_code for r in responses)
+            assert statuses == [200, 503, 503], [(r.status_code, r.text) for r in responses]
+            shed = next(r for r in responses if r.status_code == 503)
+            assert int(shed.headers["retry-after"]) >= 1
+            assert "waited over" in shed.json()["detail"]
+
+            # Streaming: the status is already sent, so the stream ends with an "error" event
+            async def stream_while_busy():
+                async with httpx.AsyncClient(base_url=api.base_url, timeout=30) as client:
+                    busy = asyncio.ensure_future(
+                        client.post("/api/products/scan", json={"user_id": user_id, "ingredients": ["Extract 9"]}))
+                    await asyncio.sleep(0.1)
+                    streamed = await client.post("/api/products/scan/stream",
+                                                 json={"user_id": user_id, "ingredients": ["Extract 10"]})
+                    await busy
+                    return streamed
+
+            streamed = asyncio.run(stream_while_busy())
+            assert streamed.status_code == 200
+            assert "event: error" in streamed.text and "event: analysis" not in streamed.text, streamed.text
+
+
+if __name__ == "__main__":
+    test_dispatcher()
+    test_overloaded_endpoints()
+    print("✅ dispatcher tests passed")
@@ -0,0 +1,88 @@
+"""
+HistoryCache must return the same turns as the conversations query, stay
+in step with writes, and never keep a buffer that missed a concurrent write.
+
+    python test_history_cache.py
+"""
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.connection import Base, make_async_engine
+from database.history_cache import HistoryCache
+from database.models import ConversationHistory
+
+
+def make_database(workdir: str):
+    path = os.path.join(workdir, "history.db")
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    indexes = {i["name"] for i in inspect(sync_engine).get_indexes("conversations")}
+    assert "ix_conversations_user_id_timestamp" in indexes, indexes
+    sync_engine.dispose()
+    return make_async_engine(f"sqlite:///{path}")
+
+
+async def write(Session, cache, user_id, turns):
+    async with Session() as db:
+        db.add_all([ConversationHistory(user_id=user_id, role=role, message=text) for role, text in turns])
+        await db.commit()
+    cache.append(user_id, turns)
+
+
+async def check_fill_and_append(workdir: str):
+    engine = make_database(workdir)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    cache = HistoryCache(turns=4)
+    await write(Session, cache, "u1", [("user", f"m{i}") for i in range(6)])
+
+    async with Session() as db:
+        first = await cache.recent(db, "u1")
+    assert [t["content"] for t in first] == ["m2", "m3", "m4", "m5"], first
+
+    await write(Session, cache, "u1", [("user", "m6"), ("assistant", "m7")])
+    async with Session() as db:
+        second = await cache.recent(db, "u1")
+    await engine.dispose()
+    assert [t["content"] for t in second] == ["m4", "m5", "m6", "m7"], second
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+async def check_write_during_load(workdir: str):
+    engine = make_database(workdir)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    cache = HistoryCache(turns=4)
+
+    class SlowSession:
+        # Lets a write land between the load starting and its result arriving
+        def __init__(self, db):
+            self.db = db
+
+        async def execute(self, statement):
+            result = await self.db.execute(statement)
+            cache.append("u2", [("user", "late")])
+            return result
+
+    async with Session() as db:
+        await cache.recent(SlowSession(db), "u2")
+    await engine.dispose()
+    assert cache.stats()["users"] == 0, "stale buffer kept"
+
+
+def test_fill_and_append():
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(check_fill_and_append(workdir))
+
+
+def test_write_during_load():
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(check_write_during_load(workdir))
+
+
+if __name__ == "__main__":
+    test_fill_and_append()
+    test_write_during_load()
+    print("✅ history cache tests passed")
@@ -0,0 +1,101 @@
+"""
+Catalog importer: ingredient cleaning must keep distinct INCI entries,
+batches must dedupe by barcode, and an interrupted import must resume
+from its checkpoint without losing or repeating rows.
+
+    python test_importer.py
+"""
+import json
+import os
+import tempfile
+
+from sqlalchemy import create_engine, select
+
+from database.connection import Base
+from database.importer import ImportStats, batches, clean_ingredients, import_catalog, normalize_record
+from database.models import ProductDB
+
+
+def make_engine(workdir: str):
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'catalog.db')}")
+    Base.metadata.create_all(bind=engine, tables=[ProductDB.__table__])
+    return engine
+
+
+def write_jsonl(path: str, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(record if isinstance(record, str) else json.dumps(record))
+            f.write("\n")
+
+
+def test_clean_ingredients():
+    raw = ("Aqua, Ceramide NP, Ceramide AP, Ceramide EOP, Tocopherol, Tocopheryl Acetate, "
+           "Palmitoyl Tetrapeptide-7, ceramide  np, Water, Extract (Leaf, Root)")
+    cleaned = clean_ingredients(raw)
+    assert cleaned == ["Aqua", "Ceramide NP", "Ceramide AP", "Ceramide EOP", "Tocopherol", "Tocopheryl Acetate",
+                       "Palmitoyl Tetrapeptide-7", "Water", "Extract (Leaf, Root)"], cleaned
+    assert clean_ingredients(["  Glycerin ", "GLYCERIN", "", None]) == ["Glycerin", "None"]
+    assert clean_ingredients(None) == [] and clean_ingredients("") == []
+
+    row = normalize_record({"barcode": " 123 ", "ingredients": ["Aqua", "Water", "Kiwi Seed Oil"], "price": "x"})
+    assert row["barcode"] == "123" and row["price"] is None
+    assert row["ingredients"] == ["Aqua", "Water", "Kiwi Seed Oil"]
+    assert row["canonical_ingredients"] == ["water", "water", "kiwi seed oil"]
+    assert normalize_record({"barcode": "  "}) is None
+
+
+def test_batches_dedupe_by_barcode():
+    records = [{"barcode": str(i % 4), "name": f"v{i}"} for i in range(6)] + [{"name": "no barcode"}]
+    stats = ImportStats()
+    out = list(batches(records, size=3, stats=stats))
+    assert [[row["barcode"] for row in batch] for batch in out] == [["0", "1", "2"], ["3", "0", "1"]]
+    # Last one wins within a batch
+    out = list(batches([{"barcode": "1", "name": "old"}, {"barcode": "1", "name": "new"}], 10, ImportStats()))
+    assert [row["name"] for row in out[0]] == ["new"]
+    assert stats.rows_read == 7 and stats.skipped == 1 and stats.duplicates == 0
+
+
+def test_import_and_resume():
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = make_engine(workdir)
+        path = os.path.join(workdir, "catalog.jsonl")
+        records = [{"barcode": f"{i:05d}", "name": f"Cream {i}", "ingredients": "Aqua, Ceramide NP, Ceramide AP"}
+                   for i in range(10)]
+        # Unreadable row 7: the import stops after the batches before it
+        write_jsonl(path, [json.dumps(r) if i != 7 else "{broken" for i, r in enumerate(records)])
+        try:
+            import_catalog(path, batch_size=3, bind=engine)
+            raise AssertionError("expected a parse error")
+        except json.JSONDecodeError:
+            pass
+        with open(f"{path}.checkpoint") as f:
+            assert json.load(f)["rows_done"] == 6
+        with engine.connect() as conn:
+            assert conn.execute(select(ProductDB.barcode)).scalars().all() == [f"{i:05d}" for i in range(6)]
+
+        write_jsonl(path, records)
+        stats = import_catalog(path, batch_size=3, bind=engine)
+        assert stats.rows_read == 4 and stats.imported == 4
+        assert not os.path.exists(f"{path}.checkpoint")
+        with engine.connect() as conn:
+            rows = conn.execute(select(ProductDB.barcode, ProductDB.ingredients, ProductDB.canonical_ingredients)).all()
+        assert sorted(row.barcode for row in rows) == [f"{i:05d}" for i in range(10)]
+        assert rows[0].ingredients == ["Aqua", "Ceramide NP", "Ceramide AP"]
+        assert rows[0].canonical_ingredients == ["water", "ceramide np", "ceramide ap"]
+
+        # Re-import without resume upserts in place
+        records[0]["name"] = "Renamed"
+        write_jsonl(path, records)
+        assert import_catalog(path, batch_size=4, resume=False, bind=engine).imported == 10
+        with engine.connect() as conn:
+            assert conn.execute(select(ProductDB.name).where(ProductDB.barcode == "00000")).scalar() == "Renamed"
+            assert len(conn.execute(select(ProductDB.barcode)).all()) == 10
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_clean_ingredients()
+    test_batches_dedupe_by_barcode()
+    test_import_and_resume()
+    print("✅ importer tests passed")
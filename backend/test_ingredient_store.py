@@ -0,0 +1,102 @@
+"""
+IngredientStore must keep at most max_entries analyses in memory, evicting
+the least recently used, and still serve evicted ones from the database.
+
+    python test_ingredient_store.py
+"""
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from agents.ingredient_store import IngredientStore
+from database.connection import Base, make_async_engine
+
+
+def make_session_factory(workdir: str):
+    path = os.path.join(workdir, "ingredients.db")
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+    return async_sessionmaker(make_async_engine(f"sqlite:///{path}"), expire_on_commit=False)
+
+
+class CountingStore(IngredientStore):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loaded = []
+
+    async def _load(self, names, skin_type):
+        self.loaded.extend(sorted(names))
+        return await super()._load(names, skin_type)
+
+
+async def check_lru(Session):
+    store = CountingStore(Session, max_entries=3)
+    await store.put_many({f"Extract {i}": {"ingredient": f"Extract {i}", "score": i} for i in range(3)}, "Dry")
+    assert store.stats()["entries_in_memory"] == 3
+
+    # Reading Extract 0 makes it most recently used, so Extract 1 is evicted next
+    assert await store.get_many(["Extract 0"], "dry") == {"extract 0": {"ingredient": "Extract 0", "score": 0}}
+    await store.put_many({"Aqua": {"ingredient": "Aqua", "score": 90}}, "dry")
+    assert set(key[0] for key in store._memory) == {"extract 0", "extract 2", "water"}
+    assert store.stats()["evictions"] == 1 and store.loaded == []
+
+    # Evicted entries come back from the database, and stay within the bound
+    found = await store.get_many(["Extract 1", "Water", "Unknown Oil"], "dry")
+    assert set(found) == {"extract 1", "water"} and store.loaded == ["extract 1", "unknown oil"]
+    assert store.stats()["entries_in_memory"] == 3 and store.stats()["evictions"] == 2
+    assert store.stats()["hits"] == 3 and store.stats()["misses"] == 1
+
+    # Many distinct ingredients never grow memory past the bound
+    await store.put_many({f"Peptide {i}": {"ingredient": f"Peptide {i}"} for i in range(500)}, "oily")
+    assert len(store._memory) == 3
+
+
+class RecordingSession:
+    """
+    Async session stand-in on a given dialect that keeps what it executes
+    """
+
+    def __init__(self, dialect: str):
+        self.bind = SimpleNamespace(dialect=SimpleNamespace(name=dialect))
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def get_bind(self):
+        return self.bind
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+
+    async def commit(self):
+        pass
+
+
+def test_upsert_matches_session_dialect():
+    # The module engine is SQLite here; the statement must follow the session's database
+    for dialect, insert in (("postgresql", postgresql.Insert), ("sqlite", sqlite.Insert)):
+        session = RecordingSession(dialect)
+        store = IngredientStore(lambda: session)
+        asyncio.run(store.put_many({"Squalane": {"ingredient": "Squalane"}}, "dry"))
+        assert [type(s) for s in session.statements] == [insert], session.statements
+
+
+def test_memory_is_bounded():
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(check_lru(make_session_factory(workdir)))
+
+
+if __name__ == "__main__":
+    test_memory_is_bounded()
+    test_upsert_matches_session_dialect()
+    print("✅ ingredient store tests passed")
@@ -0,0 +1,178 @@
+"""
+IntentClassifier must route clear messages locally (no routing LLM call),
+leave ambiguous ones to the LLM, and learn from logged conversations.
+
+    python test_intent_classifier.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from agents.intent_classifier import IntentClassifier
+from agents.orchestrator import OrchestratorAgent
+from database.connection import Base, add_missing_columns, make_async_engine
+from database.models import ConversationHistory
+
+
+class CountingClient:
+    """
+    Stand-in LLMClient: records calls, answers routing with CHAT
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    async def create_message(self, **kwargs):
+        content = "".join(block["text"] for block in kwargs["messages"][-1]["content"])
+        self.calls.append(content)
+        text = '{"agent": "CHAT", "confidence": 0.9}' if "Route this request." in content else "Hello!"
+        return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+
+def test_rules_and_threshold():
+    classifier = IntentClassifier(threshold=0.8)
+    assert classifier.classify("Can you recommend a toner?")[:1] == ("RECOMMENDATION",)
+    assert classifier.classify("I have oily skin")[0] == "PROFILE"
+    assert classifier.route("Hi!")["agent"] == "CHAT"
+    # Matches rules for two agents and nothing the seed model is sure about
+    assert classifier.route("recommend something with ingredients like my old one") is None
+    assert IntentClassifier(threshold=1.01).route("Hi!") is None
+    stats = classifier.stats()
+    assert stats["local_routes"] == 1 and stats["llm_routes"] == 1, stats
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        classifier.classify("tell me about peptides in moisturizers")
+    per_call = (time.perf_counter() - started) / 1000
+    print(f"classify: {per_call * 1e6:.0f} µs per message")
+    assert per_call < 0.005
+
+
+def test_rule_hits_are_not_certain():
+    classifier = IntentClassifier(threshold=0.8)
+    # A keyword hit still has to clear the threshold
+    assert classifier.classify("Can you recommend a toner?")[2] == "rules"
+    assert IntentClassifier(threshold=0.99).route("Can you recommend a toner?") is None
+
+    # Describing yourself doesn't make a request a profile update
+    assert classifier.route("I have dry skin, what moisturizer should I buy?")["agent"] == "RECOMMENDATION"
+    assert classifier.classify("I have dry skin, what moisturizer would be good?")[2] == "model"
+    assert classifier.route("My skin is dry, can you recommend a cleanser") is None
+    assert classifier.route("I'm allergic to fragrance")["action"] == "analyze_description"
+
+    # Short words only decide short messages
+    assert classifier.classify("Hi, my moisturizer stings after a week, why?")[2] == "model"
+    assert classifier.classify("Can I mix retinol and vitamin C?")[0] == "ANALYSIS"
+    assert classifier.classify("My favorite trail mix has nuts in it")[2] == "model"
+
+
+def test_orchestrator_skips_routing_call():
+    client = CountingClient()
+    orchestrator = OrchestratorAgent(client, profile_agent=object(), analysis_agent=object(),
+                                     recommendation_agent=object(), intent_classifier=IntentClassifier(threshold=0.8))
+    result = asyncio.run(orchestrator.route_request("hello!", {"skin_type": "dry"}, []))
+    assert result["agent_used"] == "CHAT" and result["response"] == "Hello!"
+    assert not any("Route this request." in c for c in client.calls), client.calls
+
+    asyncio.run(orchestrator.route_request("recommend something with ingredients like my old one", {}, []))
+    assert any("Route this request." in c for c in client.calls)
+
+
+def make_async_database(path: str):
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+    return make_async_engine(f"sqlite:///{path}")
+
+
+async def check_train_from_history(path: str):
+    async_engine = make_async_database(path)
+    Session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    logged = [("my pores look huge lately", "PROFILE", "llm"), ("pores keep getting bigger", "PROFILE", "llm"),
+              ("pores seem enormous on my nose", "PROFILE", "llm")] * 5
+    # The classifier's own routes and outage fallbacks are not labels
+    logged += [("my pores look huge lately", "CHAT", "fallback"), ("pores on my nose", "CHAT", "local"),
+               ("pores keep getting bigger", "CHAT", None)] * 10
+    async with Session() as db:
+        for n, (text, agent, routed_by) in enumerate(logged):
+            db.add(ConversationHistory(id=2 * n + 1, user_id="u", role="user", message=text))
+            db.add(ConversationHistory(id=2 * n + 2, user_id="u", role="assistant", message="ok", agent_used=agent,
+                                       routed_by=routed_by))
+        await db.commit()
+
+    classifier = IntentClassifier(threshold=0.8)
+    before = classifier.model.predict("why are my pores so big")
+    trained = await classifier.train_from_history(Session)
+    after = classifier.model.predict("why are my pores so big")
+    await async_engine.dispose()
+    assert trained == 15, trained
+    assert after[0] == "PROFILE" and after[1] > before[1], (before, after)
+
+
+def test_train_from_history():
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(check_train_from_history(os.path.join(workdir, "intents.db")))
+
+
+def test_orchestrator_labels_routes():
+    client = CountingClient()
+    orchestrator = OrchestratorAgent(client, profile_agent=object(), analysis_agent=object(),
+                                     recommendation_agent=object(), intent_classifier=IntentClassifier(threshold=0.8))
+    assert asyncio.run(orchestrator.route_request("hello!", {}, []))["routed_by"] == "local"
+    ambiguous = "recommend something with ingredients like my old one"
+    assert asyncio.run(orchestrator.route_request(ambiguous, {}, []))["routed_by"] == "llm"
+
+    async def failing(*args):
+        raise RuntimeError("down")
+
+    orchestrator._llm_route = failing
+    result = asyncio.run(orchestrator.route_request(ambiguous, {}, []))
+    assert result["degraded"] == "error" and result["routed_by"] == "fallback", result
+
+
+def test_training_builds_no_agents():
+    from agents.registry import AgentRegistry
+
+    async def train(path):
+        async_engine = make_async_database(path)
+        registry = AgentRegistry(client=CountingClient(), session_factory=async_sessionmaker(async_engine))
+        trained = await registry.train_intent_classifier()
+        await async_engine.dispose()
+        return registry, trained
+
+    with tempfile.TemporaryDirectory() as workdir:
+        registry, trained = asyncio.run(train(os.path.join(workdir, "empty.db")))
+    assert trained == 0
+    assert registry._agents == {}
+    assert registry.orchestrator.intent_classifier is registry.intent_classifier
+
+
+def test_label_column_added_to_old_tables():
+    with tempfile.TemporaryDirectory() as workdir:
+        sync_engine = create_engine(f"sqlite:///{os.path.join(workdir, 'old.db')}")
+        with sync_engine.begin() as conn:
+            conn.execute(text("CREATE TABLE conversations (id INTEGER PRIMARY KEY, user_id VARCHAR, role VARCHAR, "
+                              "message TEXT, agent_used VARCHAR, timestamp DATETIME)"))
+        Base.metadata.create_all(bind=sync_engine)
+        add_missing_columns(sync_engine)
+        add_missing_columns(sync_engine)
+        columns = {column["name"] for column in inspect(sync_engine).get_columns("conversations")}
+        sync_engine.dispose()
+    assert "routed_by" in columns
+
+
+if __name__ == "__main__":
+    test_rules_and_threshold()
+    test_rule_hits_are_not_certain()
+    test_orchestrator_skips_routing_call()
+    test_train_from_history()
+    test_orchestrator_labels_routes()
+    test_training_builds_no_agents()
+    test_label_column_added_to_old_tables()
+    print("✅ intent classifier tests passed")
@@ -0,0 +1,99 @@
+"""
+InteractionGraph must find every conflicting ingredient-class pair in one
+pass, and check_ingredient_interactions must only ask the LLM when some
+ingredient cannot be classified, keeping the local warnings if it fails.
+
+    python test_interactions.py
+"""
+import asyncio
+import time
+
+from agents.analysis_agent import AnalysisAgent
+from agents.analysis_cache import AnalysisCache
+from agents.dispatcher import LLMOverloaded
+from agents.interactions import InteractionGraph
+
+
+class StubOutput:
+    def __init__(self, reply=None, error=None):
+        self.reply = reply or []
+        self.error = error
+        self.calls = 0
+
+    async def request(self, client, request, min_items=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.reply
+
+
+def make_agent(output):
+    return AnalysisAgent(client=object(), cache=AnalysisCache(), ingredient_store=object(), output=output)
+
+
+def test_conflicting_classes():
+    graph = InteractionGraph()
+    result = graph.check(["Water", "Retinol", "Glycolic Acid", "Salicylic Acid", "Benzoyl Peroxide"])
+    assert len(result.warnings) == 3, result.warnings
+    assert "Retinol + Glycolic Acid: over-exfoliation" in result.warnings, result.warnings
+    assert any(w.endswith("deactivation") for w in result.warnings)
+    assert result.classes["retinoid"] == ["Retinol"] and result.unclassified == []
+
+    # Synonyms and INCI spellings classify; each pair is reported once however many members it has
+    result = graph.check(["L-Ascorbic Acid", "Nicotinamide", "Vitamin B3", "Lactic Acid"])
+    assert sorted(w.rsplit(": ", 1)[1] for w in result.warnings) == ["over-exfoliation",
+                                                                    "reduced efficacy at wrong pH"]
+    assert result.classes["niacinamide"] == ["Nicotinamide", "Vitamin B3"]
+
+    assert graph.check(["Water", "Glycerin", "Squalane"]).warnings == []
+    assert graph.check([]).warnings == [] and graph.classify("Granactive Retinoid") == {"retinoid"}
+    assert graph.check(["Mystery Complex", "Retinol"]).unclassified == ["Mystery Complex"]
+
+
+def test_check_speed():
+    graph = InteractionGraph()
+    routine = ["Water", "Glycerin", "Niacinamide", "Retinol", "Ascorbic Acid", "Squalane", "Dimethicone",
+               "Panthenol", "Salicylic Acid", "Phenoxyethanol", "Tocopherol", "Ceramide NP"] * 3
+    graph.check(routine)
+    start = time.perf_counter()
+    for _ in range(200):
+        graph.check(routine)
+    per_check_ms = (time.perf_counter() - start) / 200 * 1000
+    print(f"interaction check: {per_check_ms:.3f} ms for {len(routine)} ingredients")
+    assert per_check_ms < 1, per_check_ms
+
+
+def test_llm_only_for_unclassified():
+    output = StubOutput(reply=["Mystery Complex + Retinol: irritation"])
+    agent = make_agent(output)
+
+    classified = ["Water", "Retinol", "Glycolic Acid"]
+    warnings = asyncio.run(agent.check_ingredient_interactions(classified))
+    assert output.calls == 0 and warnings == ["Retinol + Glycolic Acid: over-exfoliation"]
+
+    warnings = asyncio.run(agent.check_ingredient_interactions(classified + ["Mystery Complex"]))
+    assert output.calls == 1
+    assert warnings == ["Retinol + Glycolic Acid: over-exfoliation", "Mystery Complex + Retinol: irritation"]
+
+
+def test_llm_failures():
+    # Errors fall back to the local warnings; overload is left to the API to turn into a 503
+    agent = make_agent(StubOutput(error=RuntimeError("bad json")))
+    ingredients = ["Retinol", "Benzoyl Peroxide", "Mystery Complex"]
+    assert asyncio.run(agent.check_ingredient_interactions(ingredients)) == [
+        "Retinol + Benzoyl Peroxide: deactivation"]
+
+    agent = make_agent(StubOutput(error=LLMOverloaded("analysis", 1.0, retry_after=2.0)))
+    try:
+        asyncio.run(agent.check_ingredient_interactions(ingredients))
+        raise AssertionError("expected LLMOverloaded")
+    except LLMOverloaded:
+        pass
+
+
+if __name__ == "__main__":
+    test_conflicting_classes()
+    test_check_speed()
+    test_llm_only_for_unclassified()
+    test_llm_failures()
+    print("✅ interaction tests passed")
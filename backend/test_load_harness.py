@@ -0,0 +1,91 @@
+"""
+Load-testing harness: the fake Anthropic backend must follow its latency
+distribution, token rate and error-injection settings, and the load
+generator must drive all four endpoints, report RPS / percentiles / error
+rates and flag regressions against a baseline.
+
+    python test_load_harness.py
+"""
+import asyncio
+import random
+import statistics
+
+import httpx
+
+from loadtest.fake_anthropic import CHUNK_CHARS, FakeAnthropicServer, create_app, latency_distribution, parse_errors
+from loadtest.load_generator import Workload, compare, drive, local_stack, parse_mix, percentile
+
+
+def test_latency_distributions():
+    rng = random.Random(3)
+    assert latency_distribution(0.5, rng)() == 0.5 and latency_distribution("fixed:0.25", rng)() == 0.25
+    uniform = [latency_distribution("uniform:0.5,2", rng)() for _ in range(2000)]
+    assert 0.5 <= min(uniform) and max(uniform) <= 2
+    lognormal = [latency_distribution("lognormal:1.2,0.5", rng)() for _ in range(5000)]
+    assert abs(statistics.median(lognormal) - 1.2) < 0.1
+    # Long right tail: p99 well above the median
+    assert percentile(lognormal, 0.99) > 2.5
+    exponential = [latency_distribution("exponential:0.3", rng)() for _ in range(5000)]
+    assert abs(statistics.mean(exponential) - 0.3) < 0.03
+
+    assert parse_errors("429=0.02,529=0.01") == {429: 0.02, 529: 0.01} and parse_errors("") == {}
+    assert create_app(tokens_per_second=40).state.chunk_delay == CHUNK_CHARS / 4 / 40
+    assert parse_mix("chat=3,scan=1") == {"chat": 0.75, "scan": 0.25}
+
+
+def test_error_injection():
+    body = {"model": "claude-sonnet-4-20250514", "max_tokens": 100,
+            "messages": [{"role": "user", "content": "hello"}]}
+    with FakeAnthropicServer(latency=0, errors={429: 0.2, 529: 0.1, 500: 0.1}, seed=7) as server:
+        with httpx.Client(base_url=server.base_url) as client:
+            responses = [client.post("/v1/messages", json=body) for _ in range(500)]
+
+    statuses = [r.status_code for r in responses]
+    assert 70 <= statuses.count(429) <= 130 and 25 <= statuses.count(529) <= 75, server.injected
+    assert 25 <= statuses.count(500) <= 75 and statuses.count(200) > 200
+    assert server.injected[429] == statuses.count(429) and server.calls == 500
+    limited = next(r for r in responses if r.status_code == 429)
+    assert limited.json()["error"]["type"] == "rate_limit_error" and limited.headers["retry-after"] == "1"
+    assert next(r for r in responses if r.status_code == 529).json()["error"]["type"] == "overloaded_error"
+
+
+def test_compare():
+    row = {"requests": 100, "rps": 10.0, "p50_ms": 100, "p95_ms": 200, "p99_ms": 300, "error_rate": 0.0}
+    baseline = {"endpoints": {"chat": row, "scan": row}, "total": row}
+    same = {"endpoints": {"chat": dict(row), "scan": dict(row)}, "total": dict(row)}
+    assert compare(same, baseline) == []
+
+    slower = {**row, "p99_ms": 400}
+    failing = {**row, "error_rate": 0.05}
+    report = {"endpoints": {"chat": slower, "scan": failing}, "total": {**row, "rps": 7.0}}
+    regressions = compare(report, baseline, tolerance=0.2)
+    assert any(r.startswith("chat: p99_ms") for r in regressions), regressions
+    assert any(r.startswith("scan: error rate") for r in regressions), regressions
+    assert any(r.startswith("total: rps") for r in regressions), regressions
+    assert compare({"endpoints": {}, "total": row}, baseline) == ["chat: no requests in this run",
+                                                                  "scan: no requests in this run"]
+
+
+def test_mixed_run():
+    with FakeAnthropicServer(latency="uniform:0.02,0.1", tokens_per_second=2000, seed=11) as fake:
+        with local_stack(fake, n_users=10, n_products=20, seed_value=11) as (base_url, fixtures):
+            workload = Workload(seed=11, **fixtures)
+            report = asyncio.run(drive(base_url, workload, duration=3, concurrency=8, rps=None, timeout=30))
+
+    print({name: (row["requests"], round(row["p95_ms"])) for name, row in report["endpoints"].items()})
+    assert set(report["endpoints"]) == {"chat", "scan", "routine", "feedback"}, report["endpoints"]
+    for name, row in report["endpoints"].items():
+        assert row["requests"] > 0 and row["rps"] > 0, (name, row)
+        assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"], (name, row)
+        assert row["error_rate"] == 0, (name, row["errors"])
+    total = report["total"]
+    assert total["requests"] == sum(row["requests"] for row in report["endpoints"].values())
+    assert fake.calls > 0
+
+
+if __name__ == "__main__":
+    test_latency_distributions()
+    test_error_injection()
+    test_compare()
+    test_mixed_run()
+    print("✅ load harness tests passed")
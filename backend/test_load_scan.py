@@ -0,0 +1,62 @@
+"""
+Load test: N concurrent product scans against a fake Anthropic backend
+should finish in roughly one LLM latency, not N.
+
+    python test_load_scan.py
+"""
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from database.models import ProductDB, User
+from loadtest.fake_anthropic import FakeAnthropicServer
+from loadtest.load_generator import scratch_app
+
+LLM_LATENCY = 1.0
+CONCURRENT_SCANS = 20
+
+
+async def run_scans(app, user_id: str, n: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/api/products/scan", json={"barcode": str(i), "user_id": user_id})
+            for i in range(n)
+        ])
+        elapsed = time.perf_counter() - start
+
+    for response in responses:
+        assert response.status_code == 200, response.text
+        assert response.json()["analysis"]["overall_score"] == 82
+    return elapsed
+
+
+def test_concurrent_scans_overlap():
+    with FakeAnthropicServer(latency=LLM_LATENCY) as server:
+        with scratch_app(server.base_url) as app:
+            user_id = str(uuid.uuid4())
+            with app.state.database.SessionLocal() as db:
+                db.add(User(user_id=user_id, name="Load Test", age=30, skin_type="dry",
+                            concerns=["dryness"], allergies=[], climate="temperate",
+                            lifestyle={}, medical_conditions=[]))
+                for i in range(CONCURRENT_SCANS):
+                    db.add(ProductDB(product_id=str(uuid.uuid4()), barcode=str(i), name=f"Cream {i}",
+                                     brand="LoadLab", ingredients=["Water", "Glycerin", f"Botanical Extract {i}"]))
+                db.commit()
+
+            elapsed = asyncio.run(run_scans(app, user_id, CONCURRENT_SCANS))
+
+        print(f"✅ {CONCURRENT_SCANS} scans in {elapsed:.2f}s "
+              f"(LLM latency {LLM_LATENCY:.2f}s, {server.calls} upstream calls)")
+        # Every product has its own ingredient, so each scan makes its own upstream call
+        # and serialized calls would take CONCURRENT_SCANS * LLM_LATENCY
+        assert server.calls == CONCURRENT_SCANS, server.calls
+        assert elapsed < LLM_LATENCY * 3
+
+
+if __name__ == "__main__":
+    test_concurrent_scans_overlap()
@@ -0,0 +1,72 @@
+"""
+Hot-path microbenchmarks: every case must run on its fixtures, the stored
+baseline must cover the suite at the same fixture sizes, and the
+comparison must flag a case only when it is slower beyond the tolerance.
+
+    python test_microbenchmarks.py
+"""
+import json
+import os
+
+from agents.ingredient_store import normalize_ingredient
+from benchmarks.bench_hot_paths import (BASELINE_PATH, HISTORY_ROWS, INGREDIENT_COUNT, Fixtures, cases, combine,
+                                        compare, run)
+from database.models import ConversationHistory
+
+
+def test_cases_run_on_realistic_fixtures():
+    with Fixtures() as fixtures:
+        suite = cases(fixtures)
+        for name, fn in suite.items():
+            fn()
+
+        names = {normalize_ingredient(name) for name in fixtures.product["ingredients"]}
+        assert len(fixtures.product["ingredients"]) == INGREDIENT_COUNT and set(fixtures.known) == names
+        assert len(fixtures.profile["allergies"]) >= 10 and len(fixtures.profile["concerns"]) >= 10
+        fallback = suite["fallback_analysis"]()
+        assert 0 <= fallback["overall_score"] <= 100
+        composed = suite["compose_analysis"]()
+        assert any("allergic" in warning for warning in composed["warnings"]), composed["warnings"]
+        assert len(composed["ingredient_analyses"]) == len(names)
+        with fixtures.Session() as db:
+            assert db.query(ConversationHistory).count() == HISTORY_ROWS
+        workdir = fixtures._workdir.name
+    assert not os.path.exists(workdir)
+
+
+def test_baseline_matches_suite():
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    with Fixtures() as fixtures:
+        assert set(baseline["cases"]) == set(cases(fixtures)), "re-record with --save after adding or removing a case"
+    assert baseline["fixtures"]["ingredients"] == INGREDIENT_COUNT
+    assert baseline["fixtures"]["history_rows"] == HISTORY_ROWS
+
+
+def test_compare():
+    baseline = {"cases": {"fast": {"us": 10, "relative": 0.1}, "slow": {"us": 100, "relative": 1.0}}}
+    report = {"calibration_us": 100, "cases": {"fast": {"us": 12, "relative": 0.12},
+                                               "slow": {"us": 200, "relative": 2.0},
+                                               "new": {"us": 5, "relative": 0.05}}}
+    regressions = compare(report, baseline, tolerance=0.5)
+    assert list(regressions) == ["slow"] and abs(regressions["slow"] - 1.0) < 1e-9
+
+    # Retried measurements keep each case's best run
+    retry = {"calibration_us": 90, "cases": {"slow": {"us": 110, "relative": 1.1}}}
+    combined = combine([report, retry])
+    assert combined["cases"]["slow"]["us"] == 110 and combined["cases"]["fast"]["us"] == 12
+    assert combined["calibration_us"] == 90 and compare(combined, baseline, tolerance=0.5) == {}
+
+
+def test_quick_run():
+    report = run(repeat=2, seconds=0.005, only=["profile_dicts", "parse_routine_reply"])
+    assert set(report["cases"]) == {"profile_dicts", "parse_routine_reply"}
+    assert all(result["us"] > 0 and result["relative"] > 0 for result in report["cases"].values())
+
+
+if __name__ == "__main__":
+    test_cases_run_on_realistic_fixtures()
+    test_baseline_matches_suite()
+    test_compare()
+    test_quick_run()
+    print("✅ microbenchmark tests passed")
@@ -0,0 +1,83 @@
+"""
+IngredientNormalizer must map true synonyms to one canonical ID, keep
+distinct INCI ingredients apart, and give unknown names stable IDs without
+growing its tables.
+
+    python test_normalizer.py
+"""
+from agents.interactions import InteractionGraph
+from agents.normalizer import IngredientNormalizer
+from agents.scoring_engine import ScoringEngine
+
+
+def test_synonyms_share_an_id():
+    normalizer = IngredientNormalizer()
+    assert normalizer.canonical("Aqua") == normalizer.canonical("Water") == "water"
+    assert normalizer.id_for("Parfum (Fragrance)") == normalizer.id_for("fragrance")
+    assert normalizer.canonical("Butyrospermum Parkii (Shea) Butter") == "shea butter"
+    assert normalizer.canonical("Vitamin E") == "tocopherol"
+    assert normalizer.canonical("Matrixyl") == "palmitoyl pentapeptide-4"
+
+
+def test_distinct_inci_entries_stay_apart():
+    normalizer = IngredientNormalizer()
+    ceramides = ["Ceramide NP", "Ceramide AP", "Ceramide EOP", "Ceramide NS", "Ceramides"]
+    assert len({normalizer.canonical(c) for c in ceramides}) == len(ceramides)
+    assert normalizer.canonical("Tocopheryl Acetate") != normalizer.canonical("Tocopherol")
+    assert normalizer.canonical("Sodium Hyaluronate") != normalizer.canonical("Hyaluronic Acid")
+    peptides = ["Palmitoyl Tripeptide-1", "Palmitoyl Tetrapeptide-7", "Peptides"]
+    assert len({normalizer.canonical(p) for p in peptides}) == len(peptides)
+
+
+def test_canonical_needs_the_whole_name():
+    normalizer = IngredientNormalizer()
+    assert normalizer.canonical("Aqua/Water/Eau") == "water"
+    assert normalizer.canonical("Parfum (Fragrance)") == "fragrance"
+    # Another ingredient that merely contains a dictionary name keeps its own key
+    assert normalizer.canonical("Lactobacillus/Water Ferment") == "lactobacillus/water ferment"
+    assert normalizer.canonical("Sodium Hyaluronate Crosspolymer") == "sodium hyaluronate crosspolymer"
+    assert normalizer.canonical("Water, Retinol") == "water retinol"
+
+
+def test_free_of_is_not_a_match():
+    normalizer = IngredientNormalizer()
+    assert normalizer.scan("Alcohol-Free") == [] and normalizer.scan("Fragrance free toner") == []
+    assert not normalizer.is_known(normalizer.id_for("Fragrance-Free"))
+    assert normalizer.scan("Alcohol-Free, contains Parfum") == [normalizer.id_for("fragrance")]
+    assert ScoringEngine().score_one({"ingredients": ["Alcohol-Free Toner Base"]},
+                                     {"skin_type": "dry", "allergies": []})["warnings"] == []
+
+
+def test_unknown_names_are_not_interned():
+    normalizer = IngredientNormalizer(memo_size=1000)
+    size = len(normalizer.names)
+    first = normalizer.id_for("Rare Extract 1")
+    for i in range(5000):
+        normalizer.ids(f"Rare Extract {i}")
+    assert len(normalizer.names) == size == normalizer.dictionary_size
+    assert len(normalizer._memo) <= 1000
+
+    # Stable across calls and spellings of the same text, and never a dictionary ID
+    assert normalizer.id_for("rare extract 1.") == first and not normalizer.is_known(first)
+    assert normalizer.id_for("Rare Extract 2") != first
+    assert normalizer.canonical("Rare  EXTRACT 1") == "rare extract 1"
+
+
+def test_unknown_names_still_match_consumers():
+    engine = ScoringEngine()
+    allergic = engine.score_one({"ingredients": ["Water", "Kiwi Seed Oil"]},
+                                {"skin_type": "normal", "allergies": ["kiwi seed oil"]})
+    assert allergic["warnings"] == ["⚠️ Contains kiwi seed oil - you're allergic!"], allergic
+
+    result = InteractionGraph().check(["Retinol", "Glycolic Acid", "Kiwi Seed Oil"])
+    assert result.unclassified == ["Kiwi Seed Oil"] and len(result.warnings) == 1
+
+
+if __name__ == "__main__":
+    test_synonyms_share_an_id()
+    test_distinct_inci_entries_stay_apart()
+    test_canonical_needs_the_whole_name()
+    test_free_of_is_not_a_match()
+    test_unknown_names_are_not_interned()
+    test_unknown_names_still_match_consumers()
+    print("✅ normalizer tests passed")
@@ -0,0 +1,142 @@
+"""
+ProductLookup must resolve barcodes from the products table, serve hot
+barcodes from its bounded in-memory tier, cache hits and misses until
+their TTLs run out, and pick up catalog changes after invalidate(); the scan
+endpoint must answer unknown barcodes without ingredients with a 404.
+
+    python test_product_lookup.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+import httpx
+from sqlalchemy import create_engine
+
+from database.connection import Base, make_async_engine
+from database.models import ProductDB, User
+from database.product_lookup import ProductLookup
+from loadtest.load_generator import scratch_app
+
+
+def make_catalog(workdir: str, n: int):
+    path = os.path.join(workdir, "catalog.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine, tables=[ProductDB.__table__])
+    with engine.begin() as conn:
+        conn.execute(ProductDB.__table__.insert(), [
+            {"product_id": str(uuid.uuid4()), "barcode": f"{i:013d}", "name": f"Cream {i}", "brand": "Lab",
+             "ingredients": ["Water", "Glycerin"]}
+            for i in range(n)
+        ])
+    return engine, make_async_engine(f"sqlite:///{path}")
+
+
+def add_product(engine, barcode: str):
+    with engine.begin() as conn:
+        conn.execute(ProductDB.__table__.insert(), {"product_id": str(uuid.uuid4()), "barcode": barcode,
+                                                     "name": "New", "ingredients": ["Squalane"]})
+
+
+def test_hot_tier_and_bound():
+    with tempfile.TemporaryDirectory() as workdir:
+        engine, async_engine = make_catalog(workdir, 10)
+        lookup = ProductLookup(bind=engine, async_bind=async_engine, max_entries=3)
+
+        product = lookup.get_sync(f"{1:013d}")
+        assert product["name"] == "Cream 1" and product["ingredients"] == ["Water", "Glycerin"]
+        assert lookup.get_sync(f"{1:013d}") is product
+        assert lookup.stats()["db_lookups"] == 1 and lookup.stats()["hits"] == 1
+
+        for i in range(2, 6):
+            lookup.get_sync(f"{i:013d}")
+        assert lookup.stats()["hot_entries"] == 3
+        # Barcode 1 was least recently used and went back to the database
+        lookup.get_sync(f"{1:013d}")
+        assert lookup.stats()["db_lookups"] == 6
+
+        async def async_lookups():
+            first = await lookup.get(f"{7:013d}")
+            again = await lookup.get(f"{7:013d}")
+            await async_engine.dispose()
+            return first, again
+
+        first, again = asyncio.run(async_lookups())
+        assert first["name"] == "Cream 7" and again is first and lookup.stats()["db_lookups"] == 7
+        engine.dispose()
+
+
+def test_hot_entries_expire():
+    with tempfile.TemporaryDirectory() as workdir:
+        engine, async_engine = make_catalog(workdir, 3)
+        lookup = ProductLookup(bind=engine, async_bind=async_engine, ttl=0.1)
+        assert lookup.get_sync(f"{1:013d}")["name"] == "Cream 1"
+
+        # A re-import renames the product; workers see it once the entry expires
+        with engine.begin() as conn:
+            conn.execute(ProductDB.__table__.update().where(ProductDB.barcode == f"{1:013d}").values(name="Cream 1 v2"))
+        assert lookup.get_sync(f"{1:013d}")["name"] == "Cream 1"
+        time.sleep(0.15)
+        assert lookup.get_sync(f"{1:013d}")["name"] == "Cream 1 v2"
+        assert lookup.stats()["db_lookups"] == 2 and lookup.stats()["hot_entries"] == 1
+        engine.dispose()
+
+
+def test_negative_cache_and_invalidate():
+    with tempfile.TemporaryDirectory() as workdir:
+        engine, async_engine = make_catalog(workdir, 3)
+        lookup = ProductLookup(bind=engine, async_bind=async_engine, max_negative_entries=2, negative_ttl=0.1)
+
+        assert lookup.get_sync("missing") is None and lookup.get_sync("missing") is None
+        assert lookup.stats()["negative_hits"] == 1 and lookup.stats()["db_lookups"] == 1
+
+        # A product added while its miss is cached is only seen after invalidate() or the TTL
+        add_product(engine, "missing")
+        assert lookup.get_sync("missing") is None
+        lookup.invalidate("missing")
+        assert lookup.get_sync("missing")["name"] == "New"
+
+        assert lookup.get_sync("late") is None
+        add_product(engine, "late")
+        assert lookup.get_sync("late") is None
+        time.sleep(0.15)
+        assert lookup.get_sync("late")["name"] == "New"
+
+        for code in ("a", "b", "c"):
+            lookup.get_sync(code)
+        assert lookup.stats()["negative_entries"] == 2
+
+        lookup.invalidate()
+        assert lookup.stats()["hot_entries"] == 0 and lookup.stats()["negative_entries"] == 0
+        engine.dispose()
+
+
+def test_scan_unknown_barcode():
+    # No LLM is reached: the barcode is unknown and the client sent no ingredients
+    with scratch_app("http://127.0.0.1:9") as app:
+        async def scan():
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app), \
+                    httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                with app.state.database.SessionLocal() as db:
+                    db.add(User(user_id="u1", name="Scan", age=30, skin_type="dry", concerns=[], allergies=[],
+                                climate="temperate", lifestyle={}, medical_conditions=[]))
+                    db.commit()
+                responses = [await client.post("/api/products/scan", json={"user_id": "u1", "barcode": "404"})
+                             for _ in range(2)]
+                return responses, app.state.product_lookup.stats()
+
+        responses, stats = asyncio.run(scan())
+    assert [r.status_code for r in responses] == [404, 404]
+    assert responses[0].json()["detail"] == "Product not found"
+    assert stats["db_lookups"] == 1 and stats["negative_hits"] == 1
+
+
+if __name__ == "__main__":
+    test_hot_tier_and_bound()
+    test_hot_entries_expire()
+    test_negative_cache_and_invalidate()
+    test_scan_unknown_barcode()
+    print("✅ product lookup tests passed")
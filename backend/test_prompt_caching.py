@@ -0,0 +1,99 @@
+"""
+Every agent call must mark its static system prompt (and, for chat, the
+user's profile block) as a prompt-cache breakpoint, and LLMClient must
+report cache reads / writes per agent.
+
+    python test_prompt_caching.py
+"""
+import asyncio
+import json
+
+import httpx
+
+from agents.analysis_agent import AnalysisAgent
+from agents.llm_client import LLMClient
+from agents.orchestrator import OrchestratorAgent
+from agents.profile_agent import ProfileIntelligenceAgent
+from agents.recommendation_agent import RecommendationAgent
+from loadtest.fake_anthropic import reply_for, stream_events, usage_for
+
+PROFILE = {"user_id": "u1", "skin_type": "dry", "concerns": ["redness"], "allergies": [], "age": 31}
+
+
+class StubTransport:
+    """
+    httpx transport answering /v1/messages locally and keeping every payload
+    """
+
+    def __init__(self):
+        self.payloads = []
+        self.prompt_cache = set()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.payloads.append(body)
+        text = reply_for(body)
+        usage = usage_for(body, self.prompt_cache)
+        if body.get("stream"):
+            events = "".join([event async for event in stream_events(body, text, 0, usage)])
+            return httpx.Response(200, content=events.encode(), headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json={
+            "id": "msg_stub", "type": "message", "role": "assistant", "model": body["model"],
+            "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": dict(usage, output_tokens=10),
+        })
+
+
+def assert_system_cached(body):
+    assert isinstance(body["system"], list), body["system"]
+    assert body["system"][-1]["cache_control"] == {"type": "ephemeral"}, body["system"]
+
+
+async def check_payloads_and_usage():
+    stub = StubTransport()
+    client = LLMClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(stub.handle)))
+    client.client = client.client.with_options(api_key="test-key", base_url="http://stub")
+
+    orchestrator = OrchestratorAgent(client, profile_agent=ProfileIntelligenceAgent(client),
+                                     analysis_agent=object(), recommendation_agent=RecommendationAgent(client))
+    analysis = AnalysisAgent(client, cache=object(), ingredient_store=object())
+
+    for _ in range(2):
+        await orchestrator._llm_route("Is this normal?", PROFILE, [])
+        await orchestrator._general_chat("Any winter tips?", PROFILE)
+        await analysis._analyze_ingredients(["Water", "Glycerin"], "dry")
+        await orchestrator.recommendation_agent.build_routine(PROFILE)
+        await orchestrator.profile_agent.analyze_description("Oily T-zone, dry cheeks")
+    _ = [t async for t in orchestrator._general_chat_stream("And for summer?", PROFILE)]
+
+    assert len(stub.payloads) == 11
+    for body in stub.payloads:
+        assert_system_cached(body)
+
+    # Chat calls: the profile block is its own cached block, before the per-turn text
+    chat_bodies = [b for b in stub.payloads if isinstance(b["messages"][-1]["content"], list)]
+    assert len(chat_bodies) == 5, len(chat_bodies)
+    for body in chat_bodies:
+        profile_block, turn_block = body["messages"][-1]["content"]
+        assert profile_block["text"] == f"User profile: {json.dumps(PROFILE, sort_keys=True)}"
+        assert profile_block["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in turn_block
+
+    usage = client.stats()["usage"]
+    assert set(usage) == {"orchestrator", "analysis", "recommendation", "profile"}, usage
+    for agent, totals in usage.items():
+        assert totals["cache_creation_input_tokens"] > 0, (agent, totals)
+        assert totals["cache_read_input_tokens"] > 0, (agent, totals)
+    # Third chat call (streamed) reuses the cached system + profile prefix
+    assert usage["orchestrator"]["calls"] == 5
+    print({agent: round(t["cache_hit_rate"], 2) for agent, t in usage.items()})
+    await client.close()
+
+
+def test_payloads_and_usage():
+    asyncio.run(check_payloads_and_usage())
+
+
+if __name__ == "__main__":
+    test_payloads_and_usage()
+    print("✅ prompt caching tests passed")
@@ -0,0 +1,149 @@
+"""
+jobs.precompute_routines must store one routine per common archetype and
+budget, skip what is already stored, record failed archetypes without
+stopping, retry shed calls, and RoutineTable must serve any profile in a
+stored archetype while leaving rare profiles to the LLM.
+
+    python test_routine_table.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine
+
+from agents.dispatcher import LLMOverloaded
+from database.connection import Base, make_async_engine
+from database.models import RoutineArchetypeDB, User
+from database.routine_table import RoutineTable, archetype_key
+from jobs import precompute_routines
+from jobs.precompute_routines import precompute
+
+
+class StubAgent:
+    def __init__(self):
+        self.calls = []
+
+    async def build_routine(self, profile, budget):
+        self.calls.append((profile, budget))
+        await asyncio.sleep(0.01)
+        return {"morning": [{"step": 1, "product_type": "Cleanser"}], "night": [], "for": profile, "budget": budget}
+
+
+class FlakyAgent(StubAgent):
+    """
+    Oily profiles: shed twice, then answered. Dry: "budget" raises, "mid-range" degrades.
+    """
+
+    async def build_routine(self, profile, budget):
+        self.calls.append((profile, budget))
+        if profile["skin_type"] == "oily" and sum(p["skin_type"] == "oily" for p, b in self.calls if b == budget) <= 2:
+            raise LLMOverloaded("batch", 1.0, retry_after=0.01)
+        if profile["skin_type"] == "dry":
+            if budget == "budget":
+                raise RuntimeError("upstream exploded")
+            return {"morning": [], "degraded": "timeout"}
+        return {"morning": [{"step": 1}], "night": []}
+
+
+def make_users(engine):
+    common = [("dry", ["Redness", "dryness"], [], 31), ("dry", ["dryness", "redness"], [], 27),
+              ("dry", ["redness", "dryness"], None, 33), ("oily", ["acne"], ["fragrance"], 19),
+              ("oily", ["acne"], ["Fragrance"], 22), ("oily", ["Acne"], ["fragrance"], 24)]
+    rare = [("sensitive", ["rosacea", "melasma", "acne"], ["lanolin"], 61)]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"user_id": str(uuid.uuid4()), "skin_type": skin_type, "concerns": concerns,
+             "allergies": allergies, "age": age}
+            for skin_type, concerns, allergies, age in common + rare
+        ])
+
+
+def test_precompute_and_lookup():
+    with tempfile.TemporaryDirectory() as workdir:
+        check_precompute_and_lookup(os.path.join(workdir, "routines.db"))
+
+
+def check_precompute_and_lookup(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    make_users(engine)
+
+    agent = StubAgent()
+    stats = asyncio.run(precompute(top=10, min_users=2, budgets=("budget", "mid-range"), agent=agent, bind=engine))
+    assert (stats.users, stats.archetypes, stats.users_covered) == (7, 2, 6), stats
+    assert (stats.generated, stats.skipped, stats.failed) == (4, 0, 0), stats
+    assert {tuple(p["concerns"]) for p, _ in agent.calls} == {("dryness", "redness"), ("acne",)}
+
+    # Rerun: everything already stored
+    rerun = asyncio.run(precompute(top=10, min_users=2, budgets=("budget", "mid-range"), agent=agent, bind=engine))
+    assert (rerun.generated, rerun.skipped) == (0, 4), rerun
+
+    async def lookups():
+        table = RoutineTable(make_async_engine(f"sqlite:///{path}"))
+        stored = await table.get({"skin_type": "Dry", "concerns": ["redness", "Dryness"], "allergies": [], "age": 34},
+                                 "mid-range")
+        assert stored is not None and stored["budget"] == "mid-range", stored
+        assert stored["for"]["age"] == 30
+
+        started = time.perf_counter()
+        for _ in range(1000):
+            assert await table.get({"skin_type": "oily", "concerns": ["acne"], "allergies": ["fragrance"],
+                                    "age": 20}, "budget") is not None
+        per_lookup_ms = (time.perf_counter() - started)
+
+        # Different allergy, band or budget: not covered
+        assert await table.get({"skin_type": "oily", "concerns": ["acne"], "allergies": [], "age": 20}, "budget") is None
+        assert await table.get({"skin_type": "oily", "concerns": ["acne"], "allergies": ["fragrance"], "age": 40},
+                               "budget") is None
+        assert await table.get({"skin_type": "dry", "concerns": ["dryness", "redness"], "age": 30}, "premium") is None
+        assert table.stats()["loads"] == 1
+        await table.async_bind.dispose()
+        return per_lookup_ms
+
+    per_lookup_ms = asyncio.run(lookups())
+    engine.dispose()
+    assert per_lookup_ms < 1, per_lookup_ms
+    assert archetype_key({"skin_type": "dry", "concerns": ["A b"], "age": None}, " Budget ") == "dry|a_b||any|budget"
+    print(f"stored routine lookup: {per_lookup_ms * 1000:.1f} us")
+
+
+def test_precompute_failures():
+    with tempfile.TemporaryDirectory() as workdir:
+        check_precompute_failures(os.path.join(workdir, "failures.db"))
+
+
+def check_precompute_failures(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    make_users(engine)
+    backoff, precompute_routines.OVERLOAD_BACKOFF = precompute_routines.OVERLOAD_BACKOFF, 0.01
+    try:
+        agent = FlakyAgent()
+        stats = asyncio.run(precompute(top=10, min_users=2, budgets=("budget", "mid-range"), agent=agent, bind=engine))
+    finally:
+        precompute_routines.OVERLOAD_BACKOFF = backoff
+
+    # Both oily routines stored after two shed attempts each; both dry ones recorded as failed
+    assert (stats.generated, stats.failed) == (2, 2), stats
+    assert len([call for call in agent.calls if call[0]["skin_type"] == "oily"]) == 6
+    reasons = sorted(stats.failures.values())
+    assert reasons == ["RuntimeError: upstream exploded", "timeout"], stats.failures
+    with engine.connect() as conn:
+        assert len(conn.execute(RoutineArchetypeDB.__table__.select()).all()) == 2
+
+    # Saves that fail are recorded per archetype too
+    RoutineArchetypeDB.__table__.drop(engine)
+    stats = asyncio.run(precompute(top=10, min_users=2, budgets=("budget",), refresh=True, agent=StubAgent(),
+                                   bind=engine))
+    assert (stats.generated, stats.failed) == (0, 2), stats
+    assert all(reason.startswith("save failed") for reason in stats.failures.values())
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    test_precompute_and_lookup()
+    test_precompute_failures()
+    print("✅ routine table tests passed")
@@ -0,0 +1,127 @@
+"""
+The vectorized ScoringEngine must match the original per-product fallback
+exactly for plain ingredient names, and also catch synonyms / INCI spellings.
+
+    python test_scoring_engine.py
+"""
+import random
+import time
+
+from agents.scoring_engine import ScoringEngine
+
+INGREDIENTS = ["Water", "Glycerin", "Alcohol", "alcohol denat", "Hyaluronic Acid", "Fragrance",
+               "Parfum", "Niacinamide", "Retinol", "Shea Butter", "Nuts", "Lanolin"]
+SKIN_TYPES = ["dry", "oily", "sensitive", "normal", "combination"]
+# Generous for CI machines: 20k products against one profile takes ~40 ms locally
+CATALOG_BUDGET_SECONDS = 0.5
+
+
+def legacy_fallback(product, user_profile):
+    """
+    AnalysisAgent._fallback_analysis as it was before the engine
+    """
+    score = 70
+    warnings = []
+    benefits = []
+    ingredients = [i.lower() for i in product.get("ingredients", [])]
+    allergies = [a.lower() for a in user_profile.get("allergies", [])]
+    skin_type = user_profile.get("skin_type", "normal")
+    for allergy in allergies:
+        if allergy in ingredients:
+            warnings.append(f"⚠️ Contains {allergy} - you're allergic!")
+            score -= 30
+    if skin_type == "dry":
+        if any(a in ingredients for a in ["alcohol", "alcohol denat"]):
+            warnings.append("❌ Contains alcohol - drying for your skin")
+            score -= 20
+        if "hyaluronic acid" in ingredients:
+            benefits.append("✅ Hyaluronic acid - great for hydration")
+            score += 10
+    if skin_type == "sensitive":
+        if "fragrance" in ingredients or "parfum" in ingredients:
+            warnings.append("⚠️ Contains fragrance - may irritate")
+            score -= 15
+    return {
+        "overall_score": max(0, min(100, score)),
+        "recommendation": "recommended" if score >= 70 else "caution" if score >= 50 else "not_recommended",
+        "summary": f"Score: {score}/100",
+        "ingredient_analyses": [],
+        "warnings": warnings,
+        "benefits": benefits,
+        "interactions": [],
+        "usage_tips": []
+    }
+
+
+def random_catalog(rng, n):
+    return [{"ingredients": rng.sample(INGREDIENTS, rng.randint(0, 8))} for _ in range(n)]
+
+
+def random_profiles(rng, n):
+    profiles = []
+    for _ in range(n):
+        profile = {"allergies": rng.choices(["nuts", "LANOLIN", "glycerin", "latex"], k=rng.randint(0, 3))}
+        if rng.random() < 0.9:
+            profile["skin_type"] = rng.choice(SKIN_TYPES)
+        profiles.append(profile)
+    return profiles
+
+
+def test_matches_legacy_fallback():
+    rng = random.Random(42)
+    products = random_catalog(rng, 300)
+    profiles = random_profiles(rng, 40)
+
+    results = ScoringEngine().score(products, profiles)
+    for i, product in enumerate(products):
+        for j, profile in enumerate(profiles):
+            assert results[i][j] == legacy_fallback(product, profile), (product, profile)
+
+
+def test_matches_synonyms_and_inci_spellings():
+    engine = ScoringEngine()
+    sensitive = engine.score_one({"ingredients": ["Aqua", "Parfum (Fragrance)"]}, {"skin_type": "sensitive"})
+    assert sensitive["warnings"] == ["⚠️ Contains fragrance - may irritate"]
+
+    dry = engine.score_one({"ingredients": ["Alcohol Denat.", "Sodium Hyaluronate", "Cetearyl Alcohol"]},
+                           {"skin_type": "dry", "allergies": ["Fragrance"]})
+    assert dry["warnings"] == ["❌ Contains alcohol - drying for your skin"]
+    assert dry["benefits"] == ["✅ Hyaluronic acid - great for hydration"]
+
+    allergic = engine.score_one({"ingredients": ["Perfume"]}, {"skin_type": "oily", "allergies": ["Fragrance"]})
+    assert allergic["warnings"] == ["⚠️ Contains fragrance - you're allergic!"]
+
+
+def best_of(runs, fn):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_catalog_scoring_speed():
+    rng = random.Random(7)
+    products = random_catalog(rng, 20000)
+    profile = random_profiles(rng, 1)[0]
+    engine = ScoringEngine()
+
+    vectorized = best_of(3, lambda: engine.score_matrix(products, [profile]))
+    legacy = best_of(3, lambda: [legacy_fallback(product, profile) for product in products])
+    print(f"✅ 20k products: vectorized {vectorized * 1000:.1f} ms, per-product {legacy * 1000:.1f} ms")
+
+    # One profile is the engine's worst case; it must still beat the per-product loop
+    assert vectorized < legacy, (vectorized, legacy)
+    assert vectorized < CATALOG_BUDGET_SECONDS, vectorized
+
+    # Many profiles share one compile of the catalog
+    profiles = random_profiles(rng, 50)
+    batched = best_of(2, lambda: engine.score_matrix(products, profiles))
+    assert batched < vectorized * len(profiles) / 5, (batched, vectorized)
+
+
+if __name__ == "__main__":
+    test_matches_legacy_fallback()
+    test_matches_synonyms_and_inci_spellings()
+    test_catalog_scoring_speed()
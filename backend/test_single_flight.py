@@ -0,0 +1,116 @@
+"""
+Identical concurrent LLMClient.create_message calls must share one
+upstream request, survive the cancellation of some callers, and cancel
+the upstream request once no caller is left.
+
+    python test_single_flight.py
+"""
+import asyncio
+import json
+
+import httpx
+
+from agents.dispatcher import LLMDispatcher
+from agents.llm_client import LLMClient
+
+
+class SlowTransport:
+    def __init__(self, delay: float = 0.1, status: int = 200):
+        self.delay = delay
+        self.status = status
+        self.started = 0
+        self.finished = 0
+        self.cancelled = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        self.finished += 1
+        if self.status != 200:
+            return httpx.Response(self.status, json={"type": "error", "error": {"type": "api_error", "message": "boom"}})
+        return httpx.Response(200, json={
+            "id": "msg_stub", "type": "message", "role": "assistant", "model": body["model"],
+            "content": [{"type": "text", "text": body["messages"][0]["content"]}], "stop_reason": "end_turn",
+            "stop_sequence": None, "usage": {"input_tokens": 5, "output_tokens": 5},
+        })
+
+
+def make_client(transport: SlowTransport, **options) -> LLMClient:
+    client = LLMClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(transport.handle)), **options)
+    client.client = client.client.with_options(api_key="test-key", base_url="http://stub", max_retries=0)
+    return client
+
+
+def request(text: str) -> dict:
+    return {"max_tokens": 100, "messages": [{"role": "user", "content": text}]}
+
+
+async def check_coalescing():
+    transport = SlowTransport()
+    client = make_client(transport)
+    replies = await asyncio.gather(
+        *[client.create_message(agent="analysis", **request("same")) for _ in range(20)],
+        client.create_message(agent="analysis", **request("other")),
+    )
+    assert transport.started == 2, transport.started
+    assert [r.content[0].text for r in replies] == ["same"] * 20 + ["other"]
+    stats = client.stats()
+    assert stats["coalesced"] == 19 and stats["in_flight"] == 0, stats
+    assert stats["usage"]["analysis"]["calls"] == 2
+
+    # Once landed, the same request goes upstream again
+    await client.create_message(agent="analysis", **request("same"))
+    assert transport.started == 3
+
+    off = make_client(SlowTransport(), single_flight=False)
+    await asyncio.gather(*[off.create_message(**request("same")) for _ in range(5)])
+    assert off.stats()["coalesced"] == 0
+    await client.close()
+    await off.close()
+
+
+async def check_cancellation():
+    transport = SlowTransport()
+    client = make_client(transport)
+    first = asyncio.create_task(client.create_message(**request("same")))
+    second = asyncio.create_task(client.create_message(**request("same")))
+    await asyncio.sleep(0.02)
+    first.cancel()
+    assert (await second).content[0].text == "same"
+    assert first.cancelled() and transport.finished == 1
+
+    # Every caller gone: the upstream call is cancelled and forgotten
+    lone = asyncio.create_task(client.create_message(**request("lonely")))
+    await asyncio.sleep(0.02)
+    lone.cancel()
+    await asyncio.sleep(0.02)
+    assert transport.cancelled == 1 and client.stats()["in_flight"] == 0
+    assert (await client.create_message(**request("lonely"))).content[0].text == "lonely"
+    await client.close()
+
+
+async def check_errors_shared():
+    transport = SlowTransport(status=500)
+    # One upstream attempt, so the shared failure is the 500 itself
+    client = make_client(transport, dispatcher=LLMDispatcher(max_retries=0))
+    results = await asyncio.gather(*[client.create_message(**request("same")) for _ in range(5)],
+                                   return_exceptions=True)
+    assert all(isinstance(r, Exception) for r in results), results
+    assert transport.started == 1 and client.stats()["in_flight"] == 0
+    await client.close()
+
+
+def test_single_flight():
+    asyncio.run(check_coalescing())
+    asyncio.run(check_cancellation())
+    asyncio.run(check_errors_shared())
+
+
+if __name__ == "__main__":
+    test_single_flight()
+    print("✅ single-flight tests passed")
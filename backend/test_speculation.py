@@ -0,0 +1,70 @@
+"""
+Speculative CHAT replies must be kept when routing says CHAT, cancelled
+(not left running) when it does not, and counted in the speculator stats.
+
+    python test_speculation.py
+"""
+import asyncio
+from types import SimpleNamespace
+
+from agents.intent_classifier import IntentClassifier
+from agents.orchestrator import OrchestratorAgent
+from agents.speculation import Speculator
+
+
+class RoutingClient:
+    def __init__(self, agent: str):
+        self.agent = agent
+        self.replies_finished = 0
+        self.replies_cancelled = 0
+
+    async def create_message(self, **kwargs):
+        content = kwargs["messages"][-1]["content"]
+        if "Route this request." in "".join(block["text"] for block in content):
+            await asyncio.sleep(0.05)
+            return SimpleNamespace(content=[SimpleNamespace(text=f'{{"agent": "{self.agent}"}}')])
+        try:
+            await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            self.replies_cancelled += 1
+            raise
+        self.replies_finished += 1
+        return SimpleNamespace(content=[SimpleNamespace(text="Speculative hello")])
+
+    async def stream_text(self, **kwargs):
+        for word in ("Speculative ", "hello"):
+            await asyncio.sleep(0.02)
+            yield word
+
+
+def make_orchestrator(client):
+    return OrchestratorAgent(client, profile_agent=object(), analysis_agent=object(), recommendation_agent=object(),
+                             intent_classifier=IntentClassifier(threshold=1.01), speculator=Speculator("always"))
+
+
+async def check_kept_and_discarded():
+    chat = make_orchestrator(RoutingClient("CHAT"))
+    result = await chat.route_request("hmm", {}, [])
+    assert result["response"] == "Speculative hello"
+    assert chat.speculator.stats()["used"] == 1
+
+    other = make_orchestrator(RoutingClient("RECOMMENDATION"))
+    result = await other.route_request("hmm", {}, [])
+    assert result["agent_used"] == "RECOMMENDATION"
+    await asyncio.sleep(0.15)
+    assert other.client.replies_cancelled == 1 and other.client.replies_finished == 0
+    assert other.speculator.stats()["waste_rate"] == 1.0
+
+    streamed = make_orchestrator(RoutingClient("CHAT"))
+    events = [e async for e in streamed.stream_request("hmm", {}, [])]
+    assert "".join(d["text"] for e, d in events if e == "delta") == "Speculative hello"
+    assert streamed.speculator.stats()["used"] == 1
+
+
+def test_kept_and_discarded():
+    asyncio.run(check_kept_and_discarded())
+
+
+if __name__ == "__main__":
+    test_kept_and_discarded()
+    print("✅ speculation tests passed")
@@ -0,0 +1,85 @@
+"""
+The SSE endpoints must deliver their first event after roughly the
+first-token latency, not the full generation time, and end with the same
+result as the non-streaming endpoints.
+
+    python test_streaming.py
+"""
+import json
+import time
+import uuid
+
+import httpx
+
+from database.models import ProductDB, User
+from loadtest.fake_anthropic import BackgroundServer, FakeAnthropicServer
+from loadtest.load_generator import scratch_app
+
+FIRST_TOKEN = 0.3
+CHUNK_DELAY = 0.05
+
+
+def read_events(client: httpx.Client, url: str, **kwargs):
+    """
+    [(seconds since request, event, data)] from an SSE response
+    """
+    start = time.perf_counter()
+    events, event = [], None
+    with client.stream("POST", url, **kwargs) as response:
+        assert response.status_code == 200, response.read()
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((time.perf_counter() - start, event, json.loads(line[len("data: "):])))
+    return time.perf_counter() - start, events
+
+
+def seed(app) -> str:
+    user_id = str(uuid.uuid4())
+    with app.state.database.SessionLocal() as db:
+        db.add(User(user_id=user_id, name="Stream Test", age=30, skin_type="dry", concerns=["dryness"],
+                         allergies=[], climate="temperate", lifestyle={}, medical_conditions=[]))
+        db.add(ProductDB(product_id=str(uuid.uuid4()), barcode="stream-1", name="Cream", brand="Lab",
+                              ingredients=["Water", "Glycerin", "Niacinamide", "Squalane"]))
+        db.commit()
+    return user_id
+
+
+def test_streaming_endpoints():
+    with FakeAnthropicServer(latency=FIRST_TOKEN, chunk_delay=CHUNK_DELAY) as fake:
+        with scratch_app(fake.base_url) as app, BackgroundServer(app) as api, \
+                httpx.Client(base_url=api.base_url, timeout=30) as client:
+            user_id = seed(app)
+
+            # Chat: routed locally, then the reply streamed token by token
+            start = time.perf_counter()
+            full = client.post("/api/chat", json={"user_id": user_id, "message": "Hi, winter tips?"}).json()
+            chat_seconds = time.perf_counter() - start
+            total, events = read_events(client, "/api/chat/stream", json={"user_id": user_id, "message": "Hi, winter tips?"})
+            deltas = [e for e in events if e[1] == "delta"]
+            assert events[0][1] == "agent" and events[-1][1] == "done"
+            assert "".join(d[2]["text"] for d in deltas) == full["response"]
+            assert len(deltas) > 3 and deltas[0][0] < chat_seconds / 2, (deltas[0][0], chat_seconds)
+            print(f"chat:    first token {deltas[0][0]:.2f}s, done {total:.2f}s (non-streaming {chat_seconds:.2f}s)")
+
+            # Routine: "morning" arrives while the rest is still generating
+            total, events = read_events(client, "/api/routine/generate/stream", params={"user_id": user_id})
+            sections = [e for e in events if e[1] == "section"]
+            assert [s[2]["name"] for s in sections][:2] == ["morning", "night"]
+            assert events[-1][1] == "routine" and "morning" in events[-1][2]
+            assert sections[0][0] < total / 2, (sections[0][0], total)
+            print(f"routine: morning at {sections[0][0]:.2f}s, done {total:.2f}s")
+
+            # Scan: ingredient analyses one at a time, then the product result
+            total, events = read_events(client, "/api/products/scan/stream",
+                                        json={"user_id": user_id, "barcode": "stream-1"})
+            kinds = [e[1] for e in events]
+            assert kinds[0] == "product" and kinds[-1] == "analysis" and kinds.count("ingredient") == 4, kinds
+            assert events[-1][2]["overall_score"] == 82
+            print(f"scan:    first ingredient {events[1][0]:.2f}s, done {total:.2f}s")
+
+
+if __name__ == "__main__":
+    test_streaming_endpoints()
+    print("✅ streaming tests passed")
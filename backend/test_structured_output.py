@@ -0,0 +1,140 @@
+"""
+Agent replies that are fenced, truncated or malformed must still parse:
+complete members are kept and only the missing part is re-requested,
+with the members so far prefilled as the assistant turn.
+
+    python test_structured_output.py
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from agents.analysis_agent import AnalysisAgent
+from agents.recommendation_agent import RecommendationAgent
+from agents.structured_output import StructuredOutput, StructuredOutputError, parse_json, repair_json
+from loadtest.fake_anthropic import ROUTINE_REPLY, reply_for
+from monitoring.instrumentation import structured_output_samples
+
+
+class DamagingClient:
+    """
+    Answers with the fake API's canned replies, passing the first one
+    through `damage`; records every request
+    """
+
+    def __init__(self, damage):
+        self.damage = damage
+        self.requests = []
+
+    def _reply(self, kwargs) -> str:
+        text = reply_for(kwargs)
+        if len(self.requests) == 1:
+            text = self.damage(text)
+        return text
+
+    async def create_message(self, **kwargs):
+        self.requests.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text=self._reply(kwargs))])
+
+    async def stream_text(self, **kwargs):
+        self.requests.append(kwargs)
+        text = self._reply(kwargs)
+        for i in range(0, len(text), 16):
+            yield text[i:i + 16]
+
+
+def truncate_after(marker: str):
+    return lambda text: text[:text.index(marker) + len(marker) + 5]
+
+
+def check_parse_and_repair():
+    routine = json.dumps(ROUTINE_REPLY)
+    assert parse_json(f"```json\n{routine}\n```") == ROUTINE_REPLY
+    assert parse_json(f"Here is your routine:\n{routine}\nEnjoy!") == ROUTINE_REPLY
+
+    value, prefix = repair_json(routine[:routine.index('"weekly"') + 3])
+    assert list(value) == ["morning", "night"], value
+    assert prefix.endswith("]") and json.loads(prefix + "}") == value
+
+    value, prefix = repair_json(f"{routine} (note [1])")
+    assert value == ROUTINE_REPLY and prefix is None
+
+    value, prefix = repair_json('[{"a": 1}, {"b": "unescaped "quote"}, {"c": 3}]')
+    assert value == [{"a": 1}] and prefix == '[{"a": 1}'
+
+    try:
+        parse_json("Sorry, I can't help with that.")
+        raise AssertionError("expected StructuredOutputError")
+    except StructuredOutputError:
+        pass
+
+
+async def check_truncated_routine_continues():
+    client = DamagingClient(truncate_after('"night"'))
+    output = StructuredOutput(max_continuations=1)
+    routine = await RecommendationAgent(client, output).build_routine({"skin_type": "dry"})
+    assert routine == ROUTINE_REPLY, routine
+
+    first, continuation = client.requests
+    prefill = continuation["messages"][-1]
+    assert prefill["role"] == "assistant" and prefill["content"].endswith("],"), prefill
+    assert '"night"' not in prefill["content"]
+    assert continuation["messages"][:-1] == first["messages"]
+    assert output.stats()["by_agent"]["recommendation"] == {"continued": 1}
+    assert output.stats()["continuations"] == {"recommendation": 1}
+    # One reply, one outcome; the continuation call is counted on its own
+    samples = {name: values for name, _, _, values in structured_output_samples(output.stats())}
+    assert samples["skincare_structured_output_replies_total"] == [({"agent": "recommendation", "outcome": "continued"}, 1)]
+    assert samples["skincare_structured_output_continuations_total"] == [({"agent": "recommendation"}, 1)]
+
+
+async def check_malformed_ingredient_continues():
+    def break_second(text):
+        # Unescaped quote inside the second entry
+        second = text.index('"Well tolerated"', text.index('"Well tolerated"') + 1)
+        return text[:second] + '"Well "tolerated"' + text[second + len('"Well tolerated"'):]
+
+    client = DamagingClient(break_second)
+    agent = AnalysisAgent(client, cache=object(), ingredient_store=object(), output=StructuredOutput())
+    ingredients = ["Water", "Glycerin", "Niacinamide"]
+    analyses = await agent._analyze_ingredients(ingredients, "dry")
+    assert list(analyses) == ingredients, analyses
+    assert len(client.requests) == 2
+    assert client.requests[1]["messages"][-1]["content"].count('"ingredient"') == 1
+
+
+async def check_missing_section_and_no_continuation():
+    # Complete JSON without "night": reopened after the last member
+    client = DamagingClient(lambda text: json.dumps({"morning": ROUTINE_REPLY["morning"]}))
+    routine = await RecommendationAgent(client, StructuredOutput()).build_routine({"skin_type": "dry"})
+    assert client.requests[1]["messages"][-1]["content"].startswith('{"morning"')
+    assert "night" in routine, routine
+
+    # Continuations disabled: the repaired part is still returned
+    client = DamagingClient(truncate_after('"night"'))
+    output = StructuredOutput(max_continuations=0)
+    routine = await RecommendationAgent(client, output).build_routine({"skin_type": "dry"})
+    assert list(routine) == ["morning"] and len(client.requests) == 1
+    assert output.stats()["recovered"] == 1
+
+
+async def check_stream_routine_continues():
+    client = DamagingClient(truncate_after('"weekly"'))
+    agent = RecommendationAgent(client, StructuredOutput())
+    events = [event async for event in agent.stream_routine({"skin_type": "dry"})]
+    sections = [data["name"] for event, data in events if event == "section"]
+    assert sections == list(ROUTINE_REPLY), sections
+    assert events[-1] == ("routine", ROUTINE_REPLY), events[-1]
+
+
+def test_structured_output():
+    check_parse_and_repair()
+    asyncio.run(check_truncated_routine_continues())
+    asyncio.run(check_malformed_ingredient_continues())
+    asyncio.run(check_missing_section_and_no_continuation())
+    asyncio.run(check_stream_routine_continues())
+
+
+if __name__ == "__main__":
+    test_structured_output()
+    print("✅ structured output tests passed")
@@ -0,0 +1,76 @@
+"""
+WriteBehindQueue must persist every row, share transactions between
+concurrent callers, isolate a bad row, and flush deferred rows on close.
+
+    python test_write_behind.py
+"""
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import create_engine, func, select
+
+from database.connection import Base, make_async_engine
+from database.models import ConversationHistory, FeedbackDB
+from database.write_behind import WriteBehindQueue
+
+
+def make_engine(workdir: str):
+    path = os.path.join(workdir, "writes.db")
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+    return make_async_engine(f"sqlite:///{path}")
+
+
+async def count(engine, model):
+    async with engine.connect() as conn:
+        return (await conn.execute(select(func.count()).select_from(model))).scalar()
+
+
+def turn(n):
+    return {"user_id": "u", "role": "user", "message": f"m{n}", "agent_used": None}
+
+
+async def check_group_mode(workdir: str):
+    engine = make_engine(workdir)
+    queue = WriteBehindQueue(bind=engine, mode="group", max_batch=1000, max_delay_ms=5)
+    await asyncio.gather(*[queue.add(ConversationHistory, turn(n), turn(n)) for n in range(100)])
+    assert await count(engine, ConversationHistory) == 200
+    assert queue.batches < 10, queue.stats()
+
+    # Duplicate primary key: only the second entry should fail
+    bad = queue.add(FeedbackDB, {"id": 1, "user_id": "u", "product_id": "p", "outcome": "ok", "rating": 5, "notes": None})
+    dup = queue.add(FeedbackDB, {"id": 1, "user_id": "u", "product_id": "p", "outcome": "ok", "rating": 5, "notes": None})
+    results = await asyncio.gather(bad, dup, queue.add(ConversationHistory, turn(0)), return_exceptions=True)
+    assert sum(isinstance(r, Exception) for r in results) == 1, results
+    assert await count(engine, ConversationHistory) == 201
+    await queue.close()
+    await engine.dispose()
+
+
+async def check_deferred_flush_on_close(workdir: str):
+    engine = make_engine(workdir)
+    queue = WriteBehindQueue(bind=engine, mode="deferred", max_batch=1000, max_delay_ms=10000)
+    for n in range(50):
+        await queue.add(ConversationHistory, turn(n))
+    assert queue.stats()["pending_rows"] == 50
+    await queue.close()
+    assert await count(engine, ConversationHistory) == 50
+    await engine.dispose()
+
+
+def test_group_mode():
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(check_group_mode(workdir))
+
+
+def test_deferred_flush_on_close():
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(check_deferred_flush_on_close(workdir))
+
+
+if __name__ == "__main__":
+    test_group_mode()
+    test_deferred_flush_on_close()
+    print("✅ write-behind tests passed")